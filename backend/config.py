@@ -54,6 +54,32 @@ class Settings(BaseSettings):
     # ========================
     ENERGISA_SESSION_TIMEOUT: int = 300  # 5 minutos
     ENERGISA_TOKEN_EXPIRATION_HOURS: int = 24
+    ENERGISA_BASE_URL: str = "https://servicos.energisa.com.br"  # Aponte para o fake local (backend/debug/fake_energisa.py) em benchmarks
+    ENERGISA_RATE_LIMIT_RPS: float = 4.0  # Requisições/s sustentadas para servicos.energisa.com.br (por processo)
+    ENERGISA_RATE_LIMIT_RAJADA: int = 8  # Requisições permitidas em rajada acima da taxa sustentada
+    ENERGISA_HTTP_TIMEOUT_SEGUNDOS: float = 30.0  # Timeout padrão das requisições ao portal
+    ENERGISA_GD_PARALELO: int = 4  # Consultas de GD simultâneas ao enriquecer a listagem de UCs
+    ENERGISA_GD_TIMEOUT_SEGUNDOS: float = 15.0  # Tempo máximo por UC nessas consultas (excedido = UC sem GD)
+    ENERGISA_CACHE_MAX_ITENS: int = 2000  # Respostas por UC em cache (LRU; ver energisa/cache_respostas.py)
+    ENERGISA_CACHE_TTL_UCS: int = 300  # Lista de UCs do CPF
+    ENERGISA_CACHE_TTL_UC_INFO: int = 3600  # Dados cadastrais da UC
+    ENERGISA_CACHE_TTL_GD: int = 1800  # gd/info e histórico de GD
+    ENERGISA_BROWSER_POOL_TAMANHO: int = 2  # Processos Chromium pré-aquecidos para logins (0 = lança um por login)
+    ENERGISA_BROWSER_POOL_MAX_CONTEXTOS: int = 4  # Logins simultâneos por processo do pool
+    ENERGISA_BROWSER_POOL_MAX_USOS: int = 25  # Logins atendidos antes de reciclar o processo
+    ENERGISA_BROWSER_POOL_MAX_MEMORIA_MB: int = 1500  # RSS (processo + filhos) acima do qual o processo é reciclado
+    ENERGISA_LOGIN_BLOQUEAR_RECURSOS: bool = True  # Não carrega imagens/fontes/analytics no navegador do login
+    ENERGISA_LOGIN_SESSOES_MAX: int = 50  # Logins/simulações em andamento (cada um segura um navegador até o SMS)
+    ENERGISA_LOGIN_SESSAO_TTL_SEGUNDOS: int = 900  # Sessão de login sem acesso por mais que isso é descartada
+    ENERGISA_SESSAO_CACHE_TTL_SEGUNDOS: int = 120  # Sessões (cookies) lidas do banco ficam em memória por este tempo
+    ENERGISA_BUILD_ID_TTL_SEGUNDOS: int = 1800  # Validade do buildId do Next.js em cache (invalidado antes em 404)
+    ENERGISA_HTTP2: bool = False  # HTTP/2 no cliente assíncrono (requer o pacote h2)
+    ENERGISA_HTTP_MAX_CONEXOES: int = 20  # Conexões do pool compartilhado do cliente assíncrono
+    ENERGISA_HTTP_KEEPALIVE_SEGUNDOS: float = 30.0  # Tempo que conexões ociosas ficam abertas no pool
+    ENERGISA_CIRCUITO_TAXA_ERRO: float = 0.5  # Taxa de falhas (5xx/429/timeout) na janela que abre o disjuntor
+    ENERGISA_CIRCUITO_MINIMO_REQUISICOES: int = 10  # Requisições mínimas na janela para avaliar a taxa
+    ENERGISA_CIRCUITO_JANELA_SEGUNDOS: int = 60  # Janela deslizante de avaliação
+    ENERGISA_CIRCUITO_TEMPO_ABERTO_SEGUNDOS: int = 120  # Tempo aberto antes da requisição de teste (meio-aberto)
 
     # ========================
     # LLM / AI Extraction
@@ -87,6 +113,38 @@ class Settings(BaseSettings):
     # Sincronização de Faturas
     # ========================
     SYNC_MAX_FATURAS_POR_UC: int = 3  # Número máximo de faturas a verificar por UC em cada sincronização
+    SYNC_MAX_CPFS_CONCORRENTES: int = 4  # CPFs sincronizados em paralelo (cada um com sua própria sessão Energisa)
+    SYNC_MAX_UCS_POR_CPF: int = 2  # UCs sincronizadas em paralelo dentro de um mesmo CPF
+    SYNC_TAMANHO_LOTE_UPSERT: int = 500  # Registros por requisição no upsert em lote (faturas / historico_gd)
+    SYNC_CLIENTE_ASYNC: bool = False  # Usa AsyncEnergisaService (httpx, pool compartilhado) em vez de threads
+    SYNC_GD_PERIODO_INCREMENTAL: int = 3  # Meses de histórico GD pedidos nos ciclos incrementais (watermark)
+    SYNC_GD_INTERVALO_COMPLETO_HORAS: int = 24  # Intervalo entre pulls completos (13 meses) do histórico GD por UC
+
+    # Pipeline de download de PDFs (separado da sincronização de metadados)
+    SYNC_PDF_WORKERS: int = 2  # Downloads de PDF simultâneos
+    SYNC_PDF_MAX_TENTATIVAS: int = 4  # Tentativas por PDF antes de desistir (até a próxima sincronização)
+    SYNC_PDF_BACKOFF_BASE_SEGUNDOS: float = 5.0  # Espera antes da 2ª tentativa (dobra a cada falha, com jitter)
+    SYNC_PDF_BACKOFF_MAX_SEGUNDOS: float = 300.0  # Teto da espera entre tentativas
+    SYNC_DIARIO_INTERVALO_SEGUNDOS: int = 15  # Intervalo mínimo entre checkpoints de CPFs/UCs concluídos (sync_execucoes)
+    SYNC_DIARIO_RETOMADA_MAX_HORAS: int = 24  # Execuções interrompidas mais antigas que isso não são retomadas
+    SYNC_METRICAS_HISTORICO: int = 50  # Execuções mantidas no histórico de métricas (/api/sync/metricas)
+
+    # Processo do scheduler: na API (default) ou no worker dedicado (python -m backend.sync.worker)
+    SYNC_SCHEDULER_NA_API: bool = True  # False = API não inicia o scheduler; status vem do heartbeat do worker
+    SYNC_WORKER_HEARTBEAT_SEGUNDOS: int = 30  # Intervalo de publicação do heartbeat em sync_workers
+
+    # Scheduler por prioridade (substitui a varredura completa periódica)
+    SYNC_PRIORIDADE_INTERVALO_MINUTOS: int = 2  # Intervalo entre ciclos do scheduler
+    SYNC_PRIORIDADE_UCS_POR_CICLO: int = 20  # Máximo de UCs (mais prioritárias) sincronizadas por ciclo
+    SYNC_PRIORIDADE_ORCAMENTO_SEGUNDOS: int = 90  # Tempo máximo para iniciar UCs em um ciclo
+    SYNC_PRIORIDADE_INTERVALO_MINIMO_MINUTOS: int = 60  # Intervalo mínimo entre sincronizações da mesma UC
+
+    # ========================
+    # Coordenação entre processos (jobs periódicos só rodam no detentor do lease)
+    # ========================
+    LEASE_BACKEND: str = "banco"  # banco (tabela leases_processos), arquivo (flock local) ou desativado
+    LEASE_TTL_SEGUNDOS: int = 90  # Validade do lease sem renovação (renovado a cada TTL/3)
+    LEASE_DIRETORIO: str = ""  # Diretório do arquivo de lock (backend "arquivo"); vazio = temp do sistema
 
     # ========================
     # PIX Santander
@@ -132,6 +132,17 @@ class EnergisaSessionExpiredError(EnergisaError):
         )
 
 
+class EnergisaIndisponivelError(EnergisaError):
+    """Circuit breaker aberto para a família de endpoints da Energisa"""
+
+    def __init__(self, familia: str):
+        self.familia = familia
+        super().__init__(
+            detail=f"Energisa instável ({familia}). Tente novamente em alguns minutos.",
+            error_code="CIRCUITO_ABERTO"
+        )
+
+
 class EnergisaSMSError(EnergisaError):
     """Erro ao enviar/validar SMS da Energisa"""
 
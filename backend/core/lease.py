@@ -0,0 +1,183 @@
+"""
+Lease - Eleição de líder entre processos
+Garante que jobs periódicos (ex: sync scheduler) rodem em um único worker,
+mesmo com uvicorn --workers N ou múltiplos containers
+"""
+
+import os
+import socket
+import uuid
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def identificar_processo() -> str:
+    """Identificador único deste processo (host, pid e sufixo aleatório)."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+class Lease(ABC):
+    """
+    Lease nomeado com expiração.
+
+    O detentor deve chamar adquirir() periodicamente (em intervalo menor que
+    o TTL) para renovar; se o processo morrer, o lease expira e outro assume.
+    """
+
+    def __init__(self, nome: str, ttl_segundos: int):
+        """
+        Args:
+            nome: Nome do lease (um por job periódico)
+            ttl_segundos: Validade do lease sem renovação
+        """
+        self.nome = nome
+        self.ttl_segundos = ttl_segundos
+        self.dono = identificar_processo()
+        self.ativo = False
+
+    def adquirir(self) -> bool:
+        """
+        Adquire ou renova o lease.
+
+        Returns:
+            True se este processo é o detentor
+        """
+        try:
+            ativo = self._adquirir()
+        except Exception as e:
+            logger.error(f"❌ Erro ao adquirir lease '{self.nome}': {e}")
+            ativo = False
+
+        if ativo != self.ativo:
+            if ativo:
+                logger.info(f"👑 Lease '{self.nome}' adquirido por {self.dono}")
+            else:
+                logger.warning(f"⚠️ Lease '{self.nome}' perdido por {self.dono}")
+        self.ativo = ativo
+        return ativo
+
+    def liberar(self):
+        """Libera o lease (se detido), permitindo que outro processo assuma."""
+        if not self.ativo:
+            return
+        try:
+            self._liberar()
+            logger.info(f"🔓 Lease '{self.nome}' liberado por {self.dono}")
+        except Exception as e:
+            logger.error(f"❌ Erro ao liberar lease '{self.nome}': {e}")
+        self.ativo = False
+
+    @abstractmethod
+    def _adquirir(self) -> bool:
+        """Adquire/renova no backend. Retorna True se este processo é o detentor."""
+
+    @abstractmethod
+    def _liberar(self):
+        """Libera no backend."""
+
+
+class LeaseBanco(Lease):
+    """Lease na tabela leases_processos (ver migration 026), válido entre hosts."""
+
+    def __init__(self, nome: str, ttl_segundos: int):
+        super().__init__(nome, ttl_segundos)
+        from backend.core.database import db_admin
+        self.db = db_admin
+
+    def _adquirir(self) -> bool:
+        result = self.db.rpc("adquirir_lease", {
+            "p_nome": self.nome,
+            "p_dono": self.dono,
+            "p_ttl_segundos": self.ttl_segundos
+        }).execute()
+        return bool(result.data)
+
+    def _liberar(self):
+        self.db.rpc("liberar_lease", {
+            "p_nome": self.nome,
+            "p_dono": self.dono
+        }).execute()
+
+
+class LeaseArquivo(Lease):
+    """
+    Lease via flock em arquivo local, para setups de um único host.
+
+    O lock pertence ao processo enquanto o descritor estiver aberto e é
+    liberado pelo sistema operacional se o processo morrer (TTL não se aplica).
+    """
+
+    def __init__(self, nome: str, ttl_segundos: int, diretorio: Optional[str] = None):
+        super().__init__(nome, ttl_segundos)
+        diretorio = diretorio or settings.LEASE_DIRETORIO or tempfile.gettempdir()
+        self.caminho = os.path.join(diretorio, f"gestor_energy_{nome}.lock")
+        self._fd: Optional[int] = None
+
+    def _adquirir(self) -> bool:
+        import fcntl
+
+        if self._fd is not None:
+            return True
+
+        fd = os.open(self.caminho, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+
+        os.ftruncate(fd, 0)
+        os.write(fd, self.dono.encode())
+        self._fd = fd
+        return True
+
+    def _liberar(self):
+        import fcntl
+
+        if self._fd is None:
+            return
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+
+class LeaseDesativado(Lease):
+    """Sem coordenação: todo processo é detentor (comportamento antigo)."""
+
+    def _adquirir(self) -> bool:
+        return True
+
+    def _liberar(self):
+        pass
+
+
+def criar_lease(nome: str, ttl_segundos: Optional[int] = None) -> Lease:
+    """
+    Cria o lease conforme LEASE_BACKEND ("banco", "arquivo" ou "desativado").
+
+    Args:
+        nome: Nome do lease
+        ttl_segundos: Validade sem renovação (default: LEASE_TTL_SEGUNDOS)
+
+    Returns:
+        Instância de Lease
+    """
+    ttl = ttl_segundos or settings.LEASE_TTL_SEGUNDOS
+    backend = settings.LEASE_BACKEND.lower()
+
+    if backend == "banco":
+        return LeaseBanco(nome, ttl)
+    if backend == "arquivo":
+        return LeaseArquivo(nome, ttl)
+    if backend == "desativado":
+        return LeaseDesativado(nome, ttl)
+
+    raise ValueError(f"LEASE_BACKEND inválido: {settings.LEASE_BACKEND}")
@@ -0,0 +1,258 @@
+"""
+Banco em Memória - Substituto mínimo do cliente Supabase para benchmarks
+
+Implementa o subconjunto do query builder do supabase-py usado pela
+sincronização (select/insert/upsert/update/delete, filtros, embed
+`tabela!inner(colunas)`, range/limit/single e rpc) e conta cada execute()
+por tabela e operação, para medir chamadas ao banco por UC.
+"""
+
+import copy
+import itertools
+import operator
+import re
+import threading
+from collections import Counter
+from typing import Callable, Optional
+
+# Embeds do PostgREST: "usuarios!inner(cpf)" ou "usuarios(cpf, nome)"
+_RE_EMBED = re.compile(r"(\w+)(!inner)?\(([^)]*)\)")
+
+
+class RespostaMemoria:
+    def __init__(self, data):
+        self.data = data
+
+
+class ConsultaMemoria:
+    """Query builder encadeável sobre uma tabela do BancoMemoria."""
+
+    def __init__(self, banco: "BancoMemoria", tabela: str):
+        self.banco = banco
+        self.tabela = tabela
+        self.operacao = "select"
+        self.payload = None
+        self.colunas = "*"
+        self.on_conflict = None
+        self._filtros = []
+        self._negar = False
+        self._limite = None
+        self._intervalo = None
+        self._single = False
+
+    # --- Operações ---
+
+    def select(self, colunas: str = "*", **kwargs):
+        self.operacao, self.colunas = "select", colunas
+        return self
+
+    def insert(self, payload, **kwargs):
+        self.operacao, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: Optional[str] = None, **kwargs):
+        self.operacao, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        return self
+
+    def update(self, payload, **kwargs):
+        self.operacao, self.payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self.operacao = "delete"
+        return self
+
+    # --- Filtros ---
+
+    @property
+    def not_(self):
+        self._negar = True
+        return self
+
+    def _filtro(self, funcao: Callable[[dict], bool]):
+        negar, self._negar = self._negar, False
+        self._filtros.append((lambda r: not funcao(r)) if negar else funcao)
+        return self
+
+    def eq(self, coluna, valor):
+        return self._filtro(lambda r: r.get(coluna) == valor)
+
+    def neq(self, coluna, valor):
+        return self._filtro(lambda r: r.get(coluna) != valor)
+
+    def _comparar(self, coluna, valor, operador):
+        # Datas/timestamps chegam como string ISO: compara como texto
+        def funcao(r):
+            atual = r.get(coluna)
+            if atual is None:
+                return False
+            return operador(str(atual), valor) if isinstance(valor, str) else operador(atual, valor)
+        return self._filtro(funcao)
+
+    def gt(self, coluna, valor):
+        return self._comparar(coluna, valor, operator.gt)
+
+    def gte(self, coluna, valor):
+        return self._comparar(coluna, valor, operator.ge)
+
+    def lt(self, coluna, valor):
+        return self._comparar(coluna, valor, operator.lt)
+
+    def lte(self, coluna, valor):
+        return self._comparar(coluna, valor, operator.le)
+
+    def in_(self, coluna, valores):
+        valores = list(valores)
+        return self._filtro(lambda r: r.get(coluna) in valores)
+
+    def is_(self, coluna, valor):
+        if valor in ("null", None):
+            return self._filtro(lambda r: r.get(coluna) is None)
+        return self._filtro(lambda r: r.get(coluna) == valor)
+
+    # --- Modificadores ---
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def limit(self, quantidade: int):
+        self._limite = quantidade
+        return self
+
+    def range(self, inicio: int, fim: int):
+        self._intervalo = (inicio, fim)
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        return self.single()
+
+    # --- Execução ---
+
+    def _linhas(self) -> list:
+        return [r for r in self.banco.tabelas.setdefault(self.tabela, []) if all(f(r) for f in self._filtros)]
+
+    def _projetar(self, linhas: list) -> list:
+        embeds = _RE_EMBED.findall(self.colunas)
+        simples = [c.strip() for c in _RE_EMBED.sub("", self.colunas).split(",") if c.strip()]
+
+        saida = []
+        for linha in linhas:
+            item = copy.deepcopy(linha) if "*" in simples else {c: copy.deepcopy(linha.get(c)) for c in simples}
+
+            descartar = False
+            for tabela, inner, colunas in embeds:
+                # Convenção do schema: FK <tabela no singular>_id (usuarios -> usuario_id)
+                fk = linha.get(tabela[:-1] + "_id")
+                relacionada = next(
+                    (r for r in self.banco.tabelas.get(tabela, []) if fk is not None and r.get("id") == fk),
+                    None
+                )
+                if relacionada is None:
+                    descartar = descartar or bool(inner)
+                    item[tabela] = None
+                    continue
+                cols = [c.strip() for c in colunas.split(",") if c.strip()]
+                item[tabela] = copy.deepcopy(relacionada) if "*" in cols else {
+                    c: copy.deepcopy(relacionada.get(c)) for c in cols
+                }
+
+            if not descartar:
+                saida.append(item)
+        return saida
+
+    def execute(self) -> RespostaMemoria:
+        with self.banco.lock:
+            self.banco.chamadas[(self.tabela, self.operacao)] += 1
+            linhas = self.banco.tabelas.setdefault(self.tabela, [])
+
+            if self.operacao == "select":
+                saida = self._projetar(self._linhas())
+                if self._intervalo:
+                    saida = saida[self._intervalo[0]:self._intervalo[1] + 1]
+                if self._limite is not None:
+                    saida = saida[:self._limite]
+                if self._single:
+                    return RespostaMemoria(saida[0] if saida else None)
+                return RespostaMemoria(saida)
+
+            itens = self.payload if isinstance(self.payload, list) else [self.payload]
+
+            if self.operacao == "insert":
+                saida = []
+                for item in itens:
+                    item = copy.deepcopy(item)
+                    item.setdefault("id", next(self.banco.ids))
+                    linhas.append(item)
+                    saida.append(copy.deepcopy(item))
+                return RespostaMemoria(saida)
+
+            if self.operacao == "upsert":
+                chaves = [c.strip() for c in (self.on_conflict or "id").split(",")]
+                indice = {tuple(r.get(c) for c in chaves): r for r in linhas}
+                saida = []
+                for item in itens:
+                    existente = indice.get(tuple(item.get(c) for c in chaves))
+                    if existente is not None:
+                        existente.update(copy.deepcopy(item))
+                    else:
+                        existente = copy.deepcopy(item)
+                        existente.setdefault("id", next(self.banco.ids))
+                        linhas.append(existente)
+                        indice[tuple(existente.get(c) for c in chaves)] = existente
+                    saida.append(copy.deepcopy(existente))
+                return RespostaMemoria(saida)
+
+            if self.operacao == "update":
+                saida = []
+                for linha in self._linhas():
+                    linha.update(copy.deepcopy(self.payload))
+                    saida.append(copy.deepcopy(linha))
+                return RespostaMemoria(saida)
+
+            if self.operacao == "delete":
+                removidas = self._linhas()
+                ids = {id(r) for r in removidas}
+                self.banco.tabelas[self.tabela] = [r for r in linhas if id(r) not in ids]
+                return RespostaMemoria(removidas)
+
+            raise ValueError(f"Operação não suportada: {self.operacao}")
+
+
+class _ChamadaRpc:
+    def __init__(self, banco: "BancoMemoria", funcao: str, params: dict):
+        self.banco, self.funcao, self.params = banco, funcao, params
+
+    def execute(self) -> RespostaMemoria:
+        with self.banco.lock:
+            self.banco.chamadas[(self.funcao, "rpc")] += 1
+        tratador = self.banco.rpcs.get(self.funcao)
+        return RespostaMemoria(tratador(self.params) if tratador else None)
+
+
+class BancoMemoria:
+    """Mesma interface usada de SupabaseClient (table/rpc), com dados em memória."""
+
+    def __init__(self):
+        self.tabelas: dict = {}
+        self.chamadas = Counter()  # (tabela, operação) -> execuções
+        self.rpcs: dict = {}  # nome -> função(params)
+        self.ids = itertools.count(1)
+        self.lock = threading.RLock()
+
+    def table(self, nome: str) -> ConsultaMemoria:
+        return ConsultaMemoria(self, nome)
+
+    def rpc(self, funcao: str, params: Optional[dict] = None) -> _ChamadaRpc:
+        return _ChamadaRpc(self, funcao, params or {})
+
+    def total_chamadas(self) -> int:
+        with self.lock:
+            return sum(self.chamadas.values())
+
+    def zerar_chamadas(self):
+        with self.lock:
+            self.chamadas.clear()
@@ -0,0 +1,262 @@
+"""
+Benchmark da Sincronização - SyncService contra o fake da Energisa e um banco em memória
+
+Sobe o fake (backend/debug/fake_energisa.py) no próprio processo, gera N CPFs
+sintéticos com M UCs cada em um BancoMemoria, executa
+SyncService.sincronizar_todas_ucs (e o pipeline de PDFs) e relata UCs/min,
+chamadas ao banco por UC, requisições HTTP por endpoint e pico de memória.
+Rodadas seguintes à primeira medem o caso "nada mudou" (hashes iguais).
+
+Uso:
+    python -m backend.debug.benchmark_sync --cpfs 20 --ucs-por-cpf 5 --latencia-ms 120
+    python -m backend.debug.benchmark_sync --cpfs 50 --rodadas 2 --rps 0 --json
+
+Nenhuma chamada sai para a Energisa real ou para o Supabase.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from backend.config import settings
+from backend.debug.banco_memoria import BancoMemoria
+from backend.debug.fake_energisa import ConfigFake, ServidorFake
+
+logger = logging.getLogger(__name__)
+
+CDC_INICIAL = 5000000
+
+
+def semear_banco(banco: BancoMemoria, cpfs: int, ucs_por_cpf: int) -> int:
+    """
+    Cria usuários, sessões Energisa e UCs sintéticas.
+
+    Returns:
+        Total de UCs criadas
+    """
+    agora = datetime.now(timezone.utc).isoformat()
+    usuarios, sessoes, ucs = [], [], []
+
+    for i in range(cpfs):
+        cpf = f"{90000000000 + i:011d}"
+        usuario_id = i + 1
+        usuarios.append({"id": usuario_id, "cpf": cpf, "nome_completo": f"Usuário {i}"})
+        sessoes.append({
+            "cpf": cpf,
+            "cookies": {"utk": f"utk-{cpf}", "rtk": f"rtk-{cpf}"},
+            "atualizado_em": agora
+        })
+        for j in range(ucs_por_cpf):
+            cdc = CDC_INICIAL + i * ucs_por_cpf + j
+            ucs.append({
+                "id": len(ucs) + 1,
+                "usuario_id": usuario_id,
+                "cdc": cdc,
+                "digito_verificador": cdc % 10,
+                "cod_empresa": 6,
+                "ultima_sincronizacao": None,
+                "hash_info_api": None
+            })
+
+    banco.tabelas["usuarios"] = usuarios
+    banco.tabelas["sessoes_energisa"] = sessoes
+    banco.tabelas["unidades_consumidoras"] = ucs
+    return len(ucs)
+
+
+def _configurar_rate_limiter(rps: float):
+    """Ajusta o rate limiter do processo (rps <= 0 desativa na prática)."""
+    from backend.energisa.rate_limiter import energisa_rate_limiter
+
+    with energisa_rate_limiter._cond:
+        if rps <= 0:
+            energisa_rate_limiter.taxa = 1e9
+            energisa_rate_limiter.capacidade = 1_000_000
+        else:
+            energisa_rate_limiter.taxa = rps
+            energisa_rate_limiter.capacidade = max(1, settings.ENERGISA_RATE_LIMIT_RAJADA)
+        energisa_rate_limiter._tokens = float(energisa_rate_limiter.capacidade)
+
+
+def _pico_rss_mb() -> float:
+    """Pico de RSS do processo (ru_maxrss é KB no Linux e bytes no macOS)."""
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def executar_benchmark(args) -> dict:
+    """Executa as rodadas de sincronização e retorna o relatório."""
+    servidor = ServidorFake(ConfigFake(
+        latencia_ms=args.latencia_ms,
+        jitter_ms=args.jitter_ms,
+        taxa_erro=args.taxa_erro,
+        taxa_timeout=args.taxa_timeout,
+        timeout_segundos=args.timeout_segundos,
+        faturas_por_uc=args.faturas_por_uc,
+        tamanho_pdf_kb=args.tamanho_pdf_kb,
+        semente=args.semente
+    ))
+    settings.ENERGISA_BASE_URL = servidor.iniciar()
+    settings.ENERGISA_HTTP_TIMEOUT_SEGUNDOS = args.timeout_http
+    settings.SYNC_CLIENTE_ASYNC = args.cliente_async
+    _configurar_rate_limiter(args.rps)
+
+    # Imports após apontar ENERGISA_BASE_URL para o fake
+    from backend.energisa import session_manager
+    from backend.energisa.sessao_http import fechar_transporte_compartilhado
+    from backend.sync.pdf_pipeline import PipelinePdf
+    from backend.sync.service import SyncService
+
+    banco = BancoMemoria()
+    total_ucs = semear_banco(banco, args.cpfs, args.ucs_por_cpf)
+    session_manager.db_admin = banco
+
+    service = SyncService()
+    service.db = banco
+    service.pipeline_pdf = PipelinePdf(banco)
+
+    if args.tracemalloc:
+        tracemalloc.start()
+
+    rodadas = []
+    # EnergisaService loga via print: silencia para não distorcer o tempo
+    with open(os.devnull, "w") as devnull, \
+            (contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(devnull)):
+        try:
+            for numero in range(1, args.rodadas + 1):
+                banco.zerar_chamadas()
+                requisicoes_antes = servidor.estado.get_status()["requisicoes"]
+
+                inicio = time.perf_counter()
+                stats = await service.sincronizar_todas_ucs()
+                if not args.sem_pdfs:
+                    await service.pipeline_pdf.aguardar()
+                duracao = time.perf_counter() - inicio
+
+                requisicoes = servidor.estado.get_status()["requisicoes"]
+                requisicoes_rodada = {
+                    rota: total - requisicoes_antes.get(rota, 0)
+                    for rota, total in requisicoes.items()
+                    if total - requisicoes_antes.get(rota, 0)
+                }
+                chamadas = dict(banco.chamadas)
+                total_chamadas = sum(chamadas.values())
+                ucs = stats.get("ucs_processadas") or 0
+
+                rodadas.append({
+                    "rodada": numero,
+                    "duracao_segundos": round(duracao, 2),
+                    "ucs_processadas": ucs,
+                    "ucs_por_minuto": round(ucs / duracao * 60, 1) if duracao else None,
+                    "chamadas_banco": total_chamadas,
+                    "chamadas_banco_por_uc": round(total_chamadas / ucs, 2) if ucs else None,
+                    "chamadas_banco_detalhe": {
+                        f"{tabela}.{operacao}": qtd
+                        for (tabela, operacao), qtd in sorted(chamadas.items(), key=lambda x: -x[1])
+                    },
+                    "requisicoes_http": sum(requisicoes_rodada.values()),
+                    "requisicoes_http_detalhe": requisicoes_rodada,
+                    "stats": {k: v for k, v in stats.items() if isinstance(v, (int, float)) and v},
+                })
+        finally:
+            await service.pipeline_pdf.parar()
+            await fechar_transporte_compartilhado()
+            servidor.parar()
+
+    relatorio = {
+        "parametros": {
+            "cpfs": args.cpfs,
+            "ucs_por_cpf": args.ucs_por_cpf,
+            "total_ucs": total_ucs,
+            "latencia_ms": args.latencia_ms,
+            "taxa_erro": args.taxa_erro,
+            "taxa_timeout": args.taxa_timeout,
+            "rps": args.rps,
+            "max_cpfs_concorrentes": settings.SYNC_MAX_CPFS_CONCORRENTES,
+            "max_ucs_por_cpf": settings.SYNC_MAX_UCS_POR_CPF,
+            "pdfs": not args.sem_pdfs,
+            "cliente_async": args.cliente_async,
+        },
+        "rodadas": rodadas,
+        "erros_injetados": servidor.estado.get_status()["erros_injetados"],
+        "pico_rss_mb": _pico_rss_mb(),
+    }
+
+    if args.tracemalloc:
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        relatorio["pico_tracemalloc_mb"] = round(pico / (1024 * 1024), 1)
+
+    return relatorio
+
+
+def _imprimir_relatorio(relatorio: dict):
+    p = relatorio["parametros"]
+    print(
+        f"\n📊 Benchmark de sincronização: {p['cpfs']} CPFs x {p['ucs_por_cpf']} UCs "
+        f"({p['total_ucs']} UCs), latência {p['latencia_ms']}ms, "
+        f"erro {p['taxa_erro']:.0%}, timeout {p['taxa_timeout']:.0%}, rps {p['rps'] or 'sem limite'}"
+    )
+    for r in relatorio["rodadas"]:
+        print(
+            f"\n   Rodada {r['rodada']}: {r['ucs_processadas']} UCs em {r['duracao_segundos']}s "
+            f"-> {r['ucs_por_minuto']} UCs/min"
+        )
+        print(
+            f"   Banco: {r['chamadas_banco']} chamadas ({r['chamadas_banco_por_uc']} por UC) | "
+            f"HTTP: {r['requisicoes_http']} requisições"
+        )
+        for chave, qtd in r["chamadas_banco_detalhe"].items():
+            print(f"      {chave:<45} {qtd}")
+    print(f"\n   Erros injetados: {relatorio['erros_injetados'] or 'nenhum'}")
+    print(f"   Pico de RSS: {relatorio['pico_rss_mb']} MB")
+    if "pico_tracemalloc_mb" in relatorio:
+        print(f"   Pico tracemalloc: {relatorio['pico_tracemalloc_mb']} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da sincronização contra o fake da Energisa")
+    parser.add_argument("--cpfs", type=int, default=10)
+    parser.add_argument("--ucs-por-cpf", type=int, default=5)
+    parser.add_argument("--rodadas", type=int, default=2, help="A partir da 2ª, mede o caso sem alterações")
+    parser.add_argument("--latencia-ms", type=float, default=100.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0)
+    parser.add_argument("--taxa-timeout", type=float, default=0.0)
+    parser.add_argument("--timeout-segundos", type=float, default=5.0, help="Demora das respostas 'timeout' do fake")
+    parser.add_argument("--timeout-http", type=float, default=2.0, help="ENERGISA_HTTP_TIMEOUT_SEGUNDOS no benchmark")
+    parser.add_argument("--faturas-por-uc", type=int, default=13)
+    parser.add_argument("--tamanho-pdf-kb", type=int, default=100)
+    parser.add_argument("--sem-pdfs", action="store_true", help="Não aguarda o pipeline de PDFs")
+    parser.add_argument("--rps", type=float, default=settings.ENERGISA_RATE_LIMIT_RPS,
+                        help="Rate limit da Energisa (0 = sem limite)")
+    parser.add_argument("--cliente-async", action="store_true",
+                        help="Sincroniza com AsyncEnergisaService (SYNC_CLIENTE_ASYNC)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--tracemalloc", action="store_true", help="Mede pico de alocações Python (mais lento)")
+    parser.add_argument("--json", action="store_true", help="Imprime o relatório em JSON")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+
+    relatorio = asyncio.run(executar_benchmark(args))
+    if args.json:
+        print(json.dumps(relatorio, ensure_ascii=False, indent=2))
+    else:
+        _imprimir_relatorio(relatorio)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,415 @@
+"""
+Fake Energisa - Servidor local que imita os endpoints do portal usados pela sincronização
+
+Serve RefreshToken, UnidadeConsumidora/Informacao, a rota Next.js de faturas,
+SegundaVia/Download e Gd/GetHistoricoDemonstrativoGd a partir das amostras de
+docs/api-samples (ou de payloads sintéticos, se não houver amostras), com
+latência e injeção de erros configuráveis. Usado pelo benchmark da
+sincronização (backend/debug/benchmark_sync.py), sem tocar na Energisa real.
+
+Uso:
+    python -m backend.debug.fake_energisa --porta 8900 --latencia-ms 150 --taxa-erro 0.02
+
+Depois aponte o backend para ele com ENERGISA_BASE_URL=http://127.0.0.1:8900
+"""
+
+import argparse
+import asyncio
+import copy
+import glob
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response
+
+BUILD_ID = "fake-build"
+
+# Diretório padrão das amostras capturadas pelo sampler (ver docs/api-samples/README.md)
+DIRETORIO_AMOSTRAS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "docs", "api-samples"
+)
+
+# Prefixos que não recebem latência nem erros injetados
+ROTAS_CONTROLE = ("/__fake",)
+
+
+@dataclass
+class ConfigFake:
+    """Parâmetros de comportamento do fake."""
+    latencia_ms: float = 0.0  # Latência base de cada resposta
+    jitter_ms: float = 0.0  # Variação aleatória (+/-) sobre a latência
+    taxa_erro: float = 0.0  # Fração das requisições respondidas com HTTP 500
+    taxa_timeout: float = 0.0  # Fração das requisições que demoram timeout_segundos
+    timeout_segundos: float = 35.0  # Acima do ENERGISA_HTTP_TIMEOUT_SEGUNDOS padrão
+    faturas_por_uc: int = 13
+    tamanho_pdf_kb: int = 100
+    fracao_gd: float = 0.3  # Fração das UCs sintéticas que participam de GD
+    semente: Optional[int] = None
+
+
+def carregar_amostras(diretorio: str = DIRETORIO_AMOSTRAS) -> list:
+    """
+    Lê as amostras (formato do EnergisaSampler) de docs/api-samples.
+
+    Returns:
+        Lista de amostras por categoria (dicts com uc_info, gd_details, faturas...)
+    """
+    amostras = []
+    for caminho in sorted(glob.glob(os.path.join(diretorio, "*.json"))):
+        try:
+            with open(caminho, encoding="utf-8") as f:
+                dados = json.load(f)
+        except (OSError, ValueError):
+            continue
+
+        if isinstance(dados, dict) and isinstance(dados.get("amostras"), dict):
+            amostras.extend(a for a in dados["amostras"].values() if isinstance(a, dict))
+        elif isinstance(dados, dict) and "uc_info" in dados:
+            amostras.append(dados)
+    return amostras
+
+
+def _meses_anteriores(quantidade: int) -> list:
+    """(mes, ano) dos últimos `quantidade` meses, do mais recente para o mais antigo."""
+    hoje = date.today()
+    mes, ano = hoje.month, hoje.year
+    meses = []
+    for _ in range(quantidade):
+        meses.append((mes, ano))
+        mes -= 1
+        if mes == 0:
+            mes, ano = 12, ano - 1
+    return meses
+
+
+class EstadoFake:
+    """Payloads e contadores do fake (um por app)."""
+
+    def __init__(self, config: ConfigFake, amostras: list):
+        self.config = config
+        self.amostras = amostras
+        self.random = random.Random(config.semente)
+        self.requisicoes = Counter()
+        self.erros_injetados = Counter()
+        self._lock = threading.Lock()
+        self._pdf = (
+            b"%PDF-1.4\n"
+            + b"0" * (max(0, config.tamanho_pdf_kb) * 1024)
+            + b"\n%%EOF\n"
+        )
+
+    def _amostra(self, cdc: int, campo: str):
+        """Amostra (determinística por UC) que tenha o campo informado."""
+        candidatas = [a for a in self.amostras if a.get(campo)]
+        if not candidatas:
+            return None
+        return copy.deepcopy(candidatas[cdc % len(candidatas)][campo])
+
+    def is_gd(self, cdc: int) -> bool:
+        return (cdc * 7919) % 100 < self.config.fracao_gd * 100
+
+    def uc_info(self, cdc: int, digito: int) -> dict:
+        amostra = self._amostra(cdc, "uc_info")
+        if isinstance(amostra, dict) and isinstance(amostra.get("infos"), dict):
+            amostra["infos"]["numeroUc"] = cdc
+            amostra["infos"]["digitoVerificador"] = digito
+            return amostra
+
+        return {
+            "errored": False,
+            "infos": {
+                "numeroUc": cdc,
+                "digitoVerificador": digito,
+                "nomeTitular": f"TITULAR {cdc}",
+                "enderecoImovel": "RUA FICTICIA",
+                "numeroImovel": str(cdc % 1000),
+                "complementoImovel": None,
+                "bairro": "CENTRO",
+                "nomeMunicipio": "CUIABA",
+                "uf": "MT",
+                "cep": "78000000",
+                "tipoLigacao": ("MONOFASICO", "BIFASICO", "TRIFASICO")[cdc % 3],
+                "classeLeitura": "RESIDENCIAL",
+                "grupoLeitura": "B",
+                "numeroMedidor": f"M{cdc}",
+                "ucAtiva": True,
+                "ucCortada": False,
+                "contratoAtivo": True,
+                "baixaRenda": False,
+                "latitude": -15.6,
+                "longitude": -56.1,
+                "geracaoDistribuida": {"tipo": "BENEFICIARIA"} if self.is_gd(cdc) else None
+            }
+        }
+
+    def faturas(self, cdc: int) -> list:
+        modelo = None
+        amostra = self._amostra(cdc, "faturas")
+        if isinstance(amostra, dict) and amostra.get("exemplos"):
+            modelo = amostra["exemplos"][0]
+        modelo = modelo or self._amostra(cdc, "fatura_exemplo")
+
+        faturas = []
+        for i, (mes, ano) in enumerate(_meses_anteriores(self.config.faturas_por_uc)):
+            consumo = 150 + (cdc + i * 37) % 300
+            fatura = copy.deepcopy(modelo) if isinstance(modelo, dict) else {
+                "valorFatura": round(consumo * 0.95, 2),
+                "valorLiquido": round(consumo * 0.9, 2),
+                "consumo": consumo,
+                "leituraAtual": 10000 + consumo * (13 - i),
+                "leituraAnterior": 10000 + consumo * (12 - i),
+                "mediaConsumo": 300,
+                "quantidadeDiaConsumo": 30,
+                "valorICMS": round(consumo * 0.17, 2),
+                "bandeiraTarifaria": "VERDE",
+                "indicadorSituacao": 1,
+                "indicadorPagamento": 1,
+                "situacaoPagamento": "PAGA" if i else "EM ABERTO",
+                "codigoBarras": f"8366{cdc:011d}{ano}{mes:02d}",
+            }
+            fatura.update({
+                "numeroFatura": cdc * 100 + i,
+                "mesReferencia": mes,
+                "anoReferencia": ano,
+                "dataLeitura": f"05/{mes:02d}/{ano}",
+                "dataVencimento": f"20/{mes:02d}/{ano}",
+            })
+            faturas.append(fatura)
+        return faturas
+
+    def gd_details(self, cdc: int, periodo: int = 13) -> dict:
+        if not self.is_gd(cdc):
+            return {"errored": False, "infos": []}
+
+        amostra = self._amostra(cdc, "gd_details")
+        modelo = None
+        if isinstance(amostra, dict) and isinstance(amostra.get("infos"), list) and amostra["infos"]:
+            modelo = amostra["infos"][0]
+
+        historico = []
+        for i, (mes, ano) in enumerate(_meses_anteriores(max(1, min(periodo, 13)))):
+            item = copy.deepcopy(modelo) if isinstance(modelo, dict) else {
+                "saldoAnteriorConv": 100 + i,
+                "injetadoConv": 0,
+                "totalRecebidoRede": 200 + (cdc + i) % 50,
+                "consumoRecebidoConv": 180,
+                "consumoInjetadoCompensadoConv": 0,
+                "consumoTransferidoConv": 0,
+                "consumoCompensadoConv": 180,
+                "saldoCompensadoAnteriorConv": 20,
+                "composicaoEnergiaInjetadas": [],
+                "discriminacaoEnergiaInjetadas": [],
+            }
+            item.update({
+                "mesReferencia": mes,
+                "anoReferencia": ano,
+                "chavePrimaria": f"{cdc}-{ano}{mes:02d}",
+                "dataModificacaoRegistro": f"{ano}-{mes:02d}-10T00:00:00",
+            })
+            historico.append(item)
+        return {"errored": False, "infos": historico}
+
+    @property
+    def pdf(self) -> bytes:
+        return self._pdf
+
+    def contar(self, rota: str):
+        with self._lock:
+            self.requisicoes[rota] += 1
+
+    def sortear_falha(self) -> Optional[str]:
+        """Sorteia se a requisição deve falhar ('timeout', 'http_500') ou seguir (None)."""
+        with self._lock:
+            sorteio = self.random.random()
+            falha = None
+            if sorteio < self.config.taxa_timeout:
+                falha = "timeout"
+            elif sorteio < self.config.taxa_timeout + self.config.taxa_erro:
+                falha = "http_500"
+            if falha:
+                self.erros_injetados[falha] += 1
+            return falha
+
+    def sortear_latencia(self) -> float:
+        """Latência da resposta em segundos."""
+        with self._lock:
+            variacao = self.random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        return max(0.0, self.config.latencia_ms + variacao) / 1000
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                "amostras": len(self.amostras),
+                "requisicoes": dict(self.requisicoes),
+                "requisicoes_total": sum(self.requisicoes.values()),
+                "erros_injetados": dict(self.erros_injetados),
+            }
+
+
+def _uc_dos_cookies(request: Request) -> int:
+    """UC ativa da sessão (cookies NumeroUc/Digito definidos pelo EnergisaService)."""
+    try:
+        return int(request.cookies.get("NumeroUc", 0))
+    except ValueError:
+        return 0
+
+
+def criar_app(config: Optional[ConfigFake] = None, amostras: Optional[list] = None) -> FastAPI:
+    """
+    Cria o app FastAPI do fake.
+
+    Args:
+        config: Latência, erros e volumes (default: ConfigFake())
+        amostras: Amostras já carregadas (default: carregar_amostras())
+    """
+    config = config or ConfigFake()
+    estado = EstadoFake(config, carregar_amostras() if amostras is None else amostras)
+
+    app = FastAPI(title="Fake Energisa", docs_url=None, redoc_url=None)
+    app.state.fake = estado
+
+    @app.middleware("http")
+    async def simular_rede(request: Request, call_next):
+        caminho = request.url.path
+        if caminho.startswith(ROTAS_CONTROLE):
+            return await call_next(request)
+
+        estado.contar(caminho if not caminho.startswith("/_next/data/") else "/_next/data/faturas.json")
+        await asyncio.sleep(estado.sortear_latencia())
+
+        falha = estado.sortear_falha()
+        if falha == "timeout":
+            await asyncio.sleep(config.timeout_segundos)
+        elif falha == "http_500":
+            return JSONResponse({"errored": True, "message": "Erro simulado"}, status_code=500)
+
+        return await call_next(request)
+
+    # --- Páginas (buildId do Next.js e navegação de contexto) ---
+
+    @app.get("/login", response_class=HTMLResponse)
+    @app.get("/home", response_class=HTMLResponse)
+    async def pagina_inicial():
+        dados_next = json.dumps({"props": {"pageProps": {}}, "page": "/login", "buildId": BUILD_ID})
+        return (
+            "<html><body><div id=\"__next\"></div>"
+            f"<script id=\"__NEXT_DATA__\" type=\"application/json\">{dados_next}</script>"
+            "</body></html>"
+        )
+
+    @app.get("/faturas", response_class=HTMLResponse)
+    async def pagina_faturas():
+        return "<html><body>faturas</body></html>"
+
+    # --- APIs ---
+
+    @app.post("/api/autenticacao/RefreshToken")
+    async def refresh_token():
+        return {
+            "errored": False,
+            "infos": {"utk": f"utk-{uuid.uuid4().hex}", "refreshToken": f"rtk-{uuid.uuid4().hex}"}
+        }
+
+    @app.post("/api/clientes/UnidadeConsumidora/Informacao")
+    async def uc_informacao(uc: int = 0, digitoVerificador: int = 0):
+        return estado.uc_info(uc, digitoVerificador)
+
+    @app.get("/_next/data/{build_id}/faturas.json")
+    async def faturas_next(build_id: str, request: Request):
+        if build_id != BUILD_ID:
+            return JSONResponse({"notFound": True}, status_code=404)
+        return {"pageProps": {"data": {"faturas": estado.faturas(_uc_dos_cookies(request))}}}
+
+    @app.post("/api/clientes/SegundaVia/Download")
+    async def segunda_via(request: Request):
+        corpo = await request.json()
+        if int(corpo.get("cdc") or 0) != _uc_dos_cookies(request):
+            # Portal real responde erro quando o contexto da sessão é outra UC
+            return JSONResponse({"errored": True, "mensagem": "UC fora do contexto"}, status_code=200)
+        return Response(estado.pdf, media_type="application/pdf")
+
+    @app.post("/api/clientes/Gd/GetHistoricoDemonstrativoGd")
+    async def historico_gd(numeroCdc: int = 0, periodo: int = 13):
+        return estado.gd_details(numeroCdc, periodo)
+
+    # --- Controle ---
+
+    @app.get("/__fake/status")
+    async def status():
+        return estado.get_status()
+
+    return app
+
+
+class ServidorFake:
+    """Fake rodando em uma thread (uvicorn), para uso no mesmo processo do benchmark."""
+
+    def __init__(self, config: Optional[ConfigFake] = None, host: str = "127.0.0.1", porta: int = 0):
+        import uvicorn
+
+        self.app = criar_app(config)
+        self._servidor = uvicorn.Server(uvicorn.Config(
+            self.app, host=host, port=porta, log_level="warning", access_log=False
+        ))
+        self._thread = threading.Thread(target=self._servidor.run, name="fake-energisa", daemon=True)
+        self.host = host
+
+    @property
+    def estado(self) -> EstadoFake:
+        return self.app.state.fake
+
+    def iniciar(self, timeout: float = 10.0) -> str:
+        """Sobe o servidor e retorna a URL base."""
+        self._thread.start()
+        limite = time.monotonic() + timeout
+        while not self._servidor.started:
+            if time.monotonic() > limite or not self._thread.is_alive():
+                raise RuntimeError("Fake Energisa não iniciou")
+            time.sleep(0.05)
+        porta = self._servidor.servers[0].sockets[0].getsockname()[1]
+        return f"http://{self.host}:{porta}"
+
+    def parar(self):
+        self._servidor.should_exit = True
+        self._thread.join(timeout=10)
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Servidor local que imita o portal da Energisa")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8900)
+    parser.add_argument("--latencia-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--taxa-erro", type=float, default=0.0, help="Fração de respostas HTTP 500")
+    parser.add_argument("--taxa-timeout", type=float, default=0.0, help="Fração de respostas lentas (timeout)")
+    parser.add_argument("--faturas-por-uc", type=int, default=13)
+    parser.add_argument("--tamanho-pdf-kb", type=int, default=100)
+    parser.add_argument("--semente", type=int, default=None)
+    args = parser.parse_args()
+
+    config = ConfigFake(
+        latencia_ms=args.latencia_ms,
+        jitter_ms=args.jitter_ms,
+        taxa_erro=args.taxa_erro,
+        taxa_timeout=args.taxa_timeout,
+        faturas_por_uc=args.faturas_por_uc,
+        tamanho_pdf_kb=args.tamanho_pdf_kb,
+        semente=args.semente,
+    )
+    uvicorn.run(criar_app(config), host=args.host, port=args.porta, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
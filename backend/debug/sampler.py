@@ -7,6 +7,7 @@ Classifica UCs por tipo e seleciona amostras representativas para documentação
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 from backend.energisa.service import EnergisaService
+from backend.energisa.rate_limiter import PRIORIDADE_BACKGROUND
 
 
 class EnergisaSampler:
@@ -34,7 +35,8 @@ class EnergisaSampler:
     
     def __init__(self, cpf: str):
         self.cpf = cpf.replace(".", "").replace("-", "")
-        self.service = EnergisaService(self.cpf)
+        # Amostragem é tráfego de background: não compete com requisições de usuários
+        self.service = EnergisaService(self.cpf, PRIORIDADE_BACKGROUND)
         self.amostras: Dict[str, Any] = {}
         self.erros: List[str] = []
         
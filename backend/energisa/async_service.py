@@ -0,0 +1,436 @@
+"""
+Async Energisa Service - Variante assíncrona do EnergisaService (httpx)
+Mesma superfície usada pela sincronização (get_uc_info, listar_faturas,
+download_pdf, get_gd_details, _refresh_token), sem thread por chamada: as
+sessões (uma por CPF, cada uma com seu cookie jar) compartilham o pool
+keep-alive do event loop (ver sessao_http.transporte_compartilhado)
+"""
+
+import asyncio
+import logging
+import time
+from typing import Optional
+
+from backend.config import settings
+from backend.energisa.rate_limiter import PRIORIDADE_INTERATIVA
+from backend.energisa.sessao_http import SessaoAsyncEnergisa
+from backend.energisa.build_id import build_id_cache, extrair_build_id
+from backend.energisa.cache_respostas import cache_respostas, chave_uc
+from backend.energisa.session_manager import SessionManager
+from backend.energisa.service import (
+    EnergisaService,
+    chave_contexto_uc,
+    COOKIES_CONTEXTO_UC,
+    _iniciar_refresh,
+    _concluir_refresh,
+)
+
+logger = logging.getLogger(__name__)
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+# Intervalo de verificação enquanto outra chamada (thread ou task) renova o token do CPF
+REFRESH_ESPERA_INTERVALO_SEGUNDOS = 0.05
+
+
+async def chamar_energisa(svc, metodo: str, *args, **kwargs):
+    """
+    Chama um método do cliente Energisa sem bloquear o event loop.
+
+    AsyncEnergisaService é aguardado direto; EnergisaService (síncrono) roda em thread.
+
+    Args:
+        svc: EnergisaService ou AsyncEnergisaService
+        metodo: Nome do método (ex: "get_uc_info")
+        *args, **kwargs: Argumentos do método
+    """
+    funcao = getattr(svc, metodo)
+    if asyncio.iscoroutinefunction(funcao):
+        return await funcao(*args, **kwargs)
+    return await asyncio.to_thread(funcao, *args, **kwargs)
+
+
+class AsyncEnergisaService:
+    """
+    Cliente assíncrono do portal da Energisa para um CPF.
+
+    Deve ser criado dentro do event loop que vai usá-lo (o pool de conexões é
+    por loop). Prefira AsyncEnergisaService.criar(), que carrega a sessão salva.
+    """
+
+    # Montagem de headers/payload e checagem de tokens são idênticas às do cliente síncrono
+    _get_headers = EnergisaService._get_headers
+    _get_tokens_payload = EnergisaService._get_tokens_payload
+    is_authenticated = EnergisaService.is_authenticated
+
+    def __init__(self, cpf: str, prioridade: int = PRIORIDADE_INTERATIVA, cookies: Optional[dict] = None):
+        """
+        Args:
+            cpf: CPF do titular
+            prioridade: PRIORIDADE_INTERATIVA (default) ou PRIORIDADE_BACKGROUND
+            cookies: Cookies da sessão Energisa (ver SessionManager.load_session)
+        """
+        self.cpf = cpf.replace(".", "").replace("-", "")
+        self.base_url = settings.ENERGISA_BASE_URL.rstrip("/")
+        self.cookies = dict(cookies or {})
+        self.session = SessaoAsyncEnergisa(prioridade, cookies=self.cookies)
+        # UC cujo contexto já foi ativado no portal via navegação em /faturas (empresa, cdc, dígito)
+        self._contexto_uc = None
+
+    @classmethod
+    async def criar(cls, cpf: str, prioridade: int = PRIORIDADE_INTERATIVA) -> "AsyncEnergisaService":
+        """Cria o cliente com a sessão salva no banco (ignora expiração para tentar refresh)."""
+        cookies = await asyncio.to_thread(SessionManager.load_session, cpf, True)
+        return cls(cpf, prioridade, cookies)
+
+    def _definir_cookies(self, cookies: dict):
+        for nome, valor in cookies.items():
+            self.cookies[nome] = valor
+            self.session.cookies.set(nome, valor)
+
+    def _capturar_cookies_sessao(self):
+        """Copia para self.cookies os cookies recebidos nas respostas."""
+        for cookie in self.session.cookies.jar:
+            self.cookies[cookie.name] = cookie.value
+
+    def _definir_contexto_uc(self, cdc, digito, empresa):
+        contexto = chave_contexto_uc({"cdc": cdc, "digitoVerificadorCdc": digito, "codigoEmpresaWeb": empresa})
+        if contexto != self._contexto_uc:
+            self._contexto_uc = None
+        self._definir_cookies({
+            "NumeroUc": str(cdc),
+            "Digito": str(digito),
+            "CodigoEmpresaWeb": str(empresa)
+        })
+
+    async def _get_build_id(self) -> Optional[str]:
+        """Identificador da versão atual do site (cache do processo, ver energisa/build_id.py)"""
+        return await build_id_cache.obter_async(self._buscar_build_id)
+
+    async def _buscar_build_id(self) -> Optional[str]:
+        for url in (f"{self.base_url}/login", f"{self.base_url}/home"):
+            try:
+                resp = await self.session.get(url, headers={"User-Agent": USER_AGENT}, timeout=10)
+                if resp.status_code == 200:
+                    build_id = extrair_build_id(resp.text)
+                    if build_id:
+                        return build_id
+            except Exception as e:
+                logger.warning(f"   ⚠️ Erro ao buscar buildId em {url}: {e}")
+
+        return None
+
+    async def _refresh_token(self) -> bool:
+        """
+        Renova o access token (single-flight por CPF no processo, compartilhado
+        com o cliente síncrono; a espera é por polling, sem bloquear o event loop).
+        """
+        inicio = time.monotonic()
+        rtk_atual = self.cookies.get("rtk") or self.cookies.get("refreshToken", "")
+
+        acao, valor = _iniciar_refresh(self.cpf, inicio, rtk_atual)
+        while acao == "aguardar":
+            while not valor.is_set():
+                await asyncio.sleep(REFRESH_ESPERA_INTERVALO_SEGUNDOS)
+            acao, valor = _iniciar_refresh(self.cpf, inicio, rtk_atual)
+
+        if acao == "falhou":
+            logger.debug("   ⏭️ Renovação concorrente do token falhou, não repetindo")
+            return False
+        if acao == "reaproveitar":
+            logger.debug("   ♻️ Reaproveitando token renovado por outra chamada")
+            self._definir_cookies(valor)
+            return True
+
+        sucesso = None
+        try:
+            sucesso = await self._executar_refresh_token() or await self._recarregar_sessao_do_banco(rtk_atual)
+        finally:
+            _concluir_refresh(self.cpf, valor, sucesso, self.cookies)
+        return sucesso
+
+    async def _recarregar_sessao_do_banco(self, rtk_usado: str) -> bool:
+        """Ver EnergisaService._recarregar_sessao_do_banco."""
+        cookies = await asyncio.to_thread(SessionManager.load_session, self.cpf, True, False)
+        rtk = (cookies or {}).get("rtk") or (cookies or {}).get("refreshToken", "")
+        if not rtk or rtk == rtk_usado:
+            return False
+
+        logger.debug("   ♻️ Sessão renovada por outro processo, usando tokens do banco")
+        self._definir_cookies({k: v for k, v in cookies.items() if k not in COOKIES_CONTEXTO_UC})
+        return True
+
+    async def _executar_refresh_token(self) -> bool:
+        url = f"{self.base_url}/api/autenticacao/RefreshToken"
+
+        access_token = self.cookies.get("utk") or self.cookies.get("accessTokenEnergisa", "")
+        refresh_token = self.cookies.get("rtk") or self.cookies.get("refreshToken", "")
+
+        payload = {
+            "ate": access_token,
+            "udk": self.cookies.get("udk", ""),
+            "utk": "",
+            "refreshToken": refresh_token,
+            "retk": ""
+        }
+        headers = {
+            "Content-Type": "application/json",
+            "User-Agent": USER_AGENT,
+            "Origin": self.base_url,
+            "Referer": f"{self.base_url}/",
+            "Accept": "application/json, text/plain, */*",
+            "access_token": access_token
+        }
+
+        try:
+            resp = await self.session.post(url, json=payload, headers=headers)
+
+            if resp.status_code == 200:
+                data = resp.json()
+                if not data.get("errored") and "infos" in data:
+                    novos = {}
+                    if data["infos"].get("utk"):
+                        novos["accessTokenEnergisa"] = novos["utk"] = data["infos"]["utk"]
+                    if data["infos"].get("refreshToken"):
+                        novos["rtk"] = novos["refreshToken"] = data["infos"]["refreshToken"]
+
+                    self._capturar_cookies_sessao()
+                    self._definir_cookies(novos)
+
+                    await asyncio.to_thread(SessionManager.save_session, self.cpf, self.cookies)
+                    logger.debug(f"   ✅ Token renovado (CPF {self.cpf[:3]}***)")
+                    return True
+
+            logger.warning(f"   ❌ Falha ao renovar token: {resp.status_code} - {resp.text[:200]}")
+            return False
+        except Exception as e:
+            logger.warning(f"   ❌ Erro na renovação: {e}")
+            return False
+
+    async def get_uc_info(self, uc_data: dict, max_age: Optional[float] = None):
+        """Consulta informações detalhadas da Unidade Consumidora (cache: ver EnergisaService.get_uc_info)."""
+        return await cache_respostas.consultar_async(
+            chave_uc(self.cpf, uc_data, "uc_info"), lambda: self._buscar_uc_info(uc_data), max_age
+        )
+
+    async def _buscar_uc_info(self, uc_data: dict):
+        try:
+            empresa = int(uc_data.get("codigoEmpresaWeb", 6))
+            uc_numero = int(uc_data.get("cdc"))
+            dv = int(uc_data.get("digitoVerificadorCdc"))
+        except (ValueError, TypeError):
+            raise Exception("Dados da UC inválidos. Certifique-se de que CDC e Dígito são números.")
+
+        url = (f"{self.base_url}/api/clientes/UnidadeConsumidora/Informacao"
+               f"?codigoEmpresaWeb={empresa}&uc={uc_numero}&digitoVerificador={dv}")
+        headers = self._get_headers()
+
+        try:
+            resp = await self.session.post(url, json=self._get_tokens_payload(), headers=headers)
+
+            if resp.status_code == 401 and await self._refresh_token():
+                resp = await self.session.post(url, json=self._get_tokens_payload(), headers=headers)
+
+            if resp.status_code == 200:
+                return resp.json()
+
+            logger.warning(f"   ❌ Erro UC Info: {resp.status_code} - {resp.text[:200]}")
+            # Corpo de erro do portal marcado como errored: segue para quem chamou, mas não vai para o cache
+            try:
+                corpo = resp.json()
+            except ValueError:
+                corpo = None
+            if isinstance(corpo, dict):
+                return {**corpo, "errored": True, "status": resp.status_code}
+            return {"errored": True, "status": resp.status_code, "message": f"Erro HTTP {resp.status_code}",
+                    "details": corpo if corpo is not None else resp.text}
+
+        except Exception as e:
+            logger.warning(f"   ❌ Exceção UC Info: {e}")
+            return {"errored": True, "message": str(e)}
+
+    async def listar_faturas(self, uc_data: dict) -> list:
+        try:
+            cdc = int(uc_data.get("cdc", 0))
+            digito = int(uc_data.get("digitoVerificadorCdc", 0))
+            empresa = int(uc_data.get("codigoEmpresaWeb", 6))
+        except ValueError:
+            logger.warning("   ❌ Dados da UC inválidos (não numéricos)")
+            return []
+
+        if cdc == 0:
+            return []
+
+        self._definir_contexto_uc(cdc, digito, empresa)
+
+        # Rota via Next.js
+        build_id = await self._get_build_id()
+        if build_id:
+            headers_next = {"User-Agent": USER_AGENT, "Referer": f"{self.base_url}/faturas", "Accept": "*/*"}
+            resp = await self.session.get(f"{self.base_url}/_next/data/{build_id}/faturas.json", headers=headers_next)
+
+            # 404 = portal publicou nova versão: renova o buildId e tenta de novo
+            if resp.status_code == 404:
+                build_id_cache.invalidar(build_id)
+                build_id = await self._get_build_id()
+                if build_id:
+                    resp = await self.session.get(
+                        f"{self.base_url}/_next/data/{build_id}/faturas.json", headers=headers_next
+                    )
+
+            if resp.status_code == 200:
+                try:
+                    data = resp.json()
+                    if "pageProps" in data and "data" in data["pageProps"]:
+                        return data["pageProps"]["data"].get("faturas", [])
+                except ValueError:
+                    logger.warning("   ⚠️ Erro ao processar JSON do Next.js")
+
+        # Fallback para API antiga
+        url_api = f"{self.base_url}/api/clientes/Fatura/ListarFaturasCliente"
+        headers_api = {
+            "Content-Type": "application/json",
+            "Referer": f"{self.base_url}/faturas",
+            "Origin": self.base_url
+        }
+
+        def _payload():
+            payload = self._get_tokens_payload()
+            payload.update({"codigoEmpresaWeb": empresa, "cdc": cdc, "digitoVerificadorCdc": digito})
+            return payload
+
+        resp = await self.session.post(url_api, json=_payload(), headers=headers_api)
+        if resp.status_code == 401 and await self._refresh_token():
+            resp = await self.session.post(url_api, json=_payload(), headers=headers_api)
+
+        if resp.status_code == 200:
+            data = resp.json()
+            if isinstance(data, dict) and "infos" in data:
+                return data["infos"]
+            if isinstance(data, list):
+                return data
+
+        logger.warning(f"   ❌ Listagem de faturas falhou (UC {cdc}). Status API: {resp.status_code}")
+        return []
+
+    async def _sincronizar_sessao_via_navegacao(self, uc_data: dict) -> bool:
+        """
+        Simula o navegador entrando na página de faturas da UC específica.
+        Não repete a navegação se o contexto da UC já estiver ativo na sessão.
+        """
+        contexto = chave_contexto_uc(uc_data)
+        if contexto == self._contexto_uc:
+            return True
+
+        self._contexto_uc = None
+        self._definir_contexto_uc(
+            uc_data.get("cdc"),
+            uc_data.get("digitoVerificadorCdc"),
+            uc_data.get("codigoEmpresaWeb", 6)
+        )
+
+        headers = {
+            "User-Agent": USER_AGENT,
+            "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+            "Referer": f"{self.base_url}/home"
+        }
+
+        try:
+            resp = await self.session.get(f"{self.base_url}/faturas", headers=headers)
+            if resp.status_code == 200:
+                self._contexto_uc = contexto
+                return True
+            logger.warning(f"   ⚠️ Navegação retornou {resp.status_code}")
+        except Exception as e:
+            logger.warning(f"   ⚠️ Erro na sincronização via navegação: {e}")
+
+        return False
+
+    async def download_pdf(self, uc_data: dict, fatura_data: dict) -> bytes:
+        try:
+            return await self._baixar_pdf(uc_data, fatura_data)
+        except Exception:
+            # Falha pode ser contexto perdido no portal: o próximo download navega de novo
+            self._contexto_uc = None
+            raise
+
+    async def _baixar_pdf(self, uc_data: dict, fatura_data: dict) -> bytes:
+        try:
+            cdc = int(uc_data.get("cdc", 0))
+            digito = int(uc_data.get("digitoVerificadorCdc", 0))
+            empresa = int(uc_data.get("codigoEmpresaWeb", 6))
+            ano = int(fatura_data.get("ano", 0))
+            mes = int(fatura_data.get("mes", 0))
+            num_fatura = int(fatura_data.get("numeroFatura", 0))
+        except ValueError:
+            raise Exception("Dados inválidos. Devem ser numéricos.")
+
+        await self._sincronizar_sessao_via_navegacao({
+            "cdc": cdc,
+            "digitoVerificadorCdc": digito,
+            "codigoEmpresaWeb": empresa
+        })
+
+        url = f"{self.base_url}/api/clientes/SegundaVia/Download"
+        headers = self._get_headers()
+        headers["Accept"] = "application/pdf, application/json"
+        headers["Referer"] = f"{self.base_url}/faturas"
+
+        def _payload():
+            payload = self._get_tokens_payload()
+            payload.update({
+                "codigoEmpresaWeb": empresa, "cdc": cdc, "digitoVerificadorCdc": digito,
+                "ano": ano, "mes": mes, "fatura": num_fatura, "cdcRed": None
+            })
+            return payload
+
+        resp = await self.session.post(url, json=_payload(), headers=headers)
+        if resp.status_code == 401 and await self._refresh_token():
+            resp = await self.session.post(url, json=_payload(), headers=headers)
+
+        if resp.status_code == 200:
+            if resp.content.startswith(b"%PDF"):
+                return resp.content
+            if "json" in resp.headers.get("Content-Type", ""):
+                try:
+                    err = resp.json()
+                    msg = err.get("mensagem") or err.get("message") or str(err)
+                except ValueError:
+                    msg = resp.text[:200]
+                raise Exception(f"Conteúdo inválido recebido: Erro lógico API: {msg}")
+            raise Exception("Conteúdo inválido recebido: o servidor não retornou um PDF.")
+
+        raise Exception(f"Falha download. Status: {resp.status_code}")
+
+    async def get_gd_details(self, uc_data: dict, periodo: int = 13, max_age: Optional[float] = None):
+        """Consulta histórico detalhado de créditos e geração (últimos `periodo` meses)."""
+        return await cache_respostas.consultar_async(
+            chave_uc(self.cpf, uc_data, f"gd_details:{periodo}"),
+            lambda: self._buscar_gd_details(uc_data, periodo),
+            max_age
+        )
+
+    async def _buscar_gd_details(self, uc_data: dict, periodo: int):
+        try:
+            cdc = int(uc_data.get("cdc", 0))
+            digito = int(uc_data.get("digitoVerificadorCdc", 0))
+            empresa = int(uc_data.get("codigoEmpresaWeb", 6))
+        except (ValueError, TypeError):
+            return None
+
+        url = (f"{self.base_url}/api/clientes/Gd/GetHistoricoDemonstrativoGd"
+               f"?codigoEmpresaWeb={empresa}&numeroCdc={cdc}&digitoVerificador={digito}&periodo={periodo}")
+        headers = self._get_headers()
+
+        try:
+            resp = await self.session.post(url, json=self._get_tokens_payload(), headers=headers)
+            if resp.status_code == 401 and await self._refresh_token():
+                resp = await self.session.post(url, json=self._get_tokens_payload(), headers=headers)
+
+            if resp.status_code == 200:
+                return resp.json()
+            logger.warning(f"   ❌ Erro GD Details (CDC {cdc}): {resp.status_code}")
+        except Exception as e:
+            logger.warning(f"   ❌ Exceção GD Details (CDC {cdc}): {e}")
+
+        return None
@@ -0,0 +1,200 @@
+"""
+Build ID - Cache (por processo) do buildId do Next.js do portal da Energisa
+As rotas /_next/data/{buildId}/... precisam dele, e descobri-lo exige baixar a
+página /login (ou /home) inteira. O valor é compartilhado por todas as
+instâncias de EnergisaService, renovado em background perto do fim do TTL e
+invalidado quando uma rota _next/data responde 404 (deploy novo do portal)
+"""
+
+import re
+import asyncio
+import threading
+import time
+import weakref
+import logging
+from typing import Awaitable, Callable, Optional
+
+from backend.config import settings
+from backend.energisa.rate_limiter import PRIORIDADE_BACKGROUND
+from backend.energisa.sessao_http import SessaoEnergisa
+
+logger = logging.getLogger(__name__)
+
+REGEX_BUILD_ID = re.compile(r'"buildId"\s*:\s*"([^"]+)"')
+
+# Na última fração do TTL o valor ainda é servido, mas já é renovado em background
+FRACAO_RENOVACAO = 0.2
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+
+
+def extrair_build_id(html: str) -> Optional[str]:
+    """Extrai o buildId do HTML (__NEXT_DATA__) de uma página do portal."""
+    match = REGEX_BUILD_ID.search(html or "")
+    return match.group(1) if match else None
+
+
+def buscar_build_id(sessao=None, base_url: Optional[str] = None) -> Optional[str]:
+    """
+    Busca o buildId nas rotas públicas do portal (Login ou Home).
+
+    Args:
+        sessao: requests.Session a usar (default: nova SessaoEnergisa de background)
+        base_url: URL do portal (default: ENERGISA_BASE_URL)
+    """
+    sessao = sessao or SessaoEnergisa(PRIORIDADE_BACKGROUND)
+    base_url = (base_url or settings.ENERGISA_BASE_URL).rstrip("/")
+
+    for url in (f"{base_url}/login", f"{base_url}/home"):
+        try:
+            resp = sessao.get(url, headers={"User-Agent": USER_AGENT}, timeout=10)
+            if resp.status_code == 200:
+                build_id = extrair_build_id(resp.text)
+                if build_id:
+                    logger.debug(f"BuildId encontrado em {url}: {build_id}")
+                    return build_id
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao buscar buildId em {url}: {e}")
+
+    return None
+
+
+class CacheBuildId:
+    """
+    buildId compartilhado com TTL.
+
+    - Valor válido: retornado direto.
+    - Na última FRACAO_RENOVACAO do TTL: retornado e renovado em uma thread de background.
+    - Expirado, ausente ou invalidado: buscado na hora (uma busca por vez no processo;
+      clientes assíncronos usam obter_async, uma busca por vez no event loop).
+    """
+
+    def __init__(self, ttl_segundos: float):
+        self.ttl_segundos = ttl_segundos
+        self._valor: Optional[str] = None
+        self._base_url: Optional[str] = None
+        self._obtido_em = 0.0
+        self._lock = threading.Lock()
+        self._busca_lock = threading.Lock()
+        self._busca_locks_async = weakref.WeakKeyDictionary()  # event loop -> asyncio.Lock
+        self._renovando = False
+        self._buscas = 0
+        self._acertos = 0
+        self._invalidacoes = 0
+
+    def _base_atual(self) -> str:
+        return settings.ENERGISA_BASE_URL.rstrip("/")
+
+    def atual(self) -> Optional[str]:
+        """
+        Retorna o buildId em cache, se ainda válido (sem bloquear). Perto do fim
+        do TTL, dispara a renovação em background.
+        """
+        with self._lock:
+            if not self._valor or self._base_url != self._base_atual():
+                return None
+            idade = time.monotonic() - self._obtido_em
+            if idade >= self.ttl_segundos:
+                return None
+
+            self._acertos += 1
+            renovar = idade >= self.ttl_segundos * (1 - FRACAO_RENOVACAO) and not self._renovando
+            if renovar:
+                self._renovando = True
+            valor = self._valor
+
+        if renovar:
+            threading.Thread(target=self._renovar, name="build-id-renovacao", daemon=True).start()
+        return valor
+
+    def obter(self, buscar: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        Retorna o buildId, buscando com `buscar` se não houver valor válido.
+
+        Args:
+            buscar: Função que busca o buildId no portal (ex: com a sessão do chamador)
+        """
+        valor = self.atual()
+        if valor:
+            return valor
+
+        with self._busca_lock:
+            # Outra thread pode ter buscado enquanto esperávamos
+            valor = self.atual()
+            if valor:
+                return valor
+            valor = buscar()
+            if valor:
+                self.definir(valor)
+            return valor
+
+    async def obter_async(self, buscar: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Mesmo que obter, para clientes assíncronos (`buscar` retorna uma coroutine).
+        Coroutines concorrentes esperam a busca em andamento em vez de repeti-la.
+        """
+        valor = self.atual()
+        if valor:
+            return valor
+
+        async with self._busca_lock_async():
+            valor = self.atual()
+            if valor:
+                return valor
+            valor = await buscar()
+            if valor:
+                self.definir(valor)
+            return valor
+
+    def _busca_lock_async(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            lock = self._busca_locks_async.get(loop)
+            if lock is None:
+                lock = asyncio.Lock()
+                self._busca_locks_async[loop] = lock
+            return lock
+
+    def definir(self, valor: str):
+        """Grava um buildId recém-obtido."""
+        with self._lock:
+            self._valor = valor
+            self._base_url = self._base_atual()
+            self._obtido_em = time.monotonic()
+            self._buscas += 1
+
+    def invalidar(self, build_id: Optional[str] = None):
+        """
+        Descarta o valor em cache (só se ainda for `build_id`, quando informado,
+        para não descartar um valor já renovado por outra chamada).
+        """
+        with self._lock:
+            if self._valor and (build_id is None or build_id == self._valor):
+                logger.info(f"♻️ BuildId {self._valor} invalidado (rota _next/data respondeu 404)")
+                self._valor = None
+                self._invalidacoes += 1
+
+    def _renovar(self):
+        try:
+            valor = buscar_build_id()
+            if valor:
+                self.definir(valor)
+        finally:
+            with self._lock:
+                self._renovando = False
+
+    def get_status(self) -> dict:
+        with self._lock:
+            idade = time.monotonic() - self._obtido_em if self._valor else None
+            return {
+                "build_id": self._valor,
+                "idade_segundos": round(idade, 1) if idade is not None else None,
+                "ttl_segundos": self.ttl_segundos,
+                "buscas": self._buscas,
+                "acertos": self._acertos,
+                "invalidacoes": self._invalidacoes
+            }
+
+
+# Instância global (compartilhada por EnergisaService e AsyncEnergisaService)
+build_id_cache = CacheBuildId(settings.ENERGISA_BUILD_ID_TTL_SEGUNDOS)
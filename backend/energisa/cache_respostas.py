@@ -0,0 +1,173 @@
+"""
+Cache de Respostas - Cache read-through (por processo) das consultas por UC ao portal
+Dados cadastrais e de GD mudam pouco e são pedidos repetidamente (sincronização,
+telas de UC/GD, simulação pública). As respostas bem-sucedidas ficam em um LRU
+limitado, com TTL por endpoint; quem precisa de dado mais fresco passa max_age
+(max_age=0 = sempre consulta o portal, e grava o resultado)
+"""
+
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from backend.config import settings
+
+# Resposta ausente (None também é um valor que pode ser retornado pelo portal)
+AUSENTE = object()
+
+
+def _ttl_endpoint(endpoint: str) -> float:
+    """TTL em segundos do endpoint ("gd_details:13" usa o TTL de "gd_details")."""
+    base = endpoint.split(":", 1)[0]
+    if base == "ucs":
+        return settings.ENERGISA_CACHE_TTL_UCS
+    if base == "uc_info":
+        return settings.ENERGISA_CACHE_TTL_UC_INFO
+    return settings.ENERGISA_CACHE_TTL_GD
+
+
+def chave_uc(cpf: str, uc_data: Optional[dict], endpoint: str) -> Optional[tuple]:
+    """
+    Chave (cpf, empresa, cdc, endpoint) de uma consulta.
+
+    Args:
+        cpf: CPF do titular (só dígitos)
+        uc_data: Dict com codigoEmpresaWeb e cdc (None para consultas do CPF, ex: lista de UCs)
+        endpoint: Nome lógico da consulta ("uc_info", "gd_info", "gd_details:13", "ucs")
+
+    Returns:
+        Tupla da chave, ou None se os dados da UC forem inválidos (consulta sem cache)
+    """
+    if not uc_data:
+        return (cpf, None, None, endpoint)
+    try:
+        return (cpf, int(uc_data.get('codigoEmpresaWeb', 6) or 6), int(uc_data.get('cdc')), endpoint)
+    except (ValueError, TypeError):
+        return None
+
+
+def resposta_cacheavel(resposta: Any) -> bool:
+    """Só respostas bem-sucedidas vão para o cache."""
+    if resposta is None:
+        return False
+    if isinstance(resposta, dict) and resposta.get("errored"):
+        return False
+    return True
+
+
+class CacheRespostasEnergisa:
+    """
+    LRU com TTL por endpoint.
+
+    - obter: retorna uma cópia da resposta se mais nova que min(TTL, max_age)
+    - gravar: guarda uma cópia e descarta a entrada menos usada se passar de max_itens
+    - consultar: read-through (obter, senão busca e grava)
+    """
+
+    def __init__(self, max_itens: int):
+        self.max_itens = max_itens
+        self._itens: "OrderedDict[tuple, tuple]" = OrderedDict()  # chave -> (gravado_em, valor)
+        self._lock = threading.Lock()
+        self._acertos = 0
+        self._faltas = 0
+        self._descartes = 0
+
+    def obter(self, chave: tuple, max_age: Optional[float] = None) -> Any:
+        """Retorna a resposta em cache ou AUSENTE."""
+        validade = _ttl_endpoint(chave[3])
+        if max_age is not None:
+            validade = min(validade, max_age)
+
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None or time.monotonic() - item[0] >= validade:
+                self._faltas += 1
+                return AUSENTE
+            self._itens.move_to_end(chave)
+            self._acertos += 1
+            valor = item[1]
+
+        # Chamadores alteram as respostas (ex: enriquecimento das UCs)
+        return copy.deepcopy(valor)
+
+    def gravar(self, chave: tuple, valor: Any):
+        """Grava a resposta (ignorada se não for cacheável)."""
+        if not resposta_cacheavel(valor):
+            return
+        valor = copy.deepcopy(valor)
+        with self._lock:
+            self._itens[chave] = (time.monotonic(), valor)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+                self._descartes += 1
+
+    def consultar(self, chave: Optional[tuple], buscar: Callable[[], Any], max_age: Optional[float] = None) -> Any:
+        """
+        Read-through: resposta do cache ou de `buscar()` (que é gravada).
+
+        Args:
+            chave: Ver chave_uc
+            buscar: Função que consulta o portal
+            max_age: Idade máxima aceita em segundos (None = TTL do endpoint)
+        """
+        if chave is None:
+            return buscar()
+        valor = self.obter(chave, max_age)
+        if valor is not AUSENTE:
+            return valor
+        valor = buscar()
+        self.gravar(chave, valor)
+        return valor
+
+    async def consultar_async(
+        self, chave: Optional[tuple], buscar: Callable[[], Awaitable[Any]], max_age: Optional[float] = None
+    ) -> Any:
+        """Mesmo que consultar, para clientes assíncronos (`buscar` retorna uma coroutine)."""
+        if chave is None:
+            return await buscar()
+        valor = self.obter(chave, max_age)
+        if valor is not AUSENTE:
+            return valor
+        valor = await buscar()
+        self.gravar(chave, valor)
+        return valor
+
+    def invalidar(self, cpf: str, cdc: Optional[int] = None, prefixo_endpoint: Optional[str] = None):
+        """
+        Remove entradas do CPF (opcionalmente só de uma UC e/ou endpoint).
+
+        Args:
+            cpf: CPF do titular
+            cdc: Apenas esta UC
+            prefixo_endpoint: Apenas endpoints que começam com este nome (ex: "gd_")
+        """
+        with self._lock:
+            for chave in list(self._itens):
+                if chave[0] != cpf:
+                    continue
+                if cdc is not None and chave[2] != int(cdc):
+                    continue
+                if prefixo_endpoint and not chave[3].startswith(prefixo_endpoint):
+                    continue
+                del self._itens[chave]
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                "itens": len(self._itens),
+                "max_itens": self.max_itens,
+                "acertos": self._acertos,
+                "faltas": self._faltas,
+                "descartes": self._descartes
+            }
+
+
+# Instância global (compartilhada por EnergisaService, AsyncEnergisaService e sincronização)
+cache_respostas = CacheRespostasEnergisa(settings.ENERGISA_CACHE_MAX_ITENS)
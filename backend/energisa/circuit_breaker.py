@@ -0,0 +1,200 @@
+"""
+Circuit Breaker - Proteção contra Energisa degradada
+Um disjuntor por família de endpoint (autenticação, UC, faturas, PDF, GD...):
+com muitas falhas (5xx, 429, timeout) ele abre e as chamadas falham na hora,
+até que uma requisição de teste (meio-aberto) volte a ter sucesso
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Optional
+from urllib.parse import urlsplit
+
+from backend.config import settings
+
+FECHADO = "FECHADO"
+ABERTO = "ABERTO"
+MEIO_ABERTO = "MEIO_ABERTO"
+
+# (família, prefixos de caminho) - o primeiro que casar vence
+FAMILIAS_ENDPOINT = (
+    ("autenticacao", ("/api/autenticacao/",)),
+    ("uc_info", ("/api/clientes/unidadeconsumidora/", "/api/usuarios/unidadeconsumidora")),
+    ("pdf", ("/api/clientes/segundavia/",)),
+    ("gd", ("/api/clientes/gd/",)),
+    ("faturas", ("/api/clientes/fatura/", "/api/clientes/padrao/", "/faturas")),
+)
+
+# Famílias usadas pela sincronização (se alguma abrir, a varredura adia as UCs restantes)
+FAMILIAS_SYNC = ("autenticacao", "uc_info", "faturas", "gd")
+
+
+def identificar_familia(url: str) -> str:
+    """Classifica a URL em uma família de endpoint."""
+    caminho = (urlsplit(url).path or "").lower()
+    # Rotas Next.js: /_next/data/<buildId>/faturas.json -> /faturas.json
+    if caminho.startswith("/_next/data/"):
+        partes = caminho.split("/", 4)
+        caminho = "/" + partes[4] if len(partes) > 4 else caminho
+    for familia, prefixos in FAMILIAS_ENDPOINT:
+        if any(caminho.startswith(p) for p in prefixos):
+            return familia
+    return "outros"
+
+
+class CircuitBreaker:
+    """
+    Disjuntor com janela deslizante de resultados.
+
+    FECHADO: abre quando, na janela, há pelo menos `minimo_requisicoes` e a taxa
+    de falha atinge `limite_taxa_erro`.
+    ABERTO: falha na hora por `tempo_aberto` segundos.
+    MEIO_ABERTO: libera uma requisição de teste por vez; sucesso fecha, falha reabre.
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        limite_taxa_erro: float,
+        minimo_requisicoes: int,
+        janela_segundos: float,
+        tempo_aberto: float
+    ):
+        self.nome = nome
+        self.limite_taxa_erro = limite_taxa_erro
+        self.minimo_requisicoes = minimo_requisicoes
+        self.janela_segundos = janela_segundos
+        self.tempo_aberto = tempo_aberto
+
+        self.estado = FECHADO
+        self._resultados = deque()  # (instante, sucesso)
+        self._aberto_em: Optional[float] = None
+        self._teste_em_andamento = False
+        self._aberturas = 0
+        self._rejeitadas = 0
+        self._lock = threading.Lock()
+
+    def _limpar_janela(self, agora: float):
+        while self._resultados and agora - self._resultados[0][0] > self.janela_segundos:
+            self._resultados.popleft()
+
+    def permitir(self) -> bool:
+        """Indica se a requisição pode seguir (reserva o teste no meio-aberto)."""
+        with self._lock:
+            agora = time.monotonic()
+            if self.estado == ABERTO:
+                if agora - self._aberto_em < self.tempo_aberto:
+                    self._rejeitadas += 1
+                    return False
+                self.estado = MEIO_ABERTO
+                self._teste_em_andamento = False
+
+            if self.estado == MEIO_ABERTO:
+                if self._teste_em_andamento:
+                    self._rejeitadas += 1
+                    return False
+                self._teste_em_andamento = True
+
+            return True
+
+    def registrar(self, sucesso: bool):
+        """Registra o resultado de uma requisição permitida."""
+        with self._lock:
+            agora = time.monotonic()
+
+            if self.estado == MEIO_ABERTO:
+                self._teste_em_andamento = False
+                if sucesso:
+                    self.estado = FECHADO
+                    self._resultados.clear()
+                else:
+                    self._abrir(agora)
+                return
+
+            self._resultados.append((agora, sucesso))
+            self._limpar_janela(agora)
+
+            total = len(self._resultados)
+            falhas = sum(1 for _, ok in self._resultados if not ok)
+            if total >= self.minimo_requisicoes and falhas / total >= self.limite_taxa_erro:
+                self._abrir(agora)
+
+    def liberar_teste(self):
+        """
+        Devolve uma permissão sem resultado (ex: requisição cancelada), para que
+        o teste do meio-aberto não fique reservado para sempre.
+        """
+        with self._lock:
+            if self.estado == MEIO_ABERTO:
+                self._teste_em_andamento = False
+
+    def _abrir(self, agora: float):
+        self.estado = ABERTO
+        self._aberto_em = agora
+        self._aberturas += 1
+        self._resultados.clear()
+
+    def esta_aberto(self) -> bool:
+        """True enquanto o disjuntor está aberto e o tempo de espera não passou."""
+        with self._lock:
+            return self.estado == ABERTO and time.monotonic() - self._aberto_em < self.tempo_aberto
+
+    def get_status(self) -> dict:
+        with self._lock:
+            agora = time.monotonic()
+            self._limpar_janela(agora)
+            total = len(self._resultados)
+            falhas = sum(1 for _, ok in self._resultados if not ok)
+            reabre_em = None
+            if self.estado == ABERTO:
+                reabre_em = max(0.0, round(self.tempo_aberto - (agora - self._aberto_em), 1))
+            return {
+                "estado": self.estado,
+                "requisicoes_janela": total,
+                "falhas_janela": falhas,
+                "taxa_erro": round(falhas / total, 3) if total else 0.0,
+                "aberturas": self._aberturas,
+                "rejeitadas": self._rejeitadas,
+                "meio_aberto_em_segundos": reabre_em
+            }
+
+
+class DisjuntoresEnergisa:
+    """Registro (por processo) dos disjuntores de cada família de endpoint."""
+
+    def __init__(self):
+        self._disjuntores: dict = {}
+        self._lock = threading.Lock()
+
+    def obter(self, familia: str) -> CircuitBreaker:
+        with self._lock:
+            disjuntor = self._disjuntores.get(familia)
+            if disjuntor is None:
+                disjuntor = CircuitBreaker(
+                    familia,
+                    limite_taxa_erro=settings.ENERGISA_CIRCUITO_TAXA_ERRO,
+                    minimo_requisicoes=settings.ENERGISA_CIRCUITO_MINIMO_REQUISICOES,
+                    janela_segundos=settings.ENERGISA_CIRCUITO_JANELA_SEGUNDOS,
+                    tempo_aberto=settings.ENERGISA_CIRCUITO_TEMPO_ABERTO_SEGUNDOS
+                )
+                self._disjuntores[familia] = disjuntor
+            return disjuntor
+
+    def abertos(self, familias=None) -> list:
+        """Famílias (entre as informadas) com disjuntor aberto."""
+        with self._lock:
+            itens = list(self._disjuntores.items())
+        return [
+            familia for familia, disjuntor in itens
+            if (familias is None or familia in familias) and disjuntor.esta_aberto()
+        ]
+
+    def get_status(self) -> dict:
+        with self._lock:
+            itens = list(self._disjuntores.items())
+        return {familia: disjuntor.get_status() for familia, disjuntor in itens}
+
+
+# Instância global
+disjuntores_energisa = DisjuntoresEnergisa()
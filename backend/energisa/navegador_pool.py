@@ -0,0 +1,456 @@
+"""
+Pool de Navegadores - Chromium pré-aquecidos para os logins na Energisa
+Cada login (e cada simulação pública) lançava um Chromium novo: segundos de
+espera e centenas de MB por login. O pool mantém alguns processos Chromium
+vivos com --remote-debugging-port; cada login conecta via CDP
+(connect_over_cdp) e cria o próprio BrowserContext, isolado dos demais
+(cookies, localStorage). Os processos são reciclados após N usos ou acima de
+um limite de memória e encerrados no shutdown. Pool cheio, desativado ou com
+falha: o login lança um Chromium próprio, como antes
+"""
+
+import os
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+import logging
+from typing import Optional
+from urllib.parse import urlsplit
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Argumentos do Chrome para parecer mais humano (bypass do Akamai)
+ARGUMENTOS_CHROMIUM = [
+    "--no-sandbox",
+    "--disable-dev-shm-usage",
+    "--disable-blink-features=AutomationControlled",
+    "--disable-infobars",
+    "--disable-gpu",
+    "--window-size=1280,1024",
+    "--start-maximized",
+    "--disable-features=IsolateOrigins,site-per-process",
+    "--disable-site-isolation-trials",
+    "--disable-web-security",
+    "--allow-running-insecure-content",
+]
+
+# Tempo máximo para o Chromium publicar a porta de debug
+TIMEOUT_INICIO_SEGUNDOS = 20
+
+
+def ha_display_disponivel() -> bool:
+    """Há display X (real ou xvfb)? Com display o Chromium roda headed (melhor contra o Akamai)."""
+    return bool(os.environ.get("DISPLAY"))
+
+
+def argumentos_chromium(headless: bool) -> list:
+    """Argumentos de lançamento (o novo headless do Chrome é mais difícil de detectar)."""
+    return ARGUMENTOS_CHROMIUM + (["--headless=new"] if headless else [])
+
+
+# Tipos de recurso dispensáveis no login (a página funciona sem eles)
+TIPOS_RECURSO_BLOQUEADOS = {"image", "font", "media"}
+
+# Analytics/marketing de terceiros (qualquer tipo de recurso)
+HOSTS_BLOQUEADOS = (
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "googleadservices.com",
+    "facebook.net",
+    "facebook.com",
+    "hotjar.com",
+    "clarity.ms",
+    "tiktok.com",
+    "linkedin.com",
+)
+
+# Nunca bloqueados: o Akamai Bot Manager roda no próprio domínio e em CDNs da Akamai
+HOSTS_PERMITIDOS = (
+    "energisa.com.br",
+    "akamaihd.net",
+    "akamaized.net",
+    "akamai.net",
+    "akstat.io",
+)
+
+
+def _host(url: str) -> str:
+    return urlsplit(url).hostname or ""
+
+
+def _host_em(host: str, dominios: tuple) -> bool:
+    return any(host == d or host.endswith("." + d) for d in dominios)
+
+
+def recurso_bloqueado(url: str, tipo_recurso: str) -> bool:
+    """Requisição dispensável no login? (allow-list do Akamai tem precedência)"""
+    host = _host(url)
+    if _host_em(host, HOSTS_PERMITIDOS):
+        return tipo_recurso in TIPOS_RECURSO_BLOQUEADOS
+    return tipo_recurso in TIPOS_RECURSO_BLOQUEADOS or _host_em(host, HOSTS_BLOQUEADOS)
+
+
+def configurar_bloqueio_recursos(context):
+    """
+    Aborta imagens, fontes, mídia e analytics no contexto do login (menos banda e
+    CPU por navegador). Scripts e XHR do portal e da Akamai passam sempre.
+    """
+    if not settings.ENERGISA_LOGIN_BLOQUEAR_RECURSOS:
+        return
+
+    def _filtrar(route):
+        request = route.request
+        if recurso_bloqueado(request.url, request.resource_type):
+            route.abort()
+        else:
+            route.continue_()
+
+    context.route("**/*", _filtrar)
+
+
+def aguardar_seletor(page, seletor: str, timeout_ms: int, estado: str = "visible") -> bool:
+    """Espera o seletor (em vez de sleep fixo). Retorna False no timeout, sem erro."""
+    try:
+        page.wait_for_selector(seletor, state=estado, timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+def _memoria_arvore_mb(pid: int) -> float:
+    """RSS do processo e de todos os descendentes (Chromium usa vários processos), via /proc."""
+    filhos = {}
+    for entrada in os.listdir("/proc"):
+        if not entrada.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entrada}/stat") as f:
+                # O nome do processo pode ter espaços: o ppid vem depois do último ")"
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            filhos.setdefault(ppid, []).append(int(entrada))
+        except (OSError, ValueError, IndexError):
+            continue
+
+    total_kb = 0
+    pendentes = [pid]
+    while pendentes:
+        atual = pendentes.pop()
+        pendentes.extend(filhos.get(atual, []))
+        try:
+            with open(f"/proc/{atual}/status") as f:
+                for linha in f:
+                    if linha.startswith("VmRSS:"):
+                        total_kb += int(linha.split()[1])
+                        break
+        except (OSError, ValueError):
+            continue
+    return total_kb / 1024
+
+
+class NavegadorChromium:
+    """Processo Chromium do pool (acessado via CDP em self.endpoint)."""
+
+    def __init__(self, executavel: str, headless: bool):
+        self.executavel = executavel
+        self.headless = headless
+        self.processo: Optional[subprocess.Popen] = None
+        self.diretorio = tempfile.mkdtemp(prefix="energisa-chromium-")
+        self.endpoint: Optional[str] = None
+        self.usos = 0
+        self.em_uso = 0
+        self.aposentado = False
+
+    def iniciar(self):
+        """Lança o processo e espera a porta de debug (publicada em DevToolsActivePort)."""
+        comando = [
+            self.executavel,
+            *argumentos_chromium(self.headless),
+            "--remote-debugging-address=127.0.0.1",
+            "--remote-debugging-port=0",
+            f"--user-data-dir={self.diretorio}",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "about:blank",
+        ]
+        # Grupo de processos próprio: encerrar() derruba também os processos filhos
+        self.processo = subprocess.Popen(
+            comando, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+        )
+
+        arquivo_porta = os.path.join(self.diretorio, "DevToolsActivePort")
+        limite = time.monotonic() + TIMEOUT_INICIO_SEGUNDOS
+        while time.monotonic() < limite:
+            if self.processo.poll() is not None:
+                break
+            try:
+                with open(arquivo_porta) as f:
+                    porta = f.readline().strip()
+                if porta:
+                    self.endpoint = f"http://127.0.0.1:{porta}"
+                    logger.info(f"🌐 Chromium do pool iniciado (pid {self.processo.pid}, {self.endpoint})")
+                    return
+            except OSError:
+                pass
+            time.sleep(0.05)
+
+        self.encerrar()
+        raise RuntimeError("Chromium do pool não publicou a porta de debug")
+
+    def vivo(self) -> bool:
+        return self.processo is not None and self.processo.poll() is None
+
+    def memoria_mb(self) -> float:
+        if not self.vivo():
+            return 0.0
+        try:
+            return _memoria_arvore_mb(self.processo.pid)
+        except OSError:
+            # /proc indisponível (fora do Linux): sem reciclagem por memória
+            return 0.0
+
+    def encerrar(self):
+        if self.processo is not None and self.processo.poll() is None:
+            try:
+                os.killpg(self.processo.pid, signal.SIGTERM)
+                self.processo.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                try:
+                    os.killpg(self.processo.pid, signal.SIGKILL)
+                    self.processo.wait(timeout=5)
+                except (OSError, subprocess.TimeoutExpired):
+                    pass
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+
+
+class EmprestimoNavegador:
+    """
+    Navegador entregue a um login.
+
+    `browser` é um playwright Browser (conectado ao pool via CDP ou lançado
+    na hora). liberar() fecha os contextos criados pelo login e devolve a vaga.
+    """
+
+    def __init__(self, pool: "PoolNavegadores", browser, navegador: Optional[NavegadorChromium]):
+        self.pool = pool
+        self.browser = browser
+        self.navegador = navegador
+        self._liberado = False
+
+    @property
+    def do_pool(self) -> bool:
+        return self.navegador is not None
+
+    def liberar(self, reciclar: bool = False):
+        """
+        Args:
+            reciclar: Descarta o processo do pool quando ficar ocioso (ex: login
+                abandonado liberado por outra thread, que não consegue fechar o contexto)
+        """
+        if self._liberado:
+            return
+        self._liberado = True
+        if reciclar and self.navegador is not None:
+            self.navegador.aposentado = True
+        try:
+            # Lançado na hora: encerra o processo. Conectado via CDP: fecha os
+            # contextos criados por esta conexão e desconecta (o Chromium continua)
+            self.browser.close()
+        except Exception as e:
+            logger.warning(f"⚠️ Erro ao fechar navegador do login: {e}")
+        if self.navegador is not None:
+            self.pool._devolver(self.navegador)
+
+
+class PoolNavegadores:
+    """
+    Processos Chromium compartilhados pelos logins.
+
+    - tamanho: processos vivos no máximo (0 = desativado, sempre lança na hora)
+    - max_contextos: logins simultâneos por processo
+    - max_usos / max_memoria_mb: a partir daí o processo é reciclado assim que ficar ocioso
+    """
+
+    def __init__(self, tamanho: int, max_contextos: int, max_usos: int, max_memoria_mb: float):
+        self.tamanho = tamanho
+        self.max_contextos = max(1, max_contextos)
+        self.max_usos = max_usos
+        self.max_memoria_mb = max_memoria_mb
+        self._navegadores: list = []
+        self._iniciando = 0  # vagas reservadas para processos sendo lançados (fora do lock)
+        self._lock = threading.Lock()
+        self._encerrado = False
+        self._emprestimos = 0
+        self._avulsos = 0
+        self._reciclados = 0
+
+    @property
+    def ativo(self) -> bool:
+        return self.tamanho > 0 and not self._encerrado
+
+    def _reservar(self, executavel: str, headless: bool) -> Optional[NavegadorChromium]:
+        """Escolhe (ou lança) o processo menos ocupado com vaga; None se o pool estiver cheio."""
+        mortos = []
+        with self._lock:
+            for navegador in list(self._navegadores):
+                if not navegador.vivo():
+                    self._navegadores.remove(navegador)
+                    mortos.append(navegador)
+
+            candidatos = [
+                n for n in self._navegadores
+                if not n.aposentado and n.headless == headless and n.em_uso < self.max_contextos
+            ]
+            navegador = None
+            lancar = False
+            if candidatos:
+                navegador = min(candidatos, key=lambda n: n.em_uso)
+                navegador.em_uso += 1
+                navegador.usos += 1
+            elif len(self._navegadores) + self._iniciando < self.tamanho:
+                self._iniciando += 1
+                lancar = True
+
+        for navegador_morto in mortos:
+            navegador_morto.encerrar()
+
+        if lancar:
+            # Lançamento (até TIMEOUT_INICIO_SEGUNDOS) fora do lock: só a vaga fica reservada
+            navegador = self._iniciar_reservado(executavel, headless, em_uso=1)
+        return navegador
+
+    def _iniciar_reservado(self, executavel: str, headless: bool, em_uso: int = 0) -> Optional[NavegadorChromium]:
+        """Lança um processo em uma vaga já reservada (_iniciando) e o publica no pool."""
+        navegador = NavegadorChromium(executavel, headless)
+        try:
+            navegador.iniciar()
+        except Exception as e:
+            logger.warning(f"⚠️ Falha ao iniciar Chromium do pool: {e}")
+            with self._lock:
+                self._iniciando -= 1
+            return None
+
+        with self._lock:
+            self._iniciando -= 1
+            publicar = not self._encerrado
+            if publicar:
+                navegador.em_uso += em_uso
+                navegador.usos += em_uso
+                self._navegadores.append(navegador)
+
+        if not publicar:
+            navegador.encerrar()
+            return None
+        return navegador
+
+    def _devolver(self, navegador: NavegadorChromium):
+        # Leitura do /proc fora do lock
+        memoria = navegador.memoria_mb() if self.max_memoria_mb and not navegador.aposentado else 0.0
+        with self._lock:
+            navegador.em_uso -= 1
+            if not navegador.aposentado and (
+                navegador.usos >= self.max_usos
+                or (self.max_memoria_mb and memoria > self.max_memoria_mb)
+            ):
+                navegador.aposentado = True
+                logger.info(f"♻️ Chromium do pool (pid {navegador.processo.pid}) será reciclado após {navegador.usos} usos")
+            encerrar = navegador.aposentado and navegador.em_uso == 0
+            if encerrar and navegador in self._navegadores:
+                self._navegadores.remove(navegador)
+                self._reciclados += 1
+
+        if encerrar:
+            navegador.encerrar()
+
+    def obter_navegador(self, playwright, headless: bool) -> EmprestimoNavegador:
+        """
+        Entrega um navegador para um login (a thread do login é dona do `playwright`).
+
+        Args:
+            playwright: Instância de sync_playwright() da thread do login
+            headless: Sem display X disponível
+        """
+        if self.ativo:
+            navegador = self._reservar(playwright.chromium.executable_path, headless)
+            if navegador is not None:
+                try:
+                    browser = playwright.chromium.connect_over_cdp(navegador.endpoint, timeout=10000)
+                    with self._lock:
+                        self._emprestimos += 1
+                    return EmprestimoNavegador(self, browser, navegador)
+                except Exception as e:
+                    logger.warning(f"⚠️ Falha ao conectar no Chromium do pool, lançando um novo: {e}")
+                    navegador.aposentado = True
+                    self._devolver(navegador)
+
+        with self._lock:
+            self._avulsos += 1
+        browser = playwright.chromium.launch(
+            headless=headless,
+            args=argumentos_chromium(headless),
+            ignore_default_args=["--enable-automation"]
+        )
+        return EmprestimoNavegador(self, browser, None)
+
+    def aquecer(self):
+        """Lança os processos do pool em background (chamado na inicialização da API)."""
+        if not self.ativo:
+            return
+
+        def _aquecer():
+            from playwright.sync_api import sync_playwright
+
+            try:
+                with sync_playwright() as playwright:
+                    executavel = playwright.chromium.executable_path
+                headless = not ha_display_disponivel()
+                while True:
+                    with self._lock:
+                        if self._encerrado or len(self._navegadores) + self._iniciando >= self.tamanho:
+                            break
+                        self._iniciando += 1
+                    if self._iniciar_reservado(executavel, headless) is None:
+                        break
+            except Exception as e:
+                logger.warning(f"⚠️ Não foi possível aquecer o pool de navegadores: {e}")
+
+        threading.Thread(target=_aquecer, name="navegador-pool-aquecimento", daemon=True).start()
+
+    def encerrar(self):
+        """Encerra todos os processos (shutdown). Logins em andamento perdem o navegador."""
+        with self._lock:
+            self._encerrado = True
+            navegadores, self._navegadores = self._navegadores, []
+        for navegador in navegadores:
+            navegador.encerrar()
+        if navegadores:
+            logger.info(f"🛑 Pool de navegadores encerrado ({len(navegadores)} processos)")
+
+    def get_status(self) -> dict:
+        with self._lock:
+            navegadores = list(self._navegadores)
+            status = {
+                "tamanho": self.tamanho,
+                "processos": len(navegadores),
+                "iniciando": self._iniciando,
+                "contextos_em_uso": sum(n.em_uso for n in navegadores),
+                "emprestimos": self._emprestimos,
+                "lancamentos_avulsos": self._avulsos,
+                "reciclados": self._reciclados,
+            }
+        status["memoria_mb"] = round(sum(n.memoria_mb() for n in navegadores), 1)
+        return status
+
+
+# Instância global (logins da API e simulações públicas)
+navegador_pool = PoolNavegadores(
+    tamanho=settings.ENERGISA_BROWSER_POOL_TAMANHO,
+    max_contextos=settings.ENERGISA_BROWSER_POOL_MAX_CONTEXTOS,
+    max_usos=settings.ENERGISA_BROWSER_POOL_MAX_USOS,
+    max_memoria_mb=settings.ENERGISA_BROWSER_POOL_MAX_MEMORIA_MB
+)
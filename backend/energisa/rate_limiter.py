@@ -0,0 +1,140 @@
+"""
+Rate Limiter - Token bucket compartilhado para o tráfego com a Energisa
+Todas as requisições a servicos.energisa.com.br do processo passam por aqui,
+com prioridade para requisições interativas sobre a sincronização em background
+"""
+
+import asyncio
+import time
+import threading
+from typing import Optional
+
+from backend.config import settings
+
+# Classes de prioridade (menor = mais prioritária)
+PRIORIDADE_INTERATIVA = 0  # Rotas /api/energisa/*, simulação, ações do usuário
+PRIORIDADE_BACKGROUND = 1  # SyncService, sampler de debug
+
+NOMES_PRIORIDADE = {
+    PRIORIDADE_INTERATIVA: "interativa",
+    PRIORIDADE_BACKGROUND: "background",
+}
+
+
+class TokenBucket:
+    """
+    Token bucket thread-safe com classes de prioridade.
+
+    Uma requisição só consome um token se não houver requisições de classe
+    mais prioritária aguardando, então chamadas interativas passam na frente
+    da sincronização quando o bucket está vazio.
+    """
+
+    def __init__(self, taxa_por_segundo: float, rajada: int):
+        """
+        Args:
+            taxa_por_segundo: Tokens repostos por segundo (requisições/s sustentadas)
+            rajada: Capacidade do bucket (requisições permitidas em rajada)
+        """
+        self.taxa = max(0.001, float(taxa_por_segundo))
+        self.capacidade = max(1, int(rajada))
+        self._tokens = float(self.capacidade)
+        self._ultimo = time.monotonic()
+        self._cond = threading.Condition()
+        self._aguardando = {p: 0 for p in NOMES_PRIORIDADE}
+        self._atendidas = {p: 0 for p in NOMES_PRIORIDADE}
+        self._espera_total = {p: 0.0 for p in NOMES_PRIORIDADE}
+
+    def _repor(self):
+        agora = time.monotonic()
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+        self._ultimo = agora
+
+    def _ha_mais_prioritaria(self, prioridade: int) -> bool:
+        return any(qtd for p, qtd in self._aguardando.items() if p < prioridade)
+
+    def adquirir(self, prioridade: int = PRIORIDADE_INTERATIVA, timeout: Optional[float] = None) -> bool:
+        """
+        Bloqueia até obter um token.
+
+        Args:
+            prioridade: PRIORIDADE_INTERATIVA ou PRIORIDADE_BACKGROUND
+            timeout: Espera máxima em segundos (None = sem limite)
+
+        Returns:
+            True se obteve o token, False se o timeout expirou
+        """
+        inicio = time.monotonic()
+        limite = inicio + timeout if timeout is not None else None
+
+        with self._cond:
+            self._aguardando[prioridade] += 1
+            try:
+                while True:
+                    self._repor()
+                    if self._tokens >= 1 and not self._ha_mais_prioritaria(prioridade):
+                        self._tokens -= 1
+                        self._atendidas[prioridade] += 1
+                        self._espera_total[prioridade] += time.monotonic() - inicio
+                        return True
+
+                    espera = max(0.001, (1 - self._tokens) / self.taxa)
+                    if limite is not None:
+                        restante = limite - time.monotonic()
+                        if restante <= 0:
+                            return False
+                        espera = min(espera, restante)
+                    self._cond.wait(espera)
+            finally:
+                self._aguardando[prioridade] -= 1
+                self._cond.notify_all()
+
+    async def adquirir_async(self, prioridade: int = PRIORIDADE_INTERATIVA) -> bool:
+        """
+        Versão para o event loop: espera com asyncio.sleep até o próximo token
+        (sem ocupar threads do executor), na mesma fila por prioridade das
+        sessões síncronas.
+        """
+        inicio = time.monotonic()
+        with self._cond:
+            self._aguardando[prioridade] += 1
+        try:
+            while True:
+                with self._cond:
+                    self._repor()
+                    if self._tokens >= 1 and not self._ha_mais_prioritaria(prioridade):
+                        self._tokens -= 1
+                        self._atendidas[prioridade] += 1
+                        self._espera_total[prioridade] += time.monotonic() - inicio
+                        return True
+                    # Sem token: até o próximo; com token reservado a uma classe
+                    # mais prioritária: o intervalo de um token
+                    espera = (1 - self._tokens) / self.taxa if self._tokens < 1 else 1 / self.taxa
+                await asyncio.sleep(max(0.001, espera))
+        finally:
+            with self._cond:
+                self._aguardando[prioridade] -= 1
+                self._cond.notify_all()
+
+    def get_status(self) -> dict:
+        """Retorna tokens disponíveis, fila por prioridade e espera média."""
+        with self._cond:
+            self._repor()
+            return {
+                "taxa_por_segundo": self.taxa,
+                "rajada": self.capacidade,
+                "tokens_disponiveis": round(self._tokens, 2),
+                "aguardando": {NOMES_PRIORIDADE[p]: q for p, q in self._aguardando.items()},
+                "atendidas": {NOMES_PRIORIDADE[p]: q for p, q in self._atendidas.items()},
+                "espera_media_ms": {
+                    NOMES_PRIORIDADE[p]: round(self._espera_total[p] / q * 1000, 1) if q else None
+                    for p, q in self._atendidas.items()
+                },
+            }
+
+
+# Limiter único do processo para servicos.energisa.com.br
+energisa_rate_limiter = TokenBucket(
+    taxa_por_segundo=settings.ENERGISA_RATE_LIMIT_RPS,
+    rajada=settings.ENERGISA_RATE_LIMIT_RAJADA
+)
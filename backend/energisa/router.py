@@ -11,14 +11,49 @@ import threading
 import queue
 import time
 
-from backend.core.security import get_current_active_user, CurrentUser, optional_auth
-from backend.energisa.service import EnergisaService
+from backend.config import settings
+from backend.core.security import get_current_active_user, CurrentUser, optional_auth, require_perfil
+from backend.energisa.service import EnergisaService, PENDING_LOGINS
+from backend.energisa.navegador_pool import (
+    navegador_pool, ha_display_disponivel, configurar_bloqueio_recursos, aguardar_seletor
+)
+from backend.energisa.sessoes_login import ArmazemSessoesLoginMemoria
+from backend.energisa.rate_limiter import energisa_rate_limiter
+from backend.energisa.circuit_breaker import disjuntores_energisa
+from backend.energisa.build_id import build_id_cache
+from backend.energisa.cache_respostas import cache_respostas
+from backend.energisa.session_manager import SessionManager
 from backend.energisa import constants, calculadora, aneel_api
 
 router = APIRouter()
 
-# Gerenciador de sessões de login em threads separadas
-_login_sessions = {}
+
+
+def _cancelar_login(transaction_id: str, session: dict):
+    """Sessão expirada: encerra o worker, que fecha o navegador."""
+    session["cmd_queue"].put({"action": "cancel"})
+
+
+# Gerenciador de sessões de login em threads separadas (limitado, com TTL)
+_login_sessions = ArmazemSessoesLoginMemoria(
+    "login_sessions",
+    max_sessoes=settings.ENERGISA_LOGIN_SESSOES_MAX,
+    ttl_segundos=settings.ENERGISA_LOGIN_SESSAO_TTL_SEGUNDOS,
+    ao_descartar=_cancelar_login
+)
+
+
+def _reservar_vaga_login():
+    """
+    Reserva a vaga do login antes de abrir o navegador (devolvida com
+    _login_sessions.liberar_reserva se o login não virar sessão). Recusa novos
+    logins quando o limite de sessões simultâneas foi atingido.
+    """
+    if not _login_sessions.reservar():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Muitos logins em andamento. Tente novamente em alguns minutos."
+        )
 
 
 # ========================
@@ -44,6 +79,7 @@ class UcRequest(BaseModel):
     codigoEmpresaWeb: Optional[int] = 6
     cdc: Optional[int] = None
     digitoVerificadorCdc: Optional[int] = None
+    max_age: Optional[int] = None  # Idade máxima (s) aceita dos dados em cache; 0 = consulta o portal
 
 
 class FaturaRequest(UcRequest):
@@ -114,9 +150,8 @@ def _has_display_available() -> bool:
 
     # Se DISPLAY está definido, assume que xvfb está rodando
     # O Dockerfile configura DISPLAY=:99 e inicia xvfb automaticamente
-    display = os.environ.get('DISPLAY')
-    if display:
-        print(f"   [Display] DISPLAY={display} detectado")
+    if ha_display_disponivel():
+        print(f"   [Display] DISPLAY={os.environ.get('DISPLAY')} detectado")
         return True
 
     return False
@@ -130,7 +165,7 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
     import time
 
     playwright_instance = None
-    browser = None
+    emprestimo = None
     page = None
 
     try:
@@ -143,36 +178,16 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
         # Caso contrário, usa headless como fallback
         use_headless = not _has_display_available()
 
-        # Argumentos do Chrome para parecer mais humano
-        args = [
-            "--no-sandbox",
-            "--disable-dev-shm-usage",
-            "--disable-blink-features=AutomationControlled",
-            "--disable-infobars",
-            "--disable-gpu",
-            "--window-size=1280,1024",
-            "--start-maximized",
-            # Argumentos adicionais para bypass de detecção
-            "--disable-features=IsolateOrigins,site-per-process",
-            "--disable-site-isolation-trials",
-            "--disable-web-security",
-            "--allow-running-insecure-content",
-        ]
-
         if use_headless:
             print("   [Browser] Modo headless (sem display X disponível)")
             print("   [WARN] Modo headless pode ser bloqueado pelo Akamai!")
             print("   [WARN] Para melhor funcionamento, instale xvfb: apt-get install xvfb")
-            # Usa o novo headless do Chrome que é mais difícil de detectar
-            args.append("--headless=new")
         else:
             print("   [Browser] Modo headed (display X detectado)")
 
-        browser = playwright_instance.chromium.launch(
-            headless=use_headless,
-            args=args,
-            ignore_default_args=["--enable-automation"]
-        )
+        # Chromium pré-aquecido do pool (ou lançado na hora); cada login tem seu próprio contexto
+        emprestimo = navegador_pool.obter_navegador(playwright_instance, use_headless)
+        browser = emprestimo.browser
 
         # User-agent realista para evitar detecção
         user_agent = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
@@ -272,6 +287,7 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
             };
         }
         """)
+        configurar_bloqueio_recursos(context)
 
         page = context.new_page()
 
@@ -320,6 +336,8 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
             if random.random() > 0.9:
                 page.mouse.wheel(0, random.randint(-100, 100))
 
+            # Pausa aleatória entre movimentos: faz parte da simulação humana avaliada
+            # pelo sensor do Akamai (não trocar por espera de evento)
             time.sleep(random.uniform(0.5, 1.5))
 
         # Verifica se foi bloqueado ou redirecionado
@@ -331,15 +349,9 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
 
         # Aguarda a página carregar completamente
         print("   [Page] Aguardando carregamento completo da pagina...")
-        time.sleep(5 if use_headless else 3)
 
-        # Aguarda que o React/SPA renderize
-        try:
-            page.wait_for_load_state("networkidle", timeout=10000)
-        except:
-            pass
-
-        # Tenta aguardar por um input na página
+        # Aguarda que o React/SPA renderize: o primeiro input marca a tela de login pronta
+        # (networkidle não serve: o sensor do Akamai mantém requisições abertas)
         try:
             page.wait_for_selector('input', timeout=20000)
             print("   [Page] Input encontrado na pagina")
@@ -424,7 +436,7 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
         if not cpf_input_found:
             print("   [CPF] Tentando busca generica de inputs...")
             try:
-                time.sleep(2)
+                aguardar_seletor(page, 'input', 2000)
                 inputs = page.locator('input').all()
                 print(f"   [CPF] Encontrados {len(inputs)} inputs na pagina")
 
@@ -470,7 +482,7 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
         print("   [Worker] Aguardando JSON de telefones...")
 
         with page.expect_response(lambda response: "selecionar-numero.json" in response.url and response.status == 200, timeout=30000) as response_info:
-            time.sleep(1)
+            aguardar_seletor(page, 'button:has-text("ENTRAR"):enabled, button:has-text("Entrar"):enabled', 5000)
             page.click('button:has-text("ENTRAR"), button:has-text("Entrar")')
 
         response = response_info.value
@@ -535,6 +547,8 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
         # Fase 2: Seleção
         print("   [Worker] Aguardando escolha do contato (telefone/e-mail)...")
         cmd = cmd_queue.get(timeout=300)
+        if cmd.get("action") == "cancel":
+            raise Exception("Login cancelado: sessão expirada")
         if cmd.get("action") != "select_phone":
             raise Exception("Comando inválido")
 
@@ -567,7 +581,7 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
             elif page.is_visible('input[type="radio"]'):
                 page.click('input[type="radio"]')
 
-        time.sleep(1)
+        aguardar_seletor(page, 'button:has-text("AVANÇAR"):enabled', 5000)
         if page.is_visible('button:has-text("AVANÇAR")'):
             page.click('button:has-text("AVANÇAR")')
         else:
@@ -577,6 +591,8 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
 
         # Fase 3: Finish SMS
         cmd = cmd_queue.get(timeout=300)
+        if cmd.get("action") == "cancel":
+            raise Exception("Login cancelado: sessão expirada")
         if cmd.get("action") != "finish_sms":
             raise Exception("Comando inválido")
 
@@ -586,7 +602,7 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
         if page.is_visible('input'):
             page.click('input')
         page.keyboard.type(sms, delay=100)
-        time.sleep(0.5)
+        aguardar_seletor(page, 'button:has-text("AVANÇAR"):enabled', 5000)
         page.click('button:has-text("AVANÇAR")')
 
         print("   [Wait] Aguardando autenticacao...")
@@ -595,6 +611,16 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
         except:
             pass
 
+        # Tokens chegam no localStorage logo após o redirect
+        try:
+            page.wait_for_function(
+                "() => localStorage.getItem('rtk') || localStorage.getItem('accessTokenEnergisa')"
+                " || localStorage.getItem('token')",
+                timeout=10000
+            )
+        except:
+            pass
+
         # Captura tokens
         final_cookies = {c['name']: c['value'] for c in page.context.cookies()}
 
@@ -626,8 +652,8 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
         print(f"[Worker Error] {e}")
         result_queue.put({"success": False, "error": str(e)})
     finally:
-        if browser:
-            browser.close()
+        if emprestimo:
+            emprestimo.liberar()
         if playwright_instance:
             playwright_instance.stop()
 
@@ -639,33 +665,40 @@ def _login_worker_thread(cpf: str, cmd_queue: queue.Queue, result_queue: queue.Q
 @router.post("/login/start", summary="Iniciar login na Energisa")
 async def login_start(req: LoginStartRequest, current_user: CurrentUser = Depends(get_current_active_user)):
     """Inicia o navegador e retorna a lista de telefones interceptada."""
+    _reservar_vaga_login()
+
     cmd_q = queue.Queue()
     result_q = queue.Queue()
 
     cpf_clean = req.cpf.replace(".", "").replace("-", "")
 
-    thread = threading.Thread(
-        target=_login_worker_thread,
-        args=(cpf_clean, cmd_q, result_q),
-        daemon=True
-    )
-    thread.start()
-
     try:
-        result = result_q.get(timeout=60)
-    except queue.Empty:
-        raise HTTPException(500, "Timeout ao carregar opções de login")
+        thread = threading.Thread(
+            target=_login_worker_thread,
+            args=(cpf_clean, cmd_q, result_q),
+            daemon=True
+        )
+        thread.start()
 
-    if not result.get("success"):
-        raise HTTPException(500, result.get("error", "Erro desconhecido"))
+        try:
+            result = result_q.get(timeout=60)
+        except queue.Empty:
+            cmd_q.put({"action": "cancel"})
+            raise HTTPException(500, "Timeout ao carregar opções de login")
+
+        if not result.get("success"):
+            raise HTTPException(500, result.get("error", "Erro desconhecido"))
+    except BaseException:
+        _login_sessions.liberar_reserva()
+        raise
 
     transaction_id = result["transaction_id"]
 
-    _login_sessions[transaction_id] = {
+    _login_sessions.adicionar(transaction_id, {
         "thread": thread,
         "cmd_queue": cmd_q,
         "result_queue": result_q
-    }
+    }, reservada=True)
 
     return {
         "transaction_id": transaction_id,
@@ -677,7 +710,7 @@ async def login_start(req: LoginStartRequest, current_user: CurrentUser = Depend
 @router.post("/login/select-option", summary="Selecionar telefone para SMS")
 async def login_select_option(req: LoginSelectRequest, current_user: CurrentUser = Depends(get_current_active_user)):
     """Recebe o transaction_id e o telefone escolhido."""
-    session = _login_sessions.get(req.transaction_id)
+    session = _login_sessions.obter(req.transaction_id)
     if not session:
         raise HTTPException(400, "Sessão não encontrada")
 
@@ -700,7 +733,7 @@ async def login_select_option(req: LoginSelectRequest, current_user: CurrentUser
 @router.post("/login/finish", summary="Finalizar login com código SMS")
 async def login_finish(req: LoginFinishRequest, current_user: CurrentUser = Depends(get_current_active_user)):
     """Recebe o código SMS e finaliza."""
-    session = _login_sessions.pop(req.transaction_id, None)
+    session = _login_sessions.remover(req.transaction_id)
     if not session:
         raise HTTPException(400, "Sessão expirada")
 
@@ -740,7 +773,7 @@ async def list_ucs(req: UcRequest, current_user: CurrentUser = Depends(get_curre
     if not svc.is_authenticated():
         raise HTTPException(401, "Não autenticado na Energisa")
     try:
-        return svc.listar_ucs()
+        return svc.listar_ucs(max_age=req.max_age)
     except Exception as e:
         raise HTTPException(500, str(e))
 
@@ -754,7 +787,7 @@ async def uc_info_detalhada(req: UcRequest, current_user: CurrentUser = Depends(
         if not svc.is_authenticated():
             raise HTTPException(401, "Sessão inválida ou expirada. Faça login novamente.")
 
-        result = svc.get_uc_info(req.model_dump())
+        result = svc.get_uc_info(req.model_dump(), max_age=req.max_age)
 
         if result.get("errored"):
             raise HTTPException(400, detail=result.get("message", "Erro ao consultar dados da UC"))
@@ -806,7 +839,7 @@ async def download_pdf(req: FaturaRequest, current_user: CurrentUser = Depends(g
 async def get_gd(req: UcRequest, current_user: CurrentUser = Depends(get_current_active_user)):
     """Busca informações de GD da UC."""
     try:
-        return EnergisaService(req.cpf).get_gd_info(req.model_dump())
+        return EnergisaService(req.cpf).get_gd_info(req.model_dump(), max_age=req.max_age)
     except Exception as e:
         raise HTTPException(500, str(e))
 
@@ -815,7 +848,7 @@ async def get_gd(req: UcRequest, current_user: CurrentUser = Depends(get_current
 async def get_gd_details(req: UcRequest, current_user: CurrentUser = Depends(get_current_active_user)):
     """Busca histórico detalhado de créditos e geração."""
     try:
-        data = EnergisaService(req.cpf).get_gd_details(req.model_dump())
+        data = EnergisaService(req.cpf).get_gd_details(req.model_dump(), max_age=req.max_age)
         if not data:
             return {"infos": [], "errored": True}
         return data
@@ -842,6 +875,34 @@ async def alterar_beneficiaria_gd(req: AlteracaoGdRequest, current_user: Current
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ========================
+# Métricas (Protegidas)
+# ========================
+
+@router.get(
+    "/metricas",
+    summary="Métricas do gateway Energisa",
+    dependencies=[Depends(require_perfil("superadmin", "gestor"))]
+)
+async def get_energisa_metricas(current_user: CurrentUser = Depends(get_current_active_user)):
+    """
+    Estado dos recursos compartilhados deste processo: sessões de login em
+    andamento, pool de navegadores, caches, rate limiter e circuit breakers.
+
+    Requer perfil superadmin ou gestor.
+    """
+    return {
+        "sessoes_login": _login_sessions.get_status(),
+        "logins_pendentes": PENDING_LOGINS.get_status(),
+        "navegadores": navegador_pool.get_status(),
+        "build_id": build_id_cache.get_status(),
+        "cache_respostas": cache_respostas.get_status(),
+        "sessoes_energisa": SessionManager.get_status_cache(),
+        "rate_limiter": energisa_rate_limiter.get_status(),
+        "circuitos": disjuntores_energisa.get_status()
+    }
+
+
 # ========================
 # Rotas Públicas (Simulação - Landing Page)
 # ========================
@@ -856,28 +917,35 @@ async def public_simulation_start(req: PublicSimulationStart, request: Request):
 
         cpf_clean = req.cpf.replace(".", "").replace("-", "")
 
+        _reservar_vaga_login()
+
         cmd_queue = queue.Queue()
         result_queue = queue.Queue()
 
-        worker_thread = threading.Thread(
-            target=_login_worker_thread,
-            args=(cpf_clean, cmd_queue, result_queue),
-            daemon=True
-        )
-        worker_thread.start()
-
         try:
-            result = result_queue.get(timeout=60)
-        except queue.Empty:
-            raise HTTPException(status_code=500, detail="Timeout aguardando lista de telefones")
+            worker_thread = threading.Thread(
+                target=_login_worker_thread,
+                args=(cpf_clean, cmd_queue, result_queue),
+                daemon=True
+            )
+            worker_thread.start()
 
-        if not result.get("success"):
-            raise HTTPException(status_code=500, detail=result.get("error", "Erro desconhecido"))
+            try:
+                result = result_queue.get(timeout=60)
+            except queue.Empty:
+                cmd_queue.put({"action": "cancel"})
+                raise HTTPException(status_code=500, detail="Timeout aguardando lista de telefones")
+
+            if not result.get("success"):
+                raise HTTPException(status_code=500, detail=result.get("error", "Erro desconhecido"))
+        except BaseException:
+            _login_sessions.liberar_reserva()
+            raise
 
         transaction_id = result["transaction_id"]
         session_id = f"pub_{transaction_id}"
 
-        _login_sessions[session_id] = {
+        _login_sessions.adicionar(session_id, {
             "thread": worker_thread,
             "cmd_queue": cmd_queue,
             "result_queue": result_queue,
@@ -885,7 +953,7 @@ async def public_simulation_start(req: PublicSimulationStart, request: Request):
             "ip": ip,
             "transaction_id": transaction_id,
             "created_at": time.time()
-        }
+        }, reservada=True)
 
         return {
             "transaction_id": session_id,
@@ -903,7 +971,7 @@ async def public_simulation_start(req: PublicSimulationStart, request: Request):
 async def public_simulation_send_sms(req: PublicSimulationSelectPhone, request: Request):
     """Endpoint público para enviar SMS ao telefone selecionado."""
     try:
-        session = _login_sessions.get(req.transactionId)
+        session = _login_sessions.obter(req.transactionId)
         if not session:
             raise HTTPException(400, "Sessão não encontrada ou expirada")
 
@@ -934,11 +1002,10 @@ async def public_simulation_validate_sms(req: PublicSimulationSms, request: Requ
     try:
         session_id = req.sessionId
 
-        if session_id not in _login_sessions:
+        session_data = _login_sessions.obter(session_id)
+        if not session_data:
             raise HTTPException(status_code=404, detail="Sessão não encontrada ou expirada")
 
-        session_data = _login_sessions[session_id]
-
         cmd_queue = session_data["cmd_queue"]
         result_queue = session_data["result_queue"]
 
@@ -952,7 +1019,8 @@ async def public_simulation_validate_sms(req: PublicSimulationSms, request: Requ
         if not result.get("success"):
             raise HTTPException(status_code=400, detail=result.get("error", "Erro na validação do SMS"))
 
-        _login_sessions[session_id]["authenticated"] = True
+        session_data["authenticated"] = True
+        _login_sessions.adicionar(session_id, session_data)
 
         return {
             "success": True,
@@ -970,11 +1038,10 @@ async def public_simulation_validate_sms(req: PublicSimulationSms, request: Requ
 async def public_simulation_get_ucs(session_id: str, request: Request):
     """Endpoint público para buscar UCs após autenticação."""
     try:
-        if session_id not in _login_sessions:
+        session_data = _login_sessions.obter(session_id)
+        if not session_data:
             raise HTTPException(status_code=404, detail="Sessão não encontrada")
 
-        session_data = _login_sessions[session_id]
-
         if not session_data.get("authenticated"):
             raise HTTPException(status_code=401, detail="Sessão não autenticada")
 
@@ -1001,11 +1068,10 @@ async def public_simulation_get_ucs(session_id: str, request: Request):
 async def public_simulation_get_faturas(session_id: str, codigo_uc: int, request: Request):
     """Endpoint público para buscar faturas de uma UC com cálculo de economia."""
     try:
-        if session_id not in _login_sessions:
+        session_data = _login_sessions.obter(session_id)
+        if not session_data:
             raise HTTPException(status_code=404, detail="Sessão não encontrada")
 
-        session_data = _login_sessions[session_id]
-
         if not session_data.get("authenticated"):
             raise HTTPException(status_code=401, detail="Sessão não autenticada")
 
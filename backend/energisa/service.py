@@ -5,21 +5,147 @@ PRESERVADO DO GATEWAY ORIGINAL - Não modificar lógica de scraping
 
 import playwright
 from playwright.sync_api import sync_playwright
-import requests
+import copy
+import math
 import time
-import re
+import queue
+import threading
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from backend.energisa.session_manager import SessionManager
+from backend.energisa.rate_limiter import PRIORIDADE_INTERATIVA
+from backend.energisa.sessao_http import SessaoEnergisa
+from backend.energisa.build_id import build_id_cache, buscar_build_id
+from backend.energisa.cache_respostas import cache_respostas, chave_uc
+from backend.energisa.navegador_pool import (
+    navegador_pool, ha_display_disponivel, configurar_bloqueio_recursos, aguardar_seletor
+)
+from backend.energisa.sessoes_login import ArmazemSessoesLoginMemoria
+from backend.config import settings
 
-# Armazena navegadores abertos temporariamente aguardando o SMS
+
+
+def _descartar_login_pendente(transaction_id: str, ctx: dict):
+    """
+    Login abandonado no SMS: pede à thread dona do Playwright (ver
+    EnergisaService._thread_login) que feche o navegador. Objetos do
+    Playwright síncrono não podem ser usados a partir da thread de limpeza.
+    """
+    ctx["cmd_queue"].put({"action": "cancel"})
+
+
+# Armazena navegadores abertos temporariamente aguardando o SMS (limitado, com TTL)
 # Chave: transaction_id | Valor: contexto do playwright
-PENDING_LOGINS = {}
+PENDING_LOGINS = ArmazemSessoesLoginMemoria(
+    "pending_logins",
+    max_sessoes=settings.ENERGISA_LOGIN_SESSOES_MAX,
+    ttl_segundos=settings.ENERGISA_LOGIN_SESSAO_TTL_SEGUNDOS,
+    ao_descartar=_descartar_login_pendente
+)
+
+# Single-flight do refresh token, compartilhado pelos clientes síncrono e assíncrono:
+# renovação em andamento por CPF e o resultado da última renovação
+# _REFRESH_EM_ANDAMENTO: cpf -> threading.Event (sinalizado ao concluir)
+# _ULTIMOS_REFRESH: cpf -> {concluido_em, sucesso, rtk, cookies}
+_REFRESH_GUARD = threading.Lock()
+_REFRESH_EM_ANDAMENTO = {}
+_ULTIMOS_REFRESH = {}
+
+# Tokens renovados há menos que isso são reaproveitados por instâncias com RTK antigo
+REFRESH_REUSO_SEGUNDOS = 60
+
+# Cookies de UC ativa são da instância (não são copiados entre sessões no refresh)
+COOKIES_CONTEXTO_UC = ("NumeroUc", "Digito", "CodigoEmpresaWeb")
+
+
+def chave_contexto_uc(uc_data: dict) -> tuple:
+    """Identifica a UC (empresa, cdc, dígito) nos cookies de contexto."""
+    return (
+        str(uc_data.get('codigoEmpresaWeb', 6)),
+        str(uc_data.get('cdc')),
+        str(uc_data.get('digitoVerificadorCdc'))
+    )
+
+
+def _consultar_refresh_recente(cpf: str, inicio: float, rtk_atual: str):
+    """
+    Decide, com _REFRESH_GUARD adquirido, se a última renovação pode ser reaproveitada.
+
+    Returns:
+        None para renovar agora; (False, None) se uma renovação concorrente
+        falhou; (True, cookies) para reaproveitar os tokens dela
+    """
+    ultimo = _ULTIMOS_REFRESH.get(cpf)
+    if not ultimo:
+        return None
+
+    concorrente = ultimo["concluido_em"] >= inicio
+    recente = time.monotonic() - ultimo["concluido_em"] < REFRESH_REUSO_SEGUNDOS
+    tokens_defasados = ultimo["sucesso"] and ultimo["rtk"] != rtk_atual
+
+    if concorrente and not ultimo["sucesso"]:
+        return False, None
+    if ultimo["sucesso"] and (concorrente or (recente and tokens_defasados)):
+        return True, ultimo["cookies"]
+    return None
+
+
+def _iniciar_refresh(cpf: str, inicio: float, rtk_atual: str):
+    """
+    Reserva a renovação do CPF (sem bloquear: quem chama espera o evento do jeito
+    do seu cliente, thread ou event loop).
+
+    Returns:
+        ("reaproveitar", cookies), ("falhou", None), ("aguardar", evento) se outra
+        chamada está renovando, ou ("renovar", evento) se esta chamada deve renovar
+        e depois chamar _concluir_refresh
+    """
+    with _REFRESH_GUARD:
+        recente = _consultar_refresh_recente(cpf, inicio, rtk_atual)
+        if recente is not None:
+            reaproveitar, cookies = recente
+            return ("reaproveitar", cookies) if reaproveitar else ("falhou", None)
+
+        evento = _REFRESH_EM_ANDAMENTO.get(cpf)
+        if evento is not None:
+            return "aguardar", evento
+
+        evento = threading.Event()
+        _REFRESH_EM_ANDAMENTO[cpf] = evento
+        return "renovar", evento
+
+
+def _concluir_refresh(cpf: str, evento: threading.Event, sucesso: Optional[bool], cookies: dict):
+    """
+    Registra o resultado da renovação e libera quem aguardava.
+
+    Args:
+        sucesso: None se a renovação foi interrompida (exceção/cancelamento):
+            nada é registrado e quem aguardava tenta de novo
+    """
+    with _REFRESH_GUARD:
+        if sucesso is not None:
+            _ULTIMOS_REFRESH[cpf] = {
+                "concluido_em": time.monotonic(),
+                "sucesso": sucesso,
+                "rtk": cookies.get("rtk") or cookies.get("refreshToken", ""),
+                "cookies": {
+                    k: v for k, v in cookies.items() if k not in COOKIES_CONTEXTO_UC
+                } if sucesso else {}
+            }
+        if _REFRESH_EM_ANDAMENTO.get(cpf) is evento:
+            del _REFRESH_EM_ANDAMENTO[cpf]
+    evento.set()
 
 
 class EnergisaService:
-    def __init__(self, cpf: str):
+    def __init__(self, cpf: str, prioridade: int = PRIORIDADE_INTERATIVA):
         self.cpf = cpf.replace(".", "").replace("-", "")
-        self.base_url = "https://servicos.energisa.com.br"
-        self.session = requests.Session()
+        self.base_url = settings.ENERGISA_BASE_URL.rstrip("/")
+        # Sessão com rate limit compartilhado do processo (interativa passa na frente do background)
+        self.session = SessaoEnergisa(prioridade)
+        # UC cujo contexto já foi ativado no portal via navegação em /faturas (empresa, cdc, dígito)
+        self._contexto_uc = None
 
         # Carrega cookies existentes se houver (ignora expiração para tentar refresh)
         self.cookies = SessionManager.load_session(self.cpf, ignore_expiry=True)
@@ -31,32 +157,11 @@ class EnergisaService:
             self.session.cookies.set(name, value)
 
     def _get_build_id(self):
-        """Busca o identificador da versão atual do site (necessário para rotas _next)"""
-        if hasattr(self, '_cached_build_id'):
-            return self._cached_build_id
-
-        print("   🔍 Buscando buildId do Next.js...")
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-        }
-
-        # Tenta buscar em rotas públicas primeiro (Login ou Home)
-        urls_to_try = [f"{self.base_url}/login", f"{self.base_url}/home"]
-
-        for url in urls_to_try:
-            try:
-                resp = self.session.get(url, headers=headers, timeout=10)
-                if resp.status_code == 200:
-                    match = re.search(r'"buildId"\s*:\s*"([^"]+)"', resp.text)
-                    if match:
-                        bid = match.group(1)
-                        self._cached_build_id = bid
-                        print(f"   ✅ BuildId encontrado em {url}: {bid}")
-                        return bid
-            except Exception as e:
-                print(f"   ⚠️ Erro ao buscar buildId em {url}: {e}")
-
-        return None
+        """
+        Identificador da versão atual do site (necessário para rotas _next).
+        Compartilhado pelo processo (ver energisa/build_id.py).
+        """
+        return build_id_cache.obter(lambda: buscar_build_id(self.session, self.base_url))
 
     def is_authenticated(self):
         if not self.cookies:
@@ -75,24 +180,83 @@ class EnergisaService:
     def start_login(self, final_telefone: str):
         print(f"🚀 Login: CPF {self.cpf} | Tel Final: {final_telefone}")
 
-        playwright = sync_playwright().start()
+        # Vaga reservada antes de abrir o navegador (com o limite atingido, o login é recusado)
+        if not PENDING_LOGINS.reservar():
+            raise Exception("Muitos logins em andamento. Tente novamente em alguns minutos.")
 
-        # 1. Argumentos para simular um PC real
-        args = [
-            "--no-sandbox",
-            "--disable-infobars",
-            "--start-maximized",
-            "--disable-blink-features=AutomationControlled",
-            "--disable-dev-shm-usage",
-            "--disable-gpu"
-        ]
-
-        browser = playwright.chromium.launch(
-            headless=True,
-            args=args,
-            ignore_default_args=["--enable-automation"]
+        # Objetos do Playwright síncrono só funcionam na thread que os criou: uma
+        # thread por login é dona do navegador até o SMS ser confirmado ou o
+        # login expirar (ver _thread_login)
+        cmd_queue = queue.Queue()
+        result_queue = queue.Queue()
+        try:
+            threading.Thread(
+                target=self._thread_login,
+                args=(final_telefone, cmd_queue, result_queue),
+                name=f"login-{self.cpf[:3]}",
+                daemon=True
+            ).start()
+
+            try:
+                result = result_queue.get(timeout=180)
+            except queue.Empty:
+                cmd_queue.put({"action": "cancel"})
+                raise Exception("Erro no login: timeout aguardando o envio do SMS")
+            if not result["success"]:
+                raise Exception(result["error"])
+        except BaseException:
+            PENDING_LOGINS.liberar_reserva()
+            raise
+
+        # Salva estado para o passo 2 (finish_login)
+        transaction_id = f"{self.cpf}_{int(time.time())}"
+        PENDING_LOGINS.adicionar(
+            transaction_id, {"cmd_queue": cmd_queue, "result_queue": result_queue}, reservada=True
         )
 
+        return {"transaction_id": transaction_id, "message": "SMS enviado (Modo Visual)"}
+
+    def _thread_login(self, final_telefone: str, cmd_queue: queue.Queue, result_queue: queue.Queue):
+        """
+        Dona do Playwright de um login: envia o SMS, espera o passo 2
+        ({"action": "finish_sms"}) ou o cancelamento ({"action": "cancel"}, login
+        expirado no PENDING_LOGINS) e sempre fecha o navegador nesta thread.
+        """
+        try:
+            playwright, emprestimo, page = self._enviar_sms_navegador(final_telefone)
+        except Exception as e:
+            result_queue.put({"success": False, "error": str(e)})
+            return
+        result_queue.put({"success": True})
+
+        try:
+            cmd = cmd_queue.get(timeout=settings.ENERGISA_LOGIN_SESSAO_TTL_SEGUNDOS + 60)
+        except queue.Empty:
+            cmd = {"action": "cancel"}
+
+        try:
+            if cmd.get("action") != "finish_sms":
+                print("   🧹 Login abandonado no SMS, fechando navegador")
+                return
+            result_queue.put({"success": True, "cookies": self._concluir_login_navegador(page, cmd["sms_code"])})
+        except Exception as e:
+            result_queue.put({"success": False, "error": str(e)})
+        finally:
+            emprestimo.liberar()
+            playwright.stop()
+
+    def _enviar_sms_navegador(self, final_telefone: str):
+        """Abre a página de login, preenche o CPF e pede o SMS. Retorna (playwright, emprestimo, page)."""
+        playwright = sync_playwright().start()
+
+        # 1. Navegador do pool (Chromium já aberto) ou lançado na hora
+        try:
+            emprestimo = navegador_pool.obter_navegador(playwright, headless=not ha_display_disponivel())
+        except Exception:
+            playwright.stop()
+            raise
+        browser = emprestimo.browser
+
         # 2. Contexto com a mesma resolução do Xvfb (1280x1024)
         context = browser.new_context(
             viewport={'width': 1280, 'height': 1024},
@@ -116,6 +280,7 @@ class EnergisaService:
         }
         """
         context.add_init_script(init_script)
+        configurar_bloqueio_recursos(context)
 
         page = context.new_page()
 
@@ -131,8 +296,20 @@ class EnergisaService:
             # Acessa a Energisa
             page.goto(f"{self.base_url}/login", wait_until="domcontentloaded", timeout=60000)
 
-            # Pausa humanizada para scripts de segurança rodarem
-            time.sleep(5)
+            cpf_selectors = [
+                'input[name="cpf"]',
+                'input#cpf',
+                'input[placeholder*="CPF"]',
+                'input[placeholder*="cpf"]',
+                'input[type="tel"]',
+                'input[inputmode="numeric"]',
+            ]
+
+            seletor_cpf = ", ".join(cpf_selectors)
+
+            # Espera o campo CPF renderizar em vez de pausa fixa
+            # (networkidle não serve: o sensor do Akamai mantém requisições abertas)
+            aguardar_seletor(page, seletor_cpf, 10000)
 
             # Verifica se fomos bloqueados
             title = page.title()
@@ -145,25 +322,10 @@ class EnergisaService:
                     pass
                 raise Exception(f"Bloqueio WAF detectado (Access Denied). Título: {title}")
 
-            # Verifica se o campo CPF apareceu - múltiplos seletores
-            cpf_selectors = [
-                'input[name="cpf"]',
-                'input#cpf',
-                'input[placeholder*="CPF"]',
-                'input[placeholder*="cpf"]',
-                'input[type="tel"]',
-                'input[inputmode="numeric"]',
-            ]
-
-            cpf_found = False
-            for selector in cpf_selectors:
-                try:
-                    page.wait_for_selector(selector, state="visible", timeout=5000)
-                    cpf_found = True
-                    print(f"   ✅ Campo CPF encontrado: {selector}")
-                    break
-                except:
-                    continue
+            # Verifica se o campo CPF apareceu - qualquer um dos seletores
+            cpf_found = aguardar_seletor(page, seletor_cpf, 20000)
+            if cpf_found:
+                print("   ✅ Campo CPF encontrado")
 
             if not cpf_found:
                 if page.locator("iframe").count() > 0:
@@ -189,12 +351,12 @@ class EnergisaService:
             for char in self.cpf:
                 page.keyboard.type(char, delay=150)
 
-            time.sleep(1)
+            aguardar_seletor(page, 'button:has-text("ENTRAR"):enabled, button:has-text("Entrar"):enabled', 5000)
             page.click('button:has-text("ENTRAR"), button:has-text("Entrar")')
 
             print("   📞 Selecionando telefone...")
             page.wait_for_selector('text=/contato|telefone|sms/i', timeout=30000)
-            time.sleep(2)
+            aguardar_seletor(page, 'label', 5000)
 
             found = False
             for sel in [f'label:has-text("{final_telefone}")', f'div:has-text("{final_telefone}")', f'text={final_telefone}']:
@@ -210,17 +372,13 @@ class EnergisaService:
                 else:
                     raise Exception("Opção de telefone não encontrada")
 
-            time.sleep(1)
+            aguardar_seletor(page, 'button:has-text("AVANÇAR"):enabled', 5000)
             page.click('button:has-text("AVANÇAR")')
 
-            # Salva estado para o passo 2 (finish_login)
-            transaction_id = f"{self.cpf}_{int(time.time())}"
-            PENDING_LOGINS[transaction_id] = {"pw": playwright, "br": browser, "pg": page}
-
-            return {"transaction_id": transaction_id, "message": "SMS enviado (Modo Visual)"}
+            return playwright, emprestimo, page
 
         except Exception as e:
-            browser.close()
+            emprestimo.liberar()
             playwright.stop()
             raise Exception(f"Erro no login: {str(e)}")
 
@@ -256,58 +414,67 @@ class EnergisaService:
         return tokens
 
     def finish_login(self, transaction_id: str, sms_code: str):
-        if transaction_id not in PENDING_LOGINS:
+        ctx = PENDING_LOGINS.remover(transaction_id)
+        if not ctx:
             raise Exception("Transação expirada")
 
-        ctx = PENDING_LOGINS.pop(transaction_id)
-        page = ctx["pg"]
-        browser = ctx["br"]
-        playwright = ctx["pw"]
-
+        # O código é digitado pela thread dona do navegador (ver _thread_login)
+        ctx["cmd_queue"].put({"action": "finish_sms", "sms_code": sms_code})
         try:
-            try:
-                if page.is_visible('input[type="tel"]'):
-                    page.click('input[type="tel"]')
-                elif page.is_visible('input[type="number"]'):
-                    page.click('input[type="number"]')
-                else:
-                    page.mouse.click(640, 512)
-            except:
-                pass
+            result = ctx["result_queue"].get(timeout=120)
+        except queue.Empty:
+            raise Exception("Timeout aguardando conclusão do login")
+        if not result["success"]:
+            raise Exception(result["error"])
+
+        final_cookies = result["cookies"]
+        SessionManager.save_session(self.cpf, final_cookies)
+        self._apply_cookies(final_cookies)
+        return {"status": "success", "message": "Login OK", "tokens": list(final_cookies.keys())}
+
+    def _concluir_login_navegador(self, page, sms_code: str) -> dict:
+        """Digita o código SMS e captura os tokens (na thread dona do navegador)."""
+        try:
+            if page.is_visible('input[type="tel"]'):
+                page.click('input[type="tel"]')
+            elif page.is_visible('input[type="number"]'):
+                page.click('input[type="number"]')
+            else:
+                page.mouse.click(640, 512)
+        except:
+            pass
 
-            for d in sms_code:
-                page.keyboard.type(d, delay=150)
-            time.sleep(1)
+        for d in sms_code:
+            page.keyboard.type(d, delay=150)
+        aguardar_seletor(page, 'button:has-text("AVANÇAR"):enabled', 5000)
 
-            if page.is_visible('button:has-text("AVANÇAR")'):
-                page.click('button:has-text("AVANÇAR")')
-            else:
-                page.evaluate("() => { const b = Array.from(document.querySelectorAll('button')).find(x => x.innerText.includes('AVANÇAR')); if(b) b.click() }")
+        if page.is_visible('button:has-text("AVANÇAR")'):
+            page.click('button:has-text("AVANÇAR")')
+        else:
+            page.evaluate("() => { const b = Array.from(document.querySelectorAll('button')).find(x => x.innerText.includes('AVANÇAR')); if(b) b.click() }")
 
-            print("   ⏳ Aguardando tokens...")
-            try:
-                page.wait_for_url(lambda u: "listagem-ucs" in u or "home" in u, timeout=25000)
-            except:
-                pass
+        print("   ⏳ Aguardando tokens...")
+        try:
+            page.wait_for_url(lambda u: "listagem-ucs" in u or "home" in u, timeout=25000)
+        except:
+            pass
 
-            final_cookies = {}
-            for _ in range(10):
-                final_cookies = self._extract_tokens_from_browser(page)
-                if 'rtk' in final_cookies or 'accessTokenEnergisa' in final_cookies:
-                    break
-                time.sleep(1)
+        # Tokens chegam no localStorage logo após o redirect: espera por eles, não por tempo
+        try:
+            page.wait_for_function(
+                "() => localStorage.getItem('rtk') || localStorage.getItem('accessTokenEnergisa')"
+                " || localStorage.getItem('token')",
+                timeout=10000
+            )
+        except:
+            pass
 
-            if 'rtk' not in final_cookies and 'accessTokenEnergisa' not in final_cookies:
-                raise Exception("Falha ao capturar tokens")
+        final_cookies = self._extract_tokens_from_browser(page)
 
-            SessionManager.save_session(self.cpf, final_cookies)
-            self._apply_cookies(final_cookies)
-            return {"status": "success", "message": "Login OK", "tokens": list(final_cookies.keys())}
-        except Exception as e:
-            raise e
-        finally:
-            browser.close()
-            playwright.stop()
+        if 'rtk' not in final_cookies and 'accessTokenEnergisa' not in final_cookies:
+            raise Exception("Falha ao capturar tokens")
+
+        return final_cookies
 
     def _get_headers(self, json_content=True):
         h = {
@@ -329,6 +496,58 @@ class EnergisaService:
         }
 
     def _refresh_token(self):
+        """
+        Renova o access token (single-flight por CPF no processo, junto com o
+        cliente assíncrono).
+
+        Chamadas concorrentes para o mesmo CPF aguardam a renovação em andamento
+        e reaproveitam os tokens dela, em vez de renovar de novo (o que gravaria
+        sessoes_energisa várias vezes e invalidaria o RTK das outras instâncias).
+        """
+        inicio = time.monotonic()
+        rtk_atual = self.cookies.get("rtk") or self.cookies.get("refreshToken", "")
+
+        acao, valor = _iniciar_refresh(self.cpf, inicio, rtk_atual)
+        while acao == "aguardar":
+            valor.wait(timeout=1)
+            acao, valor = _iniciar_refresh(self.cpf, inicio, rtk_atual)
+
+        if acao == "falhou":
+            print("   ⏭️ Renovação concorrente do token falhou, não repetindo")
+            return False
+        if acao == "reaproveitar":
+            print("   ♻️ Reaproveitando token renovado por outra chamada")
+            self.cookies.update(valor)
+            self._apply_cookies(self.cookies)
+            return True
+
+        sucesso = None
+        try:
+            sucesso = self._executar_refresh_token() or self._recarregar_sessao_do_banco(rtk_atual)
+        finally:
+            _concluir_refresh(self.cpf, valor, sucesso, self.cookies)
+        return sucesso
+
+    def _recarregar_sessao_do_banco(self, rtk_usado: str) -> bool:
+        """
+        Relê a sessão do banco (sem o cache do SessionManager) após um refresh
+        que falhou: outro processo (ex: worker de sincronização) pode ter
+        rotacionado o RTK enquanto esta instância usava os cookies em cache.
+
+        Returns:
+            True se o banco tinha tokens mais novos (aplicados à instância)
+        """
+        cookies = SessionManager.load_session(self.cpf, ignore_expiry=True, usar_cache=False)
+        rtk = (cookies or {}).get("rtk") or (cookies or {}).get("refreshToken", "")
+        if not rtk or rtk == rtk_usado:
+            return False
+
+        print("   ♻️ Sessão renovada por outro processo, usando tokens do banco")
+        self.cookies.update({k: v for k, v in cookies.items() if k not in COOKIES_CONTEXTO_UC})
+        self._apply_cookies(self.cookies)
+        return True
+
+    def _executar_refresh_token(self):
         print("   🔄 Tentando renovar Access Token com RTK...")
         url = f"{self.base_url}/api/autenticacao/RefreshToken"
 
@@ -392,10 +611,19 @@ class EnergisaService:
             print(f"   ❌ Erro na renovação: {e}")
             return False
 
-    def get_uc_info(self, uc_data: dict):
+    def get_uc_info(self, uc_data: dict, max_age: Optional[float] = None):
         """
         Consulta informações detalhadas da Unidade Consumidora.
+
+        Args:
+            uc_data: Dados da UC (codigoEmpresaWeb, cdc, digitoVerificadorCdc)
+            max_age: Idade máxima aceita da resposta em cache, em segundos (0 = sempre consulta o portal)
         """
+        return cache_respostas.consultar(
+            chave_uc(self.cpf, uc_data, "uc_info"), lambda: self._buscar_uc_info(uc_data), max_age
+        )
+
+    def _buscar_uc_info(self, uc_data: dict):
         try:
             empresa = int(uc_data.get('codigoEmpresaWeb', 6))
             uc_numero = int(uc_data.get('cdc'))
@@ -423,22 +651,36 @@ class EnergisaService:
                 return resp.json()
             else:
                 print(f"   ❌ Erro UC Info: {resp.status_code} - {resp.text[:200]}")
+                # Corpo de erro do portal marcado como errored: segue para quem chamou, mas não vai para o cache
                 try:
-                    return resp.json()
+                    corpo = resp.json()
                 except:
-                    return {"errored": True, "message": f"Erro HTTP {resp.status_code}", "details": resp.text}
+                    corpo = None
+                if isinstance(corpo, dict):
+                    return {**corpo, "errored": True, "status": resp.status_code}
+                return {"errored": True, "status": resp.status_code, "message": f"Erro HTTP {resp.status_code}",
+                        "details": corpo if corpo is not None else resp.text}
 
         except Exception as e:
             print(f"   ❌ Exceção UC Info: {e}")
             return {"errored": True, "message": str(e)}
 
-    def listar_ucs(self, enriquecer_gd=True):
+    def listar_ucs(self, enriquecer_gd=True, max_age: Optional[float] = None):
         """
         Lista UCs do usuário.
 
         Args:
             enriquecer_gd: Se True, verifica GD e adiciona badge de status
+            max_age: Idade máxima aceita das respostas em cache, em segundos (0 = sempre consulta o portal)
         """
+        ucs = cache_respostas.consultar(chave_uc(self.cpf, None, "ucs"), self._buscar_ucs, max_age)
+
+        if enriquecer_gd:
+            return self._enriquecer_ucs(ucs, max_age)
+
+        return ucs
+
+    def _buscar_ucs(self):
         url = f"{self.base_url}/api/usuarios/UnidadeConsumidora?doc={self.cpf}"
 
         payload = self._get_tokens_payload()
@@ -453,16 +695,11 @@ class EnergisaService:
                 raise Exception("Sessão expirada e falha ao renovar token.")
 
         if resp.status_code == 200:
-            ucs = resp.json().get('infos', [])
-
-            if enriquecer_gd:
-                return self._enriquecer_ucs(ucs)
-
-            return ucs
+            return resp.json().get('infos', [])
 
         raise Exception(f"Erro API Energisa: {resp.status_code} - {resp.text}")
 
-    def _enriquecer_ucs(self, ucs):
+    def _enriquecer_ucs(self, ucs, max_age: Optional[float] = None):
         """Enriquece lista de UCs com informações de GD e badges de status.
         
         Estratégia de identificação de GD (conforme documentação API_ENERGISA.md):
@@ -479,31 +716,34 @@ class EnergisaService:
         """
         ucs_enriquecidas = []
         
-        # Primeiro: Identificar GERADORAS
+        # Primeiro: monta as consultas (/gd/info das geradoras, /gd/details das UCs com GD null)
         geradoras_info = {}  # cdc -> gd_info objeto
         geradoras_count = 0
+        consultas = []
         
         for uc in ucs:
             numero_uc = uc.get('numeroUc')
             geracao_distribuida = uc.get('geracaoDistribuida')
+            uc_data = {
+                'codigoEmpresaWeb': uc.get('codigoEmpresaWeb', 6),
+                'cdc': numero_uc,
+                'digitoVerificadorCdc': uc.get('digitoVerificador')
+            }
             
             if geracao_distribuida is not None and geracao_distribuida == numero_uc:
                 geradoras_count += 1
-                # Busca /gd/info para detalhes da geradora
-                try:
-                    uc_data = {
-                        'codigoEmpresaWeb': uc.get('codigoEmpresaWeb', 6),
-                        'cdc': numero_uc,
-                        'digitoVerificadorCdc': uc.get('digitoVerificador')
-                    }
-                    gd_info = self.get_gd_info(uc_data)
-                    
-                    if gd_info and not gd_info.get('errored'):
-                        infos = gd_info.get('infos', {})
-                        objeto = infos.get('objeto', {})
-                        geradoras_info[numero_uc] = objeto
-                except Exception as e:
-                    print(f"   ⚠️ Erro ao buscar gd/info da geradora {numero_uc}: {e}")
+                consultas.append((('info', numero_uc), lambda svc, d: svc.get_gd_info(d, max_age), uc_data))
+            elif geracao_distribuida is None:
+                consultas.append((('details', numero_uc), lambda svc, d: svc.get_gd_details(d, max_age=max_age), uc_data))
+        
+        # Consultas em paralelo; erro ou timeout de uma UC = UC sem informação de GD
+        respostas = self._consultar_gd_em_paralelo(consultas)
+        
+        for (tipo, numero_uc), gd_info in respostas.items():
+            if tipo == 'info' and gd_info and not gd_info.get('errored'):
+                infos = gd_info.get('infos', {})
+                objeto = infos.get('objeto', {})
+                geradoras_info[numero_uc] = objeto
         
         print(f"   🔍 Identificadas {geradoras_count} UCs geradoras")
         
@@ -567,12 +807,7 @@ class EnergisaService:
                 ucs_com_gd_null += 1
                 
                 try:
-                    uc_data = {
-                        'codigoEmpresaWeb': uc.get('codigoEmpresaWeb', 6),
-                        'cdc': numero_uc,
-                        'digitoVerificadorCdc': uc.get('digitoVerificador')
-                    }
-                    gd_details = self.get_gd_details(uc_data)
+                    gd_details = respostas.get(('details', numero_uc))
                     
                     if gd_details and not gd_details.get('errored'):
                         infos = gd_details.get('infos', [])
@@ -649,6 +884,86 @@ class EnergisaService:
         
         return ucs_enriquecidas
     
+    def _consultar_gd_em_paralelo(self, consultas):
+        """
+        Executa as consultas de GD em um pool limitado (ENERGISA_GD_PARALELO).
+        
+        Cada consulta tem até ENERGISA_GD_TIMEOUT_SEGUNDOS a partir do início;
+        consultas que falham ou estouram o tempo resultam em None. O ritmo
+        real das requisições continua sendo o do rate limiter compartilhado.
+        
+        requests.Session não é thread-safe: cada worker usa uma cópia do serviço
+        com sessão própria (cookies e headers copiados antes de iniciar o pool).
+        
+        Args:
+            consultas: Lista de (chave, função(svc, uc_data), uc_data)
+        
+        Returns:
+            Dict chave -> resposta da função (ou None)
+        """
+        if not consultas:
+            return {}
+
+        limite = max(1, settings.ENERGISA_GD_PARALELO)
+        timeout = settings.ENERGISA_GD_TIMEOUT_SEGUNDOS
+        # Consultas ainda na fila também têm prazo: um timeout por "leva" do pool
+        prazo_fila = time.monotonic() + timeout * math.ceil(len(consultas) / limite)
+        inicios = {}
+        respostas = {}
+        cookies, jar, headers = dict(self.cookies), self.session.cookies.copy(), dict(self.session.headers)
+        por_thread = threading.local()
+
+        def executar(chave, funcao, uc_data):
+            inicios[chave] = time.monotonic()
+            svc = getattr(por_thread, "svc", None)
+            if svc is None:
+                svc = por_thread.svc = self._copia_para_worker(cookies, jar, headers)
+            return funcao(svc, uc_data)
+
+        executor = ThreadPoolExecutor(max_workers=min(limite, len(consultas)), thread_name_prefix="energisa-gd")
+        try:
+            pendentes = {
+                executor.submit(executar, chave, funcao, uc_data): chave
+                for chave, funcao, uc_data in consultas
+            }
+            while pendentes:
+                concluidas, _ = wait(pendentes, timeout=0.25, return_when=FIRST_COMPLETED)
+                for future in concluidas:
+                    chave = pendentes.pop(future)
+                    try:
+                        respostas[chave] = future.result()
+                    except Exception as e:
+                        print(f"   ⚠️ Erro ao buscar gd/{chave[0]} da UC {chave[1]}: {e}")
+                        respostas[chave] = None
+
+                agora = time.monotonic()
+                for future, chave in list(pendentes.items()):
+                    inicio = inicios.get(chave)
+                    estourou = agora - inicio > timeout if inicio is not None else agora > prazo_fila
+                    if estourou:
+                        print(f"   ⏱️ Timeout em gd/{chave[0]} da UC {chave[1]}, seguindo sem GD")
+                        future.cancel()
+                        del pendentes[future]
+                        respostas[chave] = None
+        finally:
+            # Não espera consultas abandonadas (terminam pelo timeout HTTP da sessão)
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        return respostas
+
+    def _copia_para_worker(self, cookies: dict, jar, headers: dict) -> "EnergisaService":
+        """
+        Cópia do serviço para uma thread de consulta, com requests.Session própria.
+        Um refresh feito na cópia é compartilhado pelo registro de refresh do processo.
+        """
+        svc = copy.copy(self)
+        svc.cookies = dict(cookies)
+        svc.session = SessaoEnergisa(self.session.prioridade)
+        svc.session.headers.update(headers)
+        svc.session.cookies.update(jar.copy())
+        svc._contexto_uc = None
+        return svc
+
     def _adicionar_badge(self, uc, badge):
         """Adiciona badge à UC, criando lista de badges se já houver uma."""
         if not uc.get('badge'):
@@ -671,7 +986,9 @@ class EnergisaService:
             print("   ❌ Erro: CDC zerado.")
             return []
 
-        # Define cookies de contexto
+        # Define cookies de contexto (outra UC: o contexto ativado por navegação deixa de valer)
+        if chave_contexto_uc(uc_data) != self._contexto_uc:
+            self._contexto_uc = None
         self.session.cookies.set("NumeroUc", str(cdc))
         self.session.cookies.set("Digito", str(digito))
         self.session.cookies.set("CodigoEmpresaWeb", str(empresa))
@@ -684,7 +1001,6 @@ class EnergisaService:
         build_id = self._get_build_id()
 
         if build_id:
-            url_next = f"{self.base_url}/_next/data/{build_id}/faturas.json"
             headers_next = {
                 "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
                 "Referer": f"{self.base_url}/faturas",
@@ -692,7 +1008,14 @@ class EnergisaService:
             }
 
             print(f"   📤 Consultando faturas via Next.js (UC {cdc})...")
-            resp = self.session.get(url_next, headers=headers_next)
+            resp = self.session.get(f"{self.base_url}/_next/data/{build_id}/faturas.json", headers=headers_next)
+
+            # 404 = portal publicou nova versão: renova o buildId e tenta de novo
+            if resp.status_code == 404:
+                build_id_cache.invalidar(build_id)
+                build_id = self._get_build_id()
+                if build_id:
+                    resp = self.session.get(f"{self.base_url}/_next/data/{build_id}/faturas.json", headers=headers_next)
 
             if resp.status_code == 200:
                 try:
@@ -738,9 +1061,17 @@ class EnergisaService:
         return []
 
     def _sincronizar_sessao_via_navegacao(self, uc_data: dict):
-        """Simula o navegador entrando na página de faturas da UC específica."""
+        """
+        Simula o navegador entrando na página de faturas da UC específica.
+        Não repete a navegação se o contexto da UC já estiver ativo na sessão.
+        """
         cdc = uc_data.get('cdc')
+        contexto = chave_contexto_uc(uc_data)
+        if contexto == self._contexto_uc:
+            return True
+
         print(f"   🔄 Sincronizando sessão para UC {cdc} via navegação...")
+        self._contexto_uc = None
 
         cookies_uc = {
             "NumeroUc": str(cdc),
@@ -763,6 +1094,7 @@ class EnergisaService:
         try:
             resp = self.session.get(url_navegacao, headers=headers)
             if resp.status_code == 200:
+                self._contexto_uc = contexto
                 return True
             print(f"   ⚠️ Aviso: Navegação retornou {resp.status_code}")
         except Exception as e:
@@ -771,6 +1103,14 @@ class EnergisaService:
         return False
 
     def download_pdf(self, uc_data: dict, fatura_data: dict):
+        try:
+            return self._baixar_pdf(uc_data, fatura_data)
+        except Exception:
+            # Falha pode ser contexto perdido no portal: o próximo download navega de novo
+            self._contexto_uc = None
+            raise
+
+    def _baixar_pdf(self, uc_data: dict, fatura_data: dict):
         try:
             cdc = int(uc_data.get('cdc', 0))
             digito = int(uc_data.get('digitoVerificadorCdc', 0))
@@ -848,6 +1188,7 @@ class EnergisaService:
         })
 
         print(f"   🔄 Sincronizando contexto do servidor para UC {uc_data.get('cdc')}...")
+        self._contexto_uc = None
 
         try:
             headers = self._get_headers()
@@ -871,8 +1212,13 @@ class EnergisaService:
             self.cookies[cookie.name] = cookie.value
             self.session.cookies.set(cookie.name, cookie.value)
 
-    def get_gd_info(self, uc_data: dict):
-        """Pega dados de Geração Distribuída"""
+    def get_gd_info(self, uc_data: dict, max_age: Optional[float] = None):
+        """Pega dados de Geração Distribuída (max_age: ver get_uc_info)"""
+        return cache_respostas.consultar(
+            chave_uc(self.cpf, uc_data, "gd_info"), lambda: self._buscar_gd_info(uc_data), max_age
+        )
+
+    def _buscar_gd_info(self, uc_data: dict):
         codigo = uc_data.get('codigoEmpresaWeb', 6)
         numero = uc_data.get('cdc')
         digito = uc_data.get('digitoVerificadorCdc')
@@ -886,8 +1232,15 @@ class EnergisaService:
             return resp.json()
         return None
 
-    def get_gd_details(self, uc_data: dict):
-        """Consulta histórico detalhado de créditos e geração."""
+    def get_gd_details(self, uc_data: dict, periodo: int = 13, max_age: Optional[float] = None):
+        """Consulta histórico detalhado de créditos e geração (últimos `periodo` meses; max_age: ver get_uc_info)."""
+        return cache_respostas.consultar(
+            chave_uc(self.cpf, uc_data, f"gd_details:{periodo}"),
+            lambda: self._buscar_gd_details(uc_data, periodo),
+            max_age
+        )
+
+    def _buscar_gd_details(self, uc_data: dict, periodo: int):
         try:
             cdc = int(uc_data.get('cdc', 0))
             digito = int(uc_data.get('digitoVerificadorCdc', 0))
@@ -896,7 +1249,7 @@ class EnergisaService:
             return None
 
         url = (f"{self.base_url}/api/clientes/Gd/GetHistoricoDemonstrativoGd"
-               f"?codigoEmpresaWeb={empresa}&numeroCdc={cdc}&digitoVerificador={digito}&periodo=13")
+               f"?codigoEmpresaWeb={empresa}&numeroCdc={cdc}&digitoVerificador={digito}&periodo={periodo}")
 
         payload = self._get_tokens_payload()
         headers = self._get_headers()
@@ -1021,6 +1374,8 @@ class EnergisaService:
                     resp = self.session.post(url, json=payload, headers=headers)
 
             if resp.status_code == 200:
+                # Rateio alterado: dados de GD do titular em cache ficaram velhos
+                cache_respostas.invalidar(self.cpf, prefixo_endpoint="gd_")
                 return resp.json()
             else:
                 print(f"   ❌ Erro Alteração Beneficiária: {resp.status_code} - {resp.text[:200]}")
@@ -1159,6 +1514,8 @@ class EnergisaService:
                     "dadosUsuario": page_props.get("dadosUsuario", {})
                 }
             else:
+                if resp.status_code == 404:
+                    build_id_cache.invalidar(build_id)
                 print(f"   ❌ Erro ao buscar opções: {resp.status_code} - {resp.text[:100]}")
                 raise Exception(f"Falha ao obter opções de login. HTTP {resp.status_code}")
 
@@ -1214,6 +1571,8 @@ class EnergisaService:
                 print(f"   ✅ [SSR] Sucesso! {len(dados_usuario)} faturas encontradas.")
                 return data
             else:
+                if resp.status_code == 404:
+                    build_id_cache.invalidar(build_id)
                 print(f"   ❌ [SSR] Erro: HTTP {resp.status_code}")
                 return {"errored": True, "status": resp.status_code, "content": resp.text[:200]}
 
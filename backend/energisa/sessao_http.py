@@ -0,0 +1,189 @@
+"""
+Sessão HTTP - requests.Session usada pelo EnergisaService (e httpx.AsyncClient
+usado pelo AsyncEnergisaService)
+Aplica a toda requisição para o portal da Energisa o rate limiter compartilhado,
+o circuit breaker da família do endpoint e um timeout padrão
+"""
+
+import asyncio
+import importlib.util
+import logging
+import threading
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+
+from backend.config import settings
+from backend.core.exceptions import EnergisaIndisponivelError
+from backend.energisa.rate_limiter import PRIORIDADE_INTERATIVA, energisa_rate_limiter
+from backend.energisa.circuit_breaker import disjuntores_energisa, identificar_familia
+
+logger = logging.getLogger(__name__)
+
+# Hosts cujo tráfego passa pelo rate limiter e pelos disjuntores
+HOSTS_ENERGISA = ("energisa.com.br",)
+
+
+def is_host_energisa(url: str) -> bool:
+    """
+    Indica se a URL aponta para o portal da Energisa (ou para o host de
+    ENERGISA_BASE_URL, ex: o fake local usado nos benchmarks).
+    """
+    host = (urlsplit(url).hostname or "").lower()
+    if host and host == (urlsplit(settings.ENERGISA_BASE_URL).hostname or "").lower():
+        return True
+    return any(host == h or host.endswith("." + h) for h in HOSTS_ENERGISA)
+
+
+def is_falha_servidor(status_code: int) -> bool:
+    """Respostas que indicam Energisa degradada (contam para o circuit breaker)."""
+    return status_code >= 500 or status_code == 429
+
+
+class SessaoEnergisa(requests.Session):
+    """
+    requests.Session que, antes de cada requisição à Energisa, consulta o
+    disjuntor da família do endpoint (falha na hora se estiver aberto) e
+    aguarda um token do rate limiter do processo na prioridade da sessão.
+    """
+
+    def __init__(self, prioridade: int = PRIORIDADE_INTERATIVA):
+        """
+        Args:
+            prioridade: PRIORIDADE_INTERATIVA (default) ou PRIORIDADE_BACKGROUND
+        """
+        super().__init__()
+        self.prioridade = prioridade
+
+    def request(self, method, url, *args, **kwargs):
+        if not is_host_energisa(url):
+            return super().request(method, url, *args, **kwargs)
+
+        familia = identificar_familia(url)
+        disjuntor = disjuntores_energisa.obter(familia)
+        if not disjuntor.permitir():
+            raise EnergisaIndisponivelError(familia)
+
+        kwargs.setdefault("timeout", settings.ENERGISA_HTTP_TIMEOUT_SEGUNDOS)
+
+        try:
+            energisa_rate_limiter.adquirir(self.prioridade)
+            resp = super().request(method, url, *args, **kwargs)
+        except (requests.Timeout, requests.ConnectionError):
+            disjuntor.registrar(False)
+            raise
+        except Exception:
+            # Erros locais (ex: URL inválida) não dizem nada sobre a Energisa
+            disjuntor.registrar(True)
+            raise
+        except BaseException:
+            # Interrompida sem resultado: devolve o teste do meio-aberto
+            disjuntor.liberar_teste()
+            raise
+
+        disjuntor.registrar(not is_falha_servidor(resp.status_code))
+        return resp
+
+
+# Pool de conexões dos clientes assíncronos: um transporte por event loop,
+# compartilhado por todas as sessões (cada uma com o seu cookie jar)
+_TRANSPORTES = weakref.WeakKeyDictionary()
+_TRANSPORTES_LOCK = threading.Lock()
+
+
+def _usar_http2() -> bool:
+    if not settings.ENERGISA_HTTP2:
+        return False
+    if importlib.util.find_spec("h2") is None:
+        logger.warning("⚠️ ENERGISA_HTTP2 ativo, mas o pacote h2 não está instalado: usando HTTP/1.1")
+        return False
+    return True
+
+
+def transporte_compartilhado() -> httpx.AsyncHTTPTransport:
+    """Retorna o transporte (pool keep-alive) do event loop atual, criando sob demanda."""
+    loop = asyncio.get_running_loop()
+    with _TRANSPORTES_LOCK:
+        transporte = _TRANSPORTES.get(loop)
+        if transporte is None:
+            transporte = httpx.AsyncHTTPTransport(
+                http2=_usar_http2(),
+                limits=httpx.Limits(
+                    max_connections=settings.ENERGISA_HTTP_MAX_CONEXOES,
+                    max_keepalive_connections=settings.ENERGISA_HTTP_MAX_CONEXOES,
+                    keepalive_expiry=settings.ENERGISA_HTTP_KEEPALIVE_SEGUNDOS
+                )
+            )
+            _TRANSPORTES[loop] = transporte
+        return transporte
+
+
+async def fechar_transporte_compartilhado():
+    """Fecha o pool de conexões do event loop atual (shutdown)."""
+    with _TRANSPORTES_LOCK:
+        transporte = _TRANSPORTES.pop(asyncio.get_running_loop(), None)
+    if transporte is not None:
+        await transporte.aclose()
+
+
+class SessaoAsyncEnergisa(httpx.AsyncClient):
+    """
+    httpx.AsyncClient equivalente à SessaoEnergisa: disjuntor da família do
+    endpoint e rate limiter do processo antes de cada requisição à Energisa.
+
+    Usa o transporte compartilhado do event loop, então várias sessões (uma por
+    CPF, cada uma com seus cookies) reaproveitam as mesmas conexões keep-alive.
+    """
+
+    def __init__(self, prioridade: int = PRIORIDADE_INTERATIVA, cookies: dict = None):
+        """
+        Args:
+            prioridade: PRIORIDADE_INTERATIVA (default) ou PRIORIDADE_BACKGROUND
+            cookies: Cookies iniciais da sessão
+        """
+        super().__init__(
+            transport=transporte_compartilhado(),
+            cookies=cookies,
+            timeout=settings.ENERGISA_HTTP_TIMEOUT_SEGUNDOS,
+            follow_redirects=True
+        )
+        self.prioridade = prioridade
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        url = str(request.url)
+        if not is_host_energisa(url):
+            return await super().send(request, **kwargs)
+
+        familia = identificar_familia(url)
+        disjuntor = disjuntores_energisa.obter(familia)
+        if not disjuntor.permitir():
+            raise EnergisaIndisponivelError(familia)
+
+        try:
+            await energisa_rate_limiter.adquirir_async(self.prioridade)
+            resp = await super().send(request, **kwargs)
+        except httpx.TransportError:
+            # Timeouts e falhas de conexão
+            disjuntor.registrar(False)
+            raise
+        except Exception:
+            disjuntor.registrar(True)
+            raise
+        except BaseException:
+            # Task cancelada (CancelledError) durante a espera ou o envio: sem
+            # resultado, mas o teste do meio-aberto precisa ser devolvido
+            disjuntor.liberar_teste()
+            raise
+
+        disjuntor.registrar(not is_falha_servidor(resp.status_code))
+        return resp
+
+    async def aclose(self):
+        # O transporte é compartilhado: fechar a sessão não fecha o pool
+        # (ver fechar_transporte_compartilhado)
+        return None
+
+    async def __aexit__(self, *args):
+        return None
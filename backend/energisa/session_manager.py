@@ -1,11 +1,17 @@
 """
 Session Manager - Gerenciamento de sessões da Energisa no banco de dados
+Toda instância de EnergisaService carrega a sessão do CPF; as linhas lidas ficam
+em um cache em memória (por processo) com TTL curto, atualizado em save_session,
+para que cada requisição não custe uma consulta ao banco
 """
 
 import time
+import threading
 import logging
 from datetime import datetime, timezone, timedelta
+from typing import Optional
 
+from backend.config import settings
 from backend.core.database import db_admin
 
 logger = logging.getLogger(__name__)
@@ -13,6 +19,34 @@ logger = logging.getLogger(__name__)
 # Tempo máximo de validade da sessão (7 dias - refresh token Energisa)
 MAX_SESSION_AGE_HOURS = 168  # 7 dias
 
+# CPFs por consulta em load_sessions_bulk (limita o tamanho da URL do filtro IN)
+BULK_LOTE = 200
+
+# cpf -> (lido_em, {"cookies", "atualizado_em"})
+_cache_sessoes: dict = {}
+_cache_lock = threading.Lock()
+_cache_stats = {"acertos": 0, "faltas": 0}
+
+
+def _cache_obter(cpf_clean: str) -> Optional[dict]:
+    with _cache_lock:
+        item = _cache_sessoes.get(cpf_clean)
+        if item is None or time.monotonic() - item[0] >= settings.ENERGISA_SESSAO_CACHE_TTL_SEGUNDOS:
+            _cache_stats["faltas"] += 1
+            return None
+        _cache_stats["acertos"] += 1
+        return item[1]
+
+
+def _cache_gravar(cpf_clean: str, session_data: dict):
+    with _cache_lock:
+        _cache_sessoes[cpf_clean] = (time.monotonic(), session_data)
+
+
+def _cache_remover(cpf_clean: str):
+    with _cache_lock:
+        _cache_sessoes.pop(cpf_clean, None)
+
 
 class SessionManager:
     @staticmethod
@@ -43,80 +77,119 @@ class SessionManager:
                 data,
                 on_conflict="cpf"
             ).execute()
+            _cache_gravar(cpf_clean, {"cookies": dict(cookies), "atualizado_em": data["atualizado_em"]})
 
             logger.info(f"💾 Sessão salva no banco para CPF: {cpf_clean[:3]}***")
-            print(f"💾 Sessão salva no banco para CPF: {cpf_clean[:3]}***")
 
         except Exception as e:
+            # Estado no banco desconhecido: a próxima leitura consulta de novo
+            _cache_remover(cpf_clean)
             logger.error(f"❌ Erro ao salvar sessão no banco: {e}")
-            print(f"❌ Erro ao salvar sessão no banco: {e}")
             raise
 
     @staticmethod
-    def load_session(cpf: str, ignore_expiry: bool = False):
+    def _cookies_da_sessao(cpf_clean: str, session_data: dict, ignore_expiry: bool) -> Optional[dict]:
+        """Cookies da linha de sessão, ou None se expirada (e ignore_expiry=False)."""
+        atualizado_em = session_data.get("atualizado_em")
+
+        # Verifica idade da sessão
+        if atualizado_em:
+            session_time = datetime.fromisoformat(atualizado_em.replace("Z", "+00:00"))
+            age = datetime.now(timezone.utc) - session_time
+            max_age = timedelta(hours=MAX_SESSION_AGE_HOURS)
+
+            logger.debug(
+                f"🔍 Sessão CPF {cpf_clean[:3]}***: atualizada em {session_time.isoformat()}, "
+                f"idade {age.total_seconds():.0f}s (máx {max_age.total_seconds():.0f}s)"
+            )
+
+            if age > max_age:
+                if not ignore_expiry:
+                    logger.debug(f"   ❌ Sessão expirada para CPF {cpf_clean[:3]}***")
+                    return None
+                logger.debug("   ⚠️ Sessão expirada, mas retornando cookies para tentar refresh...")
+
+        # Cópia: os serviços alteram os próprios cookies (refresh, contexto de UC)
+        cookies = session_data.get("cookies")
+        return dict(cookies) if cookies else cookies
+
+    @staticmethod
+    def load_session(cpf: str, ignore_expiry: bool = False, usar_cache: bool = True):
         """
-        Carrega sessão do banco de dados.
+        Carrega sessão (cache em memória ou banco de dados).
 
         Args:
             cpf: CPF do titular
             ignore_expiry: Se True, retorna cookies mesmo se sessão estiver expirada
                           (útil para tentar refresh token)
+            usar_cache: False para reler do banco (ex: refresh falhou porque outro
+                       processo já rotacionou o RTK); o cache é atualizado
 
         Returns:
             Dict com cookies ou None se não encontrado
         """
         cpf_clean = SessionManager._clean_cpf(cpf)
 
+        session_data = _cache_obter(cpf_clean) if usar_cache else None
+        if session_data is not None:
+            return SessionManager._cookies_da_sessao(cpf_clean, session_data, ignore_expiry)
+
         try:
             result = db_admin.table("sessoes_energisa").select(
                 "cookies, atualizado_em"
             ).eq("cpf", cpf_clean).execute()
 
             if not result.data:
-                logger.warning(f"⚠️ Sessão não encontrada no banco para CPF: {cpf_clean[:3]}***")
-                print(f"⚠️ Sessão não encontrada no banco para CPF: {cpf_clean[:3]}***")
+                logger.debug(f"⚠️ Sessão não encontrada no banco para CPF: {cpf_clean[:3]}***")
+                _cache_remover(cpf_clean)
                 return None
 
             session_data = result.data[0]
-            atualizado_em = session_data.get("atualizado_em")
-            is_expired = False
-
-            # Verifica idade da sessão
-            if atualizado_em:
-                session_time = datetime.fromisoformat(atualizado_em.replace("Z", "+00:00"))
-                now = datetime.now(timezone.utc)
-                age = now - session_time
-                max_age = timedelta(hours=MAX_SESSION_AGE_HOURS)
-
-                logger.info(f"🔍 Verificando sessão para CPF {cpf_clean[:3]}***:")
-                logger.info(f"   📅 Atualizada em: {session_time.isoformat()}")
-                logger.info(f"   ⏱️ Idade: {age.total_seconds():.0f}s (Máx: {max_age.total_seconds():.0f}s)")
-
-                print(f"🔍 Verificando sessão para CPF {cpf_clean[:3]}***:")
-                print(f"   📅 Atualizada em: {session_time.isoformat()}")
-                print(f"   ⏱️ Idade: {age.total_seconds():.0f}s (Máx: {max_age.total_seconds():.0f}s)")
-
-                if age > max_age:
-                    is_expired = True
-                    if ignore_expiry:
-                        logger.info("   ⚠️ Sessão expirada, mas retornando cookies para tentar refresh...")
-                        print("   ⚠️ Sessão expirada, mas retornando cookies para tentar refresh...")
-                    else:
-                        logger.warning("   ❌ Sessão expirada!")
-                        print("   ❌ Sessão expirada!")
-                        return None
-
-            if not is_expired:
-                logger.info("   ✅ Sessão válida.")
-                print("   ✅ Sessão válida.")
-
-            return session_data.get("cookies")
+            _cache_gravar(cpf_clean, session_data)
+            return SessionManager._cookies_da_sessao(cpf_clean, session_data, ignore_expiry)
 
         except Exception as e:
             logger.error(f"❌ Erro ao carregar sessão do banco: {e}")
-            print(f"❌ Erro ao carregar sessão do banco: {e}")
             return None
 
+    @staticmethod
+    def load_sessions_bulk(cpfs: list, ignore_expiry: bool = False) -> dict:
+        """
+        Carrega as sessões de vários CPFs com uma consulta por lote (IN) e
+        preenche o cache, para que os EnergisaService criados em seguida não
+        consultem o banco um a um.
+
+        Args:
+            cpfs: CPFs dos titulares
+            ignore_expiry: Se True, inclui sessões expiradas (para tentar refresh)
+
+        Returns:
+            Dict {cpf_limpo: cookies} apenas dos CPFs com sessão (válida)
+        """
+        cpfs_limpos = list(dict.fromkeys(SessionManager._clean_cpf(c) for c in cpfs if c))
+        sessoes = {}
+
+        for i in range(0, len(cpfs_limpos), BULK_LOTE):
+            lote = cpfs_limpos[i:i + BULK_LOTE]
+            try:
+                result = db_admin.table("sessoes_energisa").select(
+                    "cpf, cookies, atualizado_em"
+                ).in_("cpf", lote).execute()
+            except Exception as e:
+                logger.error(f"❌ Erro ao carregar sessões do banco em lote: {e}")
+                continue
+
+            for row in result.data or []:
+                cpf_clean = row["cpf"]
+                session_data = {"cookies": row.get("cookies"), "atualizado_em": row.get("atualizado_em")}
+                _cache_gravar(cpf_clean, session_data)
+                cookies = SessionManager._cookies_da_sessao(cpf_clean, session_data, ignore_expiry)
+                if cookies:
+                    sessoes[cpf_clean] = cookies
+
+        logger.debug(f"💾 Sessões carregadas em lote: {len(sessoes)}/{len(cpfs_limpos)} CPFs")
+        return sessoes
+
     @staticmethod
     def delete_session(cpf: str):
         """
@@ -133,11 +206,11 @@ class SessionManager:
             ).execute()
 
             logger.info(f"🗑️ Sessão removida do banco para CPF: {cpf_clean[:3]}***")
-            print(f"🗑️ Sessão removida do banco para CPF: {cpf_clean[:3]}***")
 
         except Exception as e:
             logger.error(f"❌ Erro ao remover sessão do banco: {e}")
-            print(f"❌ Erro ao remover sessão do banco: {e}")
+        finally:
+            _cache_remover(cpf_clean)
 
     @staticmethod
     def session_exists(cpf: str) -> bool:
@@ -151,3 +224,13 @@ class SessionManager:
             True se existir sessão válida
         """
         return SessionManager.load_session(cpf) is not None
+
+    @staticmethod
+    def get_status_cache() -> dict:
+        """Estado do cache de sessões (para /energisa/metricas)."""
+        with _cache_lock:
+            return {
+                "sessoes": len(_cache_sessoes),
+                "ttl_segundos": settings.ENERGISA_SESSAO_CACHE_TTL_SEGUNDOS,
+                **_cache_stats
+            }
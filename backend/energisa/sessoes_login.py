@@ -0,0 +1,227 @@
+"""
+Sessões de Login - Armazenamento limitado dos logins em andamento na Energisa
+Cada login aguardando SMS segura um navegador (e a simulação pública mantém
+a sessão depois de autenticada). Sem limite, logins abandonados acumulavam
+Chromium até estourar a memória. O armazém tem teto de entradas, TTL por
+entrada (renovado a cada acesso) e uma thread que descarta as expiradas,
+chamando `ao_descartar` para fechar navegador/worker. A vaga é reservada
+antes de abrir o navegador (reservar) e, com o armazém cheio, o novo login é
+recusado: sessões ativas nunca são descartadas para dar lugar a outra. A interface
+(ArmazemSessoesLogin) permite trocar a implementação em memória por uma
+compartilhada entre workers
+"""
+
+import threading
+import time
+import logging
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class ArmazemSessoesCheioError(Exception):
+    """Armazém sem vaga para uma nova sessão de login."""
+
+
+class ArmazemSessoesLogin(ABC):
+    """Interface do armazém de sessões de login (chave -> dict de dados)."""
+
+    @abstractmethod
+    def reservar(self) -> bool:
+        """Reserva uma vaga para um login que vai abrir navegador. False se o armazém está cheio."""
+
+    @abstractmethod
+    def liberar_reserva(self):
+        """Devolve uma vaga reservada que não virou sessão (ex: falha ao abrir o navegador)."""
+
+    @abstractmethod
+    def adicionar(self, chave: str, dados: dict, reservada: bool = False):
+        """
+        Grava a sessão. Uma chave nova sem vaga reservada (reservada=False) só
+        entra se houver vaga; senão levanta ArmazemSessoesCheioError.
+        """
+
+    @abstractmethod
+    def obter(self, chave: str) -> Optional[dict]:
+        """Retorna a sessão (renovando o TTL) ou None se não existir/expirou."""
+
+    @abstractmethod
+    def remover(self, chave: str) -> Optional[dict]:
+        """Remove e retorna a sessão, sem chamar ao_descartar (o chamador assume o ciclo de vida)."""
+
+    @abstractmethod
+    def cheio(self) -> bool:
+        ...
+
+    @abstractmethod
+    def tamanho(self) -> int:
+        ...
+
+    @abstractmethod
+    def get_status(self) -> dict:
+        ...
+
+    def __contains__(self, chave: str) -> bool:
+        return self.obter(chave) is not None
+
+
+class ArmazemSessoesLoginMemoria(ArmazemSessoesLogin):
+    """
+    Implementação em memória (por processo).
+
+    - max_sessoes: teto de sessões + vagas reservadas; acima dele, novos logins são recusados
+    - ttl_segundos: sessão sem acesso por mais que isso é descartada pela thread de limpeza
+    - ao_descartar(chave, dados): chamado fora do lock para sessões expiradas
+    """
+
+    def __init__(
+        self,
+        nome: str,
+        max_sessoes: int,
+        ttl_segundos: float,
+        ao_descartar: Optional[Callable[[str, dict], None]] = None,
+        intervalo_limpeza: Optional[float] = None
+    ):
+        self.nome = nome
+        self.max_sessoes = max(1, max_sessoes)
+        self.ttl_segundos = ttl_segundos
+        self.ao_descartar = ao_descartar
+        self.intervalo_limpeza = intervalo_limpeza or max(1.0, min(30.0, ttl_segundos / 4))
+        self._sessoes: "OrderedDict[str, tuple]" = OrderedDict()  # chave -> (ultimo_acesso, dados)
+        self._reservas = 0
+        self._lock = threading.Lock()
+        self._limpeza: Optional[threading.Thread] = None
+        self._descartadas_ttl = 0
+        self._recusadas = 0
+
+    def reservar(self) -> bool:
+        expiradas = []
+        with self._lock:
+            if self._ocupadas() >= self.max_sessoes:
+                # Cheio: só sessões expiradas abrem vaga
+                expiradas = self._retirar_expiradas()
+            reservada = self._ocupadas() < self.max_sessoes
+            if reservada:
+                self._reservas += 1
+            else:
+                self._recusadas += 1
+
+        self._descartar_expiradas(expiradas)
+        if not reservada:
+            logger.warning(f"⚠️ [{self.nome}] Limite de {self.max_sessoes} sessões atingido: login recusado")
+        return reservada
+
+    def liberar_reserva(self):
+        with self._lock:
+            self._reservas = max(0, self._reservas - 1)
+
+    def adicionar(self, chave: str, dados: dict, reservada: bool = False):
+        expiradas = []
+        cheio = False
+        with self._lock:
+            if reservada:
+                self._reservas = max(0, self._reservas - 1)
+            elif chave not in self._sessoes and self._ocupadas() >= self.max_sessoes:
+                expiradas = self._retirar_expiradas()
+                cheio = self._ocupadas() >= self.max_sessoes
+            if cheio:
+                self._recusadas += 1
+            else:
+                self._sessoes[chave] = (time.monotonic(), dados)
+                self._sessoes.move_to_end(chave)
+                self._iniciar_limpeza()
+
+        self._descartar_expiradas(expiradas)
+        if cheio:
+            raise ArmazemSessoesCheioError(f"Limite de {self.max_sessoes} sessões atingido")
+
+    def obter(self, chave: str) -> Optional[dict]:
+        with self._lock:
+            item = self._sessoes.get(chave)
+            if item is None or time.monotonic() - item[0] > self.ttl_segundos:
+                # Expirada: a thread de limpeza descarta (e fecha o navegador)
+                return None
+            self._sessoes[chave] = (time.monotonic(), item[1])
+            self._sessoes.move_to_end(chave)
+            return item[1]
+
+    def remover(self, chave: str) -> Optional[dict]:
+        with self._lock:
+            item = self._sessoes.pop(chave, None)
+        return item[1] if item else None
+
+    def cheio(self) -> bool:
+        with self._lock:
+            return self._ocupadas() >= self.max_sessoes
+
+    def tamanho(self) -> int:
+        with self._lock:
+            return len(self._sessoes)
+
+    def limpar_expiradas(self) -> int:
+        """Descarta as sessões expiradas. Retorna quantas foram descartadas."""
+        with self._lock:
+            expiradas = self._retirar_expiradas()
+
+        self._descartar_expiradas(expiradas)
+        return len(expiradas)
+
+    def _ocupadas(self) -> int:
+        # Chamado com o lock
+        return len(self._sessoes) + self._reservas
+
+    def _retirar_expiradas(self) -> list:
+        # Chamado com o lock: remove e retorna as expiradas (descartadas fora do lock)
+        agora = time.monotonic()
+        expiradas = [
+            (chave, dados) for chave, (ultimo_acesso, dados) in self._sessoes.items()
+            if agora - ultimo_acesso > self.ttl_segundos
+        ]
+        for chave, _ in expiradas:
+            del self._sessoes[chave]
+        self._descartadas_ttl += len(expiradas)
+        return expiradas
+
+    def _descartar_expiradas(self, expiradas: list):
+        for chave, dados in expiradas:
+            logger.info(f"🧹 [{self.nome}] Sessão {chave} expirada, descartando")
+            self._descartar(chave, dados)
+
+    def _descartar(self, chave: str, dados: dict):
+        if not self.ao_descartar:
+            return
+        try:
+            self.ao_descartar(chave, dados)
+        except Exception as e:
+            logger.warning(f"⚠️ [{self.nome}] Erro ao descartar sessão {chave}: {e}")
+
+    def _iniciar_limpeza(self):
+        # Chamado com o lock: a thread só existe enquanto houver sessões
+        if self._limpeza is None or not self._limpeza.is_alive():
+            self._limpeza = threading.Thread(target=self._loop_limpeza, name=f"limpeza-{self.nome}", daemon=True)
+            self._limpeza.start()
+
+    def _loop_limpeza(self):
+        while True:
+            time.sleep(self.intervalo_limpeza)
+            self.limpar_expiradas()
+            with self._lock:
+                if not self._sessoes:
+                    self._limpeza = None
+                    return
+
+    def get_status(self) -> dict:
+        with self._lock:
+            agora = time.monotonic()
+            mais_antiga = max((agora - ultimo for ultimo, _ in self._sessoes.values()), default=None)
+            return {
+                "sessoes": len(self._sessoes),
+                "reservas": self._reservas,
+                "max_sessoes": self.max_sessoes,
+                "ttl_segundos": self.ttl_segundos,
+                "inativa_ha_mais_segundos": round(mais_antiga, 1) if mais_antiga is not None else None,
+                "descartadas_ttl": self._descartadas_ttl,
+                "recusadas": self._recusadas
+            }
@@ -31,17 +31,31 @@ async def lifespan(app: FastAPI):
     logger.info(f"Ambiente: {settings.ENVIRONMENT}")
     logger.info(f"Supabase URL: {settings.SUPABASE_URL}")
 
-    # Inicia o scheduler de sincronização (a cada 10 minutos)
+    # Inicia o scheduler de sincronização (ou deixa para o worker dedicado)
     from backend.sync.scheduler import sync_scheduler
-    sync_scheduler.start()
-    logger.info("🔄 Sync Scheduler iniciado (intervalo: 10 minutos)")
+    if settings.SYNC_SCHEDULER_NA_API:
+        sync_scheduler.start()
+        logger.info(f"🔄 Sync Scheduler iniciado (ciclo de prioridade: {sync_scheduler.interval_seconds // 60} minutos)")
+    else:
+        logger.info("🔄 Sync Scheduler desativado na API (roda em python -m backend.sync.worker)")
+
+    # Chromium pré-aquecidos para os logins na Energisa
+    from backend.energisa.navegador_pool import navegador_pool
+    navegador_pool.aquecer()
 
     yield
 
     # Shutdown
     logger.info("Finalizando aplicação...")
-    sync_scheduler.stop()
-    logger.info("🛑 Sync Scheduler parado")
+    if settings.SYNC_SCHEDULER_NA_API:
+        sync_scheduler.stop()
+        logger.info("🛑 Sync Scheduler parado")
+
+    from backend.sync.service import sync_service
+    from backend.energisa.sessao_http import fechar_transporte_compartilhado
+    await sync_service.pipeline_pdf.parar()
+    await fechar_transporte_compartilhado()
+    navegador_pool.encerrar()
 
 
 # Criação da aplicação FastAPI
@@ -0,0 +1,113 @@
+"""
+Bulk - Escrita em lote para a sincronização
+Agrupa os registros de uma UC e grava com um único upsert por lote
+"""
+
+import logging
+from typing import Optional
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def upsert_em_lote(
+    db,
+    tabela: str,
+    registros: list,
+    on_conflict: str,
+    tamanho_lote: Optional[int] = None
+) -> dict:
+    """
+    Faz upsert de vários registros com o menor número possível de requisições.
+
+    O PostgREST exige que todos os objetos de um mesmo upsert tenham as mesmas
+    colunas (colunas ausentes viram NULL), então os registros são agrupados pelo
+    conjunto de chaves antes de serem divididos em lotes. Registros repetidos na
+    chave de conflito são deduplicados (vale o último), como acontecia no upsert
+    individual. Se um lote falhar, os registros dele são regravados um a um para
+    isolar e reportar apenas os que realmente falharam.
+
+    Args:
+        db: Cliente Supabase (SupabaseClient)
+        tabela: Nome da tabela
+        registros: Lista de dicts a gravar
+        on_conflict: Colunas da chave de conflito (ex: "uc_id,mes_referencia,ano_referencia")
+        tamanho_lote: Máximo de registros por requisição (default: SYNC_TAMANHO_LOTE_UPSERT)
+
+    Returns:
+        dict com:
+            - salvos: registros gravados com sucesso
+            - chaves_salvas: chaves de conflito dos registros gravados
+            - falhas: lista de {"chave": {...}, "erro": str}
+            - requisicoes: número de requisições feitas ao banco
+    """
+    tamanho_lote = max(1, tamanho_lote or settings.SYNC_TAMANHO_LOTE_UPSERT)
+    colunas_conflito = [c.strip() for c in on_conflict.split(",")]
+
+    resultado = {
+        "salvos": 0,
+        "chaves_salvas": [],
+        "falhas": [],
+        "requisicoes": 0
+    }
+
+    if not registros:
+        return resultado
+
+    def _chave(registro: dict) -> tuple:
+        return tuple(registro.get(c) for c in colunas_conflito)
+
+    # Deduplica pela chave de conflito (um mesmo upsert não pode afetar a linha duas vezes)
+    unicos = {}
+    for registro in registros:
+        unicos[_chave(registro)] = registro
+
+    # Agrupa por conjunto de colunas
+    grupos = {}
+    for registro in unicos.values():
+        grupos.setdefault(tuple(sorted(registro.keys())), []).append(registro)
+
+    def _upsert(lote: list):
+        resultado["requisicoes"] += 1
+        db.table(tabela).upsert(lote, on_conflict=on_conflict).execute()
+
+    def _registrar_sucesso(lote: list):
+        resultado["salvos"] += len(lote)
+        resultado["chaves_salvas"].extend(_chave(r) for r in lote)
+
+    for lote_grupo in grupos.values():
+        for i in range(0, len(lote_grupo), tamanho_lote):
+            lote = lote_grupo[i:i + tamanho_lote]
+
+            try:
+                _upsert(lote)
+                _registrar_sucesso(lote)
+                continue
+            except Exception as e:
+                if len(lote) == 1:
+                    resultado["falhas"].append({
+                        "chave": dict(zip(colunas_conflito, _chave(lote[0]))),
+                        "erro": str(e)
+                    })
+                    continue
+                logger.warning(
+                    f"      ⚠️ Upsert em lote de {len(lote)} registros em {tabela} falhou, "
+                    f"regravando individualmente: {e}"
+                )
+
+            # Fallback: isola os registros com problema
+            for registro in lote:
+                try:
+                    _upsert([registro])
+                    _registrar_sucesso([registro])
+                except Exception as e:
+                    resultado["falhas"].append({
+                        "chave": dict(zip(colunas_conflito, _chave(registro))),
+                        "erro": str(e)
+                    })
+
+    for falha in resultado["falhas"]:
+        logger.warning(f"      ⚠️ Erro ao salvar registro em {tabela} {falha['chave']}: {falha['erro']}")
+
+    return resultado
@@ -0,0 +1,77 @@
+"""
+Heartbeat - Saúde e status do worker de sincronização via banco
+O worker publica periodicamente em sync_workers; a API lê de lá quando o
+scheduler não roda no próprio processo (SYNC_SCHEDULER_NA_API=false)
+"""
+
+import os
+import socket
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Execuções do histórico de métricas publicadas a cada heartbeat
+HISTORICO_PUBLICADO = 10
+
+
+def publicar_heartbeat(db, dono: str, status: dict, metricas: dict, parado: bool = False):
+    """
+    Grava (upsert) o heartbeat do processo.
+
+    Args:
+        db: Cliente Supabase (admin)
+        dono: Identificador do processo
+        status: SyncScheduler.get_status()
+        metricas: MetricasSync.get_metricas()
+        parado: Marca o worker como encerrado
+    """
+    agora = datetime.now(timezone.utc).isoformat()
+    metricas = {**metricas, "historico": metricas.get("historico", [])[-HISTORICO_PUBLICADO:]}
+
+    dados = {
+        "dono": dono,
+        "host": socket.gethostname(),
+        "pid": os.getpid(),
+        "lider": bool(status.get("lider")) and not parado,
+        "status": status,
+        "metricas": metricas,
+        "heartbeat_em": agora,
+        "parado_em": agora if parado else None
+    }
+
+    try:
+        db.table("sync_workers").upsert(dados, on_conflict="dono").execute()
+    except Exception as e:
+        logger.warning(f"⚠️ Erro ao publicar heartbeat do worker: {e}")
+
+
+def carregar_worker_ativo(db) -> Optional[dict]:
+    """
+    Retorna o worker com heartbeat mais recente (preferindo o líder).
+
+    Workers sem heartbeat há mais de 3x SYNC_WORKER_HEARTBEAT_SEGUNDOS ou
+    encerrados são ignorados.
+
+    Returns:
+        Linha de sync_workers ou None
+    """
+    limite = datetime.now(timezone.utc) - timedelta(seconds=settings.SYNC_WORKER_HEARTBEAT_SEGUNDOS * 3)
+
+    try:
+        result = db.table("sync_workers").select("*").gte(
+            "heartbeat_em", limite.isoformat()
+        ).is_("parado_em", "null").order("heartbeat_em", desc=True).execute()
+    except Exception as e:
+        logger.warning(f"⚠️ Erro ao carregar heartbeat dos workers: {e}")
+        return None
+
+    workers = result.data or []
+    if not workers:
+        return None
+
+    lideres = [w for w in workers if w.get("lider")]
+    return lideres[0] if lideres else workers[0]
@@ -0,0 +1,197 @@
+"""
+Journal - Diário (checkpoint) da varredura de sincronização
+Persiste CPFs/UCs concluídos em sync_execucoes para que uma varredura
+interrompida seja retomada e o CPF inicial seja rotacionado entre execuções
+"""
+
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from backend.config import settings
+
+logger = logging.getLogger(__name__)
+
+STATUS_EM_ANDAMENTO = "EM_ANDAMENTO"
+STATUS_CONCLUIDA = "CONCLUIDA"
+STATUS_INTERROMPIDA = "INTERROMPIDA"
+
+
+class DiarioExecucao:
+    """
+    Checkpoint de uma execução da varredura.
+
+    Falhas ao gravar o diário nunca interrompem a sincronização: sem a tabela,
+    a varredura roda como antes (do início, sem retomada).
+
+    Os eventos de CPF/UC são chamados do event loop da varredura, então são
+    gravados em lote (no máximo um update a cada SYNC_DIARIO_INTERVALO_SEGUNDOS);
+    um restart perde só os eventos desde o último checkpoint, que são refeitos.
+    """
+
+    def __init__(self, db, modo: str = "completa"):
+        """
+        Args:
+            db: Cliente Supabase (admin)
+            modo: Tipo de execução (uma retomada só reaproveita execuções do mesmo modo)
+        """
+        self.db = db
+        self.modo = modo
+        self.id: Optional[str] = None
+        self.retomada_de: Optional[str] = None
+        self.cpfs_concluidos: list = []
+        self.cpfs_em_andamento: list = []
+        self.ucs_concluidas: set = set()
+        self._ultimo_flush = 0.0
+
+    def preparar(self, ucs_por_cpf: dict) -> dict:
+        """
+        Cria o registro da execução e define a ordem de processamento.
+
+        Se a última execução do modo ficou EM_ANDAMENTO (restart no meio), retoma:
+        UCs já concluídas são puladas e os CPFs que estavam em andamento vão
+        primeiro. Caso contrário, a lista ordenada de CPFs é rotacionada em
+        SYNC_MAX_CPFS_CONCORRENTES posições em relação à execução anterior.
+
+        Args:
+            ucs_por_cpf: dict {cpf: [ucs]}
+
+        Returns:
+            dict {cpf: [ucs]} na ordem de processamento
+        """
+        cpfs = sorted(ucs_por_cpf)
+        anterior = self._buscar_ultima()
+        deslocamento = 0
+
+        if anterior and self._pode_retomar(anterior):
+            self.retomada_de = anterior["id"]
+            self.ucs_concluidas = set(anterior.get("ucs_concluidas") or [])
+            deslocamento = anterior.get("deslocamento") or 0
+            ja_concluidos = set(anterior.get("cpfs_concluidos") or [])
+
+            # Mantém a ordem da execução interrompida; CPFs novos vão para o fim
+            ordem_anterior = [c for c in (anterior.get("ordem_cpfs") or []) if c in ucs_por_cpf]
+            em_andamento = [c for c in (anterior.get("cpfs_em_andamento") or []) if c in ucs_por_cpf]
+            restantes = [c for c in ordem_anterior if c not in em_andamento]
+            novos = [c for c in cpfs if c not in set(ordem_anterior)]
+            ordem = em_andamento + restantes + novos
+
+            self.cpfs_concluidos = [c for c in ordem if c in ja_concluidos]
+            ordem = [c for c in ordem if c not in ja_concluidos]
+
+            logger.info(
+                f"   ⏯️ Retomando execução {anterior['id']} "
+                f"({len(self.ucs_concluidas)} UCs já concluídas)"
+            )
+            self._atualizar(anterior["id"], {
+                "status": STATUS_INTERROMPIDA,
+                "finalizado_em": datetime.now(timezone.utc).isoformat()
+            })
+        else:
+            if anterior and cpfs:
+                deslocamento = ((anterior.get("deslocamento") or 0)
+                                + max(1, settings.SYNC_MAX_CPFS_CONCORRENTES)) % len(cpfs)
+            ordem = cpfs[deslocamento:] + cpfs[:deslocamento]
+
+        ordenado = {}
+        for cpf in ordem:
+            pendentes = [uc for uc in ucs_por_cpf[cpf] if uc.get("id") not in self.ucs_concluidas]
+            if pendentes:
+                ordenado[cpf] = pendentes
+
+        self._criar(list(ordenado), deslocamento)
+        return ordenado
+
+    def cpf_iniciado(self, cpf: str):
+        """Marca o CPF como em andamento (grava em lote, junto com as UCs)."""
+        if cpf not in self.cpfs_em_andamento:
+            self.cpfs_em_andamento.append(cpf)
+        self._flush()
+
+    def uc_concluida(self, uc_id):
+        """Marca a UC como processada (grava em lote, a cada SYNC_DIARIO_INTERVALO_SEGUNDOS)."""
+        self.ucs_concluidas.add(uc_id)
+        self._flush()
+
+    def cpf_concluido(self, cpf: str):
+        """Marca o CPF como concluído (grava em lote, junto com as UCs)."""
+        if cpf in self.cpfs_em_andamento:
+            self.cpfs_em_andamento.remove(cpf)
+        if cpf not in self.cpfs_concluidos:
+            self.cpfs_concluidos.append(cpf)
+        self._flush()
+
+    def finalizar(self, stats: Optional[dict] = None):
+        """Marca a execução como concluída."""
+        self.cpfs_em_andamento = []
+        self._flush(forcar=True, extra={
+            "status": STATUS_CONCLUIDA,
+            "stats": stats,
+            "finalizado_em": datetime.now(timezone.utc).isoformat()
+        })
+
+    def _pode_retomar(self, anterior: dict) -> bool:
+        if anterior.get("status") != STATUS_EM_ANDAMENTO:
+            return False
+        atualizado = anterior.get("atualizado_em") or anterior.get("iniciado_em")
+        if not atualizado:
+            return False
+        try:
+            atualizado_em = datetime.fromisoformat(str(atualizado).replace("Z", "+00:00"))
+        except ValueError:
+            return False
+        limite = timedelta(hours=settings.SYNC_DIARIO_RETOMADA_MAX_HORAS)
+        return datetime.now(timezone.utc) - atualizado_em <= limite
+
+    def _buscar_ultima(self) -> Optional[dict]:
+        try:
+            result = self.db.table("sync_execucoes").select("*").eq(
+                "modo", self.modo
+            ).order("iniciado_em", desc=True).limit(1).execute()
+            return result.data[0] if result.data else None
+        except Exception as e:
+            logger.warning(f"   ⚠️ Diário de sincronização indisponível: {e}")
+            return None
+
+    def _criar(self, ordem: list, deslocamento: int):
+        dados = {
+            "modo": self.modo,
+            "status": STATUS_EM_ANDAMENTO,
+            "ordem_cpfs": ordem,
+            "deslocamento": deslocamento,
+            "cpfs_concluidos": self.cpfs_concluidos,
+            "cpfs_em_andamento": [],
+            "ucs_concluidas": sorted(self.ucs_concluidas),
+        }
+        if self.retomada_de:
+            dados["retomada_de"] = self.retomada_de
+        try:
+            result = self.db.table("sync_execucoes").insert(dados).execute()
+            self.id = result.data[0]["id"] if result.data else None
+            self._ultimo_flush = time.monotonic()
+        except Exception as e:
+            logger.warning(f"   ⚠️ Erro ao criar registro no diário de sincronização: {e}")
+
+    def _flush(self, forcar: bool = False, extra: Optional[dict] = None):
+        if not self.id:
+            return
+        agora = time.monotonic()
+        if not forcar and agora - self._ultimo_flush < settings.SYNC_DIARIO_INTERVALO_SEGUNDOS:
+            return
+
+        dados = {
+            "cpfs_concluidos": self.cpfs_concluidos,
+            "cpfs_em_andamento": self.cpfs_em_andamento,
+            "ucs_concluidas": sorted(self.ucs_concluidas),
+            "atualizado_em": datetime.now(timezone.utc).isoformat(),
+            **(extra or {})
+        }
+        self._atualizar(self.id, dados)
+        self._ultimo_flush = agora
+
+    def _atualizar(self, execucao_id: str, dados: dict):
+        try:
+            self.db.table("sync_execucoes").update(dados).eq("id", execucao_id).execute()
+        except Exception as e:
+            logger.warning(f"   ⚠️ Erro ao gravar checkpoint da sincronização: {e}")
@@ -0,0 +1,215 @@
+"""
+Metrics - Instrumentação da sincronização
+Histogramas de duração por fase, erros por causa, totais por CPF e
+histórico das últimas execuções (em memória, por processo)
+"""
+
+import time
+import contextvars
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional
+
+from backend.config import settings
+
+# Limites superiores dos buckets dos histogramas (ms)
+BUCKETS_MS = (50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000)
+
+# Execução em andamento no contexto atual (propagada para tasks e to_thread)
+_execucao_atual: contextvars.ContextVar = contextvars.ContextVar("execucao_sync", default=None)
+
+
+def classificar_erro(erro: Exception) -> str:
+    """
+    Classifica uma exceção em uma causa agregável.
+
+    Returns:
+        "autenticacao", "timeout", "http_<status>", "conexao" ou o nome da exceção
+    """
+    mensagem = str(erro).lower()
+    resposta = getattr(erro, "response", None)
+    status_code = getattr(resposta, "status_code", None)
+
+    if status_code in (401, 403) or "401" in mensagem or "unauthorized" in mensagem or "token" in mensagem:
+        return "autenticacao"
+    if "timeout" in type(erro).__name__.lower() or "timed out" in mensagem or "timeout" in mensagem:
+        return "timeout"
+    if status_code:
+        return f"http_{status_code}"
+    if "connect" in type(erro).__name__.lower():  # ConnectionError (requests) / ConnectError (httpx)
+        return "conexao"
+    return type(erro).__name__
+
+
+class Histograma:
+    """Histograma de durações com buckets fixos (BUCKETS_MS)"""
+
+    def __init__(self):
+        self.contagem = 0
+        self.soma_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+
+    def registrar(self, duracao_ms: float):
+        self.contagem += 1
+        self.soma_ms += duracao_ms
+        self.max_ms = max(self.max_ms, duracao_ms)
+        for i, limite in enumerate(BUCKETS_MS):
+            if duracao_ms <= limite:
+                self.buckets[i] += 1
+                return
+        self.buckets[-1] += 1
+
+    def percentil(self, p: float) -> Optional[float]:
+        """Percentil aproximado (limite superior do bucket que o contém)."""
+        if not self.contagem:
+            return None
+        alvo = self.contagem * p
+        acumulado = 0
+        for i, quantidade in enumerate(self.buckets):
+            acumulado += quantidade
+            if acumulado >= alvo:
+                return float(BUCKETS_MS[i]) if i < len(BUCKETS_MS) else round(self.max_ms, 1)
+        return round(self.max_ms, 1)
+
+    def resumo(self) -> dict:
+        rotulos = [f"<={limite}" for limite in BUCKETS_MS] + ["+inf"]
+        return {
+            "contagem": self.contagem,
+            "total_ms": round(self.soma_ms, 1),
+            "media_ms": round(self.soma_ms / self.contagem, 1) if self.contagem else None,
+            "p50_ms": self.percentil(0.5),
+            "p95_ms": self.percentil(0.95),
+            "max_ms": round(self.max_ms, 1),
+            "buckets": dict(zip(rotulos, self.buckets))
+        }
+
+
+class MetricasExecucao:
+    """Métricas de uma execução de sincronização"""
+
+    def __init__(self, modo: str):
+        self.modo = modo
+        self.inicio = datetime.now(timezone.utc)
+        self.fim: Optional[datetime] = None
+        self._inicio_monotonic = time.monotonic()
+        self.duracao_ms: Optional[float] = None
+        self.fases: dict = {}
+        self.erros: dict = {}
+        self.cpfs: dict = {}
+        self.stats: Optional[dict] = None
+
+    def registrar_fase(self, fase: str, duracao_ms: float):
+        self.fases.setdefault(fase, Histograma()).registrar(duracao_ms)
+
+    def registrar_erro(self, fase: str, causa: str):
+        chave = f"{fase}:{causa}"
+        self.erros[chave] = self.erros.get(chave, 0) + 1
+
+    def registrar_cpf(self, cpf: str, ucs: int, duracao_ms: float, erros: int):
+        self.cpfs[f"{cpf[:3]}***{cpf[-2:]}"] = {
+            "ucs": ucs,
+            "duracao_ms": round(duracao_ms, 1),
+            "erros": erros
+        }
+
+    def finalizar(self, stats: Optional[dict] = None):
+        self.fim = datetime.now(timezone.utc)
+        self.duracao_ms = (time.monotonic() - self._inicio_monotonic) * 1000
+        self.stats = stats
+
+    def resumo(self) -> dict:
+        return {
+            "modo": self.modo,
+            "inicio": self.inicio.isoformat(),
+            "fim": self.fim.isoformat() if self.fim else None,
+            "duracao_ms": round(self.duracao_ms, 1) if self.duracao_ms is not None else None,
+            "fases": {fase: h.resumo() for fase, h in self.fases.items()},
+            "erros": dict(self.erros),
+            "cpfs": dict(self.cpfs),
+            "stats": self.stats
+        }
+
+
+class MetricasSync:
+    """
+    Agregador de métricas da sincronização.
+
+    Cada fase é registrada no acumulado do processo e, se houver uma execução
+    em andamento no contexto (ver iniciar_execucao), também nela.
+    """
+
+    def __init__(self, historico: Optional[int] = None):
+        self.fases: dict = {}
+        self.erros: dict = {}
+        self.historico = deque(maxlen=historico or settings.SYNC_METRICAS_HISTORICO)
+        self.em_andamento: set = set()
+        self.desde = datetime.now(timezone.utc)
+
+    def iniciar_execucao(self, modo: str) -> MetricasExecucao:
+        """Inicia uma execução e a associa ao contexto atual."""
+        execucao = MetricasExecucao(modo)
+        self.em_andamento.add(execucao)
+        _execucao_atual.set(execucao)
+        return execucao
+
+    def finalizar_execucao(self, execucao: MetricasExecucao, stats: Optional[dict] = None):
+        """Finaliza a execução e a move para o histórico."""
+        execucao.finalizar(stats)
+        self.em_andamento.discard(execucao)
+        self.historico.append(execucao.resumo())
+        _execucao_atual.set(None)
+
+    @staticmethod
+    def desassociar_contexto():
+        """Faz com que o contexto atual (ex: worker de longa duração) registre só no acumulado."""
+        _execucao_atual.set(None)
+
+    def registrar_fase(self, fase: str, duracao_ms: float):
+        self.fases.setdefault(fase, Histograma()).registrar(duracao_ms)
+        execucao = _execucao_atual.get()
+        if execucao is not None:
+            execucao.registrar_fase(fase, duracao_ms)
+
+    def registrar_erro(self, fase: str, erro: Exception):
+        causa = classificar_erro(erro)
+        chave = f"{fase}:{causa}"
+        self.erros[chave] = self.erros.get(chave, 0) + 1
+        execucao = _execucao_atual.get()
+        if execucao is not None:
+            execucao.registrar_erro(fase, causa)
+
+    def registrar_cpf(self, cpf: str, ucs: int, duracao_ms: float, erros: int):
+        execucao = _execucao_atual.get()
+        if execucao is not None:
+            execucao.registrar_cpf(cpf, ucs, duracao_ms, erros)
+
+    @contextmanager
+    def medir(self, fase: str):
+        """
+        Mede a duração de um bloco (inclusive com await dentro) e registra
+        o erro por causa se ele levantar exceção.
+        """
+        inicio = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.registrar_erro(fase, e)
+            raise
+        finally:
+            self.registrar_fase(fase, (time.monotonic() - inicio) * 1000)
+
+    def get_metricas(self) -> dict:
+        """Retorna o acumulado do processo, execuções em andamento e histórico."""
+        return {
+            "desde": self.desde.isoformat(),
+            "fases": {fase: h.resumo() for fase, h in self.fases.items()},
+            "erros": dict(self.erros),
+            "em_andamento": [e.resumo() for e in self.em_andamento],
+            "historico": list(self.historico)
+        }
+
+
+# Instância global
+metricas_sync = MetricasSync()
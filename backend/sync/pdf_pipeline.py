@@ -0,0 +1,236 @@
+"""
+PDF Pipeline - Download de PDFs de faturas em estágio separado
+A sincronização de metadados apenas enfileira as faturas sem PDF; um pool
+limitado de workers baixa os PDFs com retentativas e backoff exponencial
+"""
+
+import asyncio
+import base64
+import logging
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+from backend.config import settings
+from backend.energisa.async_service import chamar_energisa
+from backend.sync.metrics import metricas_sync
+
+logger = logging.getLogger(__name__)
+
+# Tentativas mantidas em memória para diagnóstico
+MAX_TENTATIVAS_REGISTRADAS = 500
+
+
+@dataclass
+class ItemPdf:
+    """Fatura com PDF pendente de download"""
+    uc_id: int
+    cdc: Any
+    uc_data: dict
+    mes: int
+    ano: int
+    numero_fatura: Any
+    svc: Any  # EnergisaService autenticado do CPF
+    lock: asyncio.Lock  # Lock de contexto de UC da sessão
+    tentativa: int = 0
+
+    @property
+    def chave(self) -> tuple:
+        return (self.uc_id, self.mes, self.ano)
+
+
+class PipelinePdf:
+    """
+    Fila de downloads de PDF consumida por um pool limitado de workers.
+
+    Falhas são reenfileiradas com backoff exponencial e jitter até
+    SYNC_PDF_MAX_TENTATIVAS; cada tentativa fica registrada em self.tentativas.
+    """
+
+    def __init__(
+        self,
+        db,
+        workers: Optional[int] = None,
+        max_tentativas: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None
+    ):
+        """
+        Args:
+            db: Cliente Supabase (admin)
+            workers: Downloads simultâneos (default: SYNC_PDF_WORKERS)
+            max_tentativas: Tentativas por PDF (default: SYNC_PDF_MAX_TENTATIVAS)
+            backoff_base: Espera antes da 2ª tentativa em segundos
+            backoff_max: Teto da espera entre tentativas em segundos
+        """
+        self.db = db
+        self.workers = workers or settings.SYNC_PDF_WORKERS
+        self.max_tentativas = max_tentativas or settings.SYNC_PDF_MAX_TENTATIVAS
+        self.backoff_base = backoff_base if backoff_base is not None else settings.SYNC_PDF_BACKOFF_BASE_SEGUNDOS
+        self.backoff_max = backoff_max if backoff_max is not None else settings.SYNC_PDF_BACKOFF_MAX_SEGUNDOS
+
+        self.tentativas = deque(maxlen=MAX_TENTATIVAS_REGISTRADAS)
+        self.contadores = {
+            "enfileirados": 0,
+            "baixados": 0,
+            "retentativas": 0,
+            "desistencias": 0
+        }
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._fila: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+        self._pendentes: set = set()
+        self._ocioso: Optional[asyncio.Event] = None
+
+    def _garantir_workers(self):
+        """Cria fila e workers no event loop atual (recria se o loop mudou)."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+
+        self._loop = loop
+        self._fila = asyncio.Queue()
+        self._pendentes = set()
+        self._ocioso = asyncio.Event()
+        self._ocioso.set()
+        self._tasks = [
+            loop.create_task(self._worker(i)) for i in range(max(1, self.workers))
+        ]
+        logger.debug(f"📥 Pipeline de PDFs iniciado com {len(self._tasks)} workers")
+
+    def enfileirar(self, item: ItemPdf) -> bool:
+        """
+        Enfileira o download de um PDF (ignora se a fatura já está na fila).
+
+        Returns:
+            True se o item foi enfileirado
+        """
+        self._garantir_workers()
+
+        if item.chave in self._pendentes:
+            return False
+
+        self._pendentes.add(item.chave)
+        self._ocioso.clear()
+        self._fila.put_nowait(item)
+        self.contadores["enfileirados"] += 1
+        return True
+
+    async def aguardar(self):
+        """Aguarda até que todos os PDFs pendentes (incluindo retentativas) terminem."""
+        if self._ocioso is not None:
+            await self._ocioso.wait()
+
+    async def parar(self):
+        """Cancela os workers e descarta os itens pendentes."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._loop = None
+        self._pendentes = set()
+        if self._ocioso is not None:
+            self._ocioso.set()
+
+    def get_status(self) -> dict:
+        """Retorna tamanho da fila, contadores e últimas tentativas."""
+        return {
+            "workers": self.workers,
+            "pendentes": len(self._pendentes),
+            "na_fila": self._fila.qsize() if self._fila else 0,
+            **self.contadores,
+            "ultimas_tentativas": list(self.tentativas)[-20:]
+        }
+
+    def _calcular_espera(self, tentativa: int) -> float:
+        """Backoff exponencial com jitter (50% a 150% do valor base)."""
+        espera = min(self.backoff_max, self.backoff_base * (2 ** (tentativa - 1)))
+        return espera * random.uniform(0.5, 1.5)
+
+    def _finalizar(self, item: ItemPdf):
+        self._pendentes.discard(item.chave)
+        if not self._pendentes:
+            self._ocioso.set()
+
+    async def _worker(self, numero: int):
+        # Downloads sobrevivem à execução que os enfileirou: registra só no acumulado
+        metricas_sync.desassociar_contexto()
+
+        while True:
+            item = await self._fila.get()
+            try:
+                await self._processar(item)
+            except Exception as e:
+                logger.error(f"❌ Erro inesperado no worker de PDF {numero}: {e}")
+                self._finalizar(item)
+            finally:
+                self._fila.task_done()
+
+    async def _processar(self, item: ItemPdf):
+        item.tentativa += 1
+        inicio = time.monotonic()
+        erro = None
+
+        try:
+            pdf_request_data = {
+                "ano": item.ano,
+                "mes": item.mes,
+                "numeroFatura": item.numero_fatura
+            }
+            async with item.lock:
+                with metricas_sync.medir("download_pdf"):
+                    pdf_bytes = await chamar_energisa(
+                        item.svc, "download_pdf", item.uc_data, pdf_request_data
+                    )
+
+            if pdf_bytes:
+                with metricas_sync.medir("db_escrita_pdf"):
+                    self.db.table("faturas").update({
+                        "pdf_base64": base64.b64encode(pdf_bytes).decode("utf-8"),
+                        "pdf_baixado_em": datetime.now(timezone.utc).isoformat()
+                    }).eq("uc_id", item.uc_id).eq(
+                        "mes_referencia", item.mes
+                    ).eq("ano_referencia", item.ano).execute()
+            else:
+                erro = "PDF vazio"
+        except Exception as e:
+            erro = str(e)
+
+        self.tentativas.append({
+            "uc_id": item.uc_id,
+            "cdc": item.cdc,
+            "mes": item.mes,
+            "ano": item.ano,
+            "tentativa": item.tentativa,
+            "sucesso": erro is None,
+            "erro": erro,
+            "duracao_ms": round((time.monotonic() - inicio) * 1000),
+            "em": datetime.now(timezone.utc).isoformat()
+        })
+
+        if erro is None:
+            self.contadores["baixados"] += 1
+            logger.debug(f"      📄 PDF baixado para fatura {item.mes:02d}/{item.ano} (UC {item.cdc})")
+            self._finalizar(item)
+            return
+
+        if item.tentativa >= self.max_tentativas:
+            self.contadores["desistencias"] += 1
+            logger.warning(
+                f"      ⚠️ PDF {item.mes:02d}/{item.ano} da UC {item.cdc} não baixado "
+                f"após {item.tentativa} tentativas: {erro}"
+            )
+            self._finalizar(item)
+            return
+
+        espera = self._calcular_espera(item.tentativa)
+        self.contadores["retentativas"] += 1
+        logger.debug(
+            f"      🔁 PDF {item.mes:02d}/{item.ano} da UC {item.cdc} falhou ({erro}); "
+            f"nova tentativa em {espera:.1f}s"
+        )
+        self._loop.call_later(espera, self._fila.put_nowait, item)
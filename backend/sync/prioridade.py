@@ -0,0 +1,210 @@
+"""
+Prioridade - Pontuação de UCs para o scheduler de sincronização
+Define quais UCs estão mais "devidas" de sincronização em cada ciclo
+"""
+
+from datetime import datetime, date, timedelta, timezone
+from typing import Optional
+
+# ========================
+# Pesos da pontuação
+# ========================
+
+# Pontos por hora desde a última sincronização (limitado a PRIORIDADE_MAX_HORAS)
+PESO_HORA_SEM_SYNC = 1.0
+PRIORIDADE_MAX_HORAS = 24 * 7
+
+# UC nunca sincronizada (nem tentada) vai para o topo da fila
+PONTOS_NUNCA_SINCRONIZADA = 1000.0
+
+# Backoff após falhas consecutivas: intervalo mínimo * 2^(falhas - 1), limitado
+BACKOFF_MAX_HORAS = 24
+
+# Vencimento próximo (dentro da janela) - máximo no dia do vencimento
+PESO_VENCIMENTO = 48.0
+JANELA_VENCIMENTO_DIAS = 7
+
+# Leitura prevista (última leitura + ciclo) - nova fatura esperada
+PESO_LEITURA = 36.0
+CICLO_LEITURA_DIAS = 30
+JANELA_LEITURA_DIAS = 5
+
+# Faturas recentes sem PDF e com extração pendente (por fatura, limitado)
+PESO_FATURA_SEM_PDF = 24.0
+PESO_EXTRACAO_PENDENTE = 12.0
+MAX_FATURAS_CONTADAS = 3
+
+
+def _parse_datetime(valor) -> Optional[datetime]:
+    """Converte timestamp ISO do banco para datetime com timezone."""
+    if not valor:
+        return None
+    if isinstance(valor, datetime):
+        return valor if valor.tzinfo else valor.replace(tzinfo=timezone.utc)
+    try:
+        dt = datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+def _parse_date(valor) -> Optional[date]:
+    """Converte data ISO (YYYY-MM-DD) do banco para date."""
+    if not valor:
+        return None
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(str(valor)[:10])
+    except ValueError:
+        return None
+
+
+def novo_contexto() -> dict:
+    """Contexto de faturas usado na pontuação de uma UC."""
+    return {
+        "vencimentos": [],
+        "ultima_leitura": None,
+        "faturas_sem_pdf": 0,
+        "extracoes_pendentes": 0
+    }
+
+
+def montar_contextos(faturas_recentes: list, faturas_sem_pdf: list) -> dict:
+    """
+    Agrega as faturas recentes por UC.
+
+    Args:
+        faturas_recentes: Linhas de faturas com uc_id, data_vencimento,
+            data_leitura e extracao_status
+        faturas_sem_pdf: Linhas (uc_id) de faturas recentes sem PDF
+
+    Returns:
+        dict {uc_id: contexto}
+    """
+    contextos = {}
+
+    for fatura in faturas_recentes:
+        ctx = contextos.setdefault(fatura.get("uc_id"), novo_contexto())
+
+        vencimento = _parse_date(fatura.get("data_vencimento"))
+        if vencimento:
+            ctx["vencimentos"].append(vencimento)
+
+        leitura = _parse_date(fatura.get("data_leitura"))
+        if leitura and (ctx["ultima_leitura"] is None or leitura > ctx["ultima_leitura"]):
+            ctx["ultima_leitura"] = leitura
+
+        if fatura.get("extracao_status") == "PENDENTE":
+            ctx["extracoes_pendentes"] += 1
+
+    for fatura in faturas_sem_pdf:
+        ctx = contextos.setdefault(fatura.get("uc_id"), novo_contexto())
+        ctx["faturas_sem_pdf"] += 1
+
+    return contextos
+
+
+def calcular_prioridade(uc: dict, contexto: Optional[dict], agora: datetime) -> float:
+    """
+    Calcula a pontuação de prioridade de sincronização de uma UC.
+
+    Componentes:
+    - Tempo desde ultima_sincronizacao ou sync_ultima_tentativa, o mais recente
+      (UC nunca sincronizada nem tentada vai para o topo)
+    - Vencimento de fatura nos próximos JANELA_VENCIMENTO_DIAS dias
+    - Próxima leitura prevista (nova fatura esperada) ainda não sincronizada
+    - Faturas recentes sem PDF
+    - Faturas com extração pendente
+
+    Args:
+        uc: UC do banco (precisa de ultima_sincronizacao e sync_ultima_tentativa)
+        contexto: Contexto de faturas da UC (ver montar_contextos)
+        agora: Momento de referência (UTC)
+
+    Returns:
+        Pontuação (maior = mais prioritária)
+    """
+    ctx = contexto or novo_contexto()
+    hoje = agora.date()
+    pontos = 0.0
+
+    ultima_sync = _parse_datetime(uc.get("ultima_sincronizacao"))
+    ultima_tentativa = _parse_datetime(uc.get("sync_ultima_tentativa"))
+    # Tentativa que falhou também conta: sem isso a UC ficaria no topo para sempre
+    referencia = max((d for d in (ultima_sync, ultima_tentativa) if d), default=None)
+    if referencia is None:
+        pontos += PONTOS_NUNCA_SINCRONIZADA
+    else:
+        horas = (agora - referencia).total_seconds() / 3600
+        pontos += min(max(horas, 0.0), PRIORIDADE_MAX_HORAS) * PESO_HORA_SEM_SYNC
+
+    # Vencimento mais próximo ainda não passado
+    proximos = [v for v in ctx["vencimentos"] if 0 <= (v - hoje).days <= JANELA_VENCIMENTO_DIAS]
+    if proximos:
+        dias = (min(proximos) - hoje).days
+        pontos += PESO_VENCIMENTO * (JANELA_VENCIMENTO_DIAS + 1 - dias) / (JANELA_VENCIMENTO_DIAS + 1)
+
+    # Leitura prevista: a partir dela uma nova fatura deve aparecer na Energisa
+    if ctx["ultima_leitura"]:
+        proxima_leitura = ctx["ultima_leitura"] + timedelta(days=CICLO_LEITURA_DIAS)
+        dias = (hoje - proxima_leitura).days
+        sincronizou_depois = ultima_sync is not None and ultima_sync.date() > proxima_leitura + timedelta(days=JANELA_LEITURA_DIAS)
+        if -JANELA_LEITURA_DIAS <= dias and not sincronizou_depois:
+            pontos += PESO_LEITURA
+
+    pontos += PESO_FATURA_SEM_PDF * min(ctx["faturas_sem_pdf"], MAX_FATURAS_CONTADAS)
+    pontos += PESO_EXTRACAO_PENDENTE * min(ctx["extracoes_pendentes"], MAX_FATURAS_CONTADAS)
+
+    return round(pontos, 2)
+
+
+def janela_backoff(falhas: int, intervalo_minimo_minutos: int) -> timedelta:
+    """Tempo sem nova tentativa após `falhas` falhas consecutivas (0 = sem backoff)."""
+    if falhas <= 0:
+        return timedelta(0)
+    minutos = intervalo_minimo_minutos * 2 ** min(falhas - 1, 16)
+    return min(timedelta(minutes=minutos), timedelta(hours=BACKOFF_MAX_HORAS))
+
+
+def selecionar_ucs_devidas(
+    ucs: list,
+    contextos: dict,
+    limite: int,
+    intervalo_minimo_minutos: int,
+    agora: Optional[datetime] = None
+) -> list:
+    """
+    Ordena as UCs por prioridade e retorna as N mais devidas.
+
+    UCs sincronizadas há menos de intervalo_minimo_minutos são ignoradas,
+    para que a mesma UC não seja consultada em todo ciclo. UCs cuja última
+    tentativa falhou ficam fora por janela_backoff(sync_falhas_consecutivas).
+
+    Args:
+        ucs: UCs do banco
+        contextos: dict {uc_id: contexto} (ver montar_contextos)
+        limite: Máximo de UCs retornadas
+        intervalo_minimo_minutos: Intervalo mínimo entre sincronizações da mesma UC
+        agora: Momento de referência (default: agora em UTC)
+
+    Returns:
+        Lista de (pontuacao, uc) em ordem decrescente de prioridade
+    """
+    agora = agora or datetime.now(timezone.utc)
+    corte = agora - timedelta(minutes=intervalo_minimo_minutos)
+
+    candidatas = []
+    for uc in ucs:
+        ultima_sync = _parse_datetime(uc.get("ultima_sincronizacao"))
+        if ultima_sync and ultima_sync > corte:
+            continue
+        ultima_tentativa = _parse_datetime(uc.get("sync_ultima_tentativa"))
+        falhas = uc.get("sync_falhas_consecutivas") or 0
+        if ultima_tentativa and ultima_tentativa > agora - janela_backoff(falhas, intervalo_minimo_minutos):
+            continue
+        pontuacao = calcular_prioridade(uc, contextos.get(uc.get("id")), agora)
+        candidatas.append((pontuacao, uc))
+
+    candidatas.sort(key=lambda item: item[0], reverse=True)
+    return candidatas[:max(0, limite)]
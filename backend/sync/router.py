@@ -9,6 +9,11 @@ from pydantic import BaseModel
 from backend.core.security import CurrentUser, get_current_active_user, require_perfil
 from backend.sync.service import sync_service
 from backend.sync.scheduler import sync_scheduler
+from backend.sync.metrics import metricas_sync
+from backend.sync.heartbeat import carregar_worker_ativo
+from backend.config import settings
+from backend.energisa.rate_limiter import energisa_rate_limiter
+from backend.energisa.circuit_breaker import disjuntores_energisa
 
 router = APIRouter()
 
@@ -24,8 +29,22 @@ class SyncStatusResponse(BaseModel):
     """Status do scheduler"""
     running: bool
     interval_minutes: int
+    modo: str | None = None
+    ucs_por_ciclo: int | None = None
+    orcamento_segundos: int | None = None
+    lider: bool | None = None
+    lease_dono: str | None = None
     last_sync: str | None
     last_stats: dict | None
+    pdfs: dict | None = None
+    circuitos: dict | None = None
+    origem: str | None = None
+    worker_heartbeat_em: str | None = None
+
+
+def _scheduler_no_worker() -> bool:
+    """True quando o scheduler roda no worker dedicado, e não neste processo."""
+    return not settings.SYNC_SCHEDULER_NA_API and not sync_scheduler._running
 
 
 @router.get(
@@ -37,8 +56,61 @@ class SyncStatusResponse(BaseModel):
 async def get_sync_status(
     current_user: Annotated[CurrentUser, Depends(get_current_active_user)],
 ):
-    """Retorna status do scheduler de sincronização."""
-    return sync_scheduler.get_status()
+    """
+    Retorna status do scheduler de sincronização.
+
+    Com o scheduler no worker dedicado, o status vem do último heartbeat dele.
+    """
+    if _scheduler_no_worker():
+        worker = carregar_worker_ativo(sync_service.db)
+        if not worker:
+            return SyncStatusResponse(
+                running=False,
+                interval_minutes=settings.SYNC_PRIORIDADE_INTERVALO_MINUTOS,
+                last_sync=None,
+                last_stats=None,
+                origem="worker"
+            )
+        return {
+            **(worker.get("status") or {}),
+            "origem": "worker",
+            "worker_heartbeat_em": worker.get("heartbeat_em")
+        }
+
+    return {**sync_scheduler.get_status(), "origem": "api"}
+
+
+@router.get(
+    "/metricas",
+    summary="Métricas da Sincronização",
+    description="Histogramas de duração por fase, erros por causa, totais por CPF e histórico das últimas execuções",
+    dependencies=[Depends(require_perfil("superadmin", "gestor"))]
+)
+async def get_sync_metricas(
+    current_user: Annotated[CurrentUser, Depends(get_current_active_user)],
+):
+    """
+    Retorna as métricas de sincronização deste processo (ou do worker
+    dedicado, pelo último heartbeat, quando o scheduler não roda na API).
+
+    Requer perfil superadmin ou gestor.
+    """
+    if _scheduler_no_worker():
+        worker = carregar_worker_ativo(sync_service.db) or {}
+        status_worker = worker.get("status") or {}
+        return {
+            **(worker.get("metricas") or {}),
+            "pdfs": status_worker.get("pdfs"),
+            "circuitos": status_worker.get("circuitos"),
+            "origem": "worker",
+            "worker_heartbeat_em": worker.get("heartbeat_em")
+        }
+
+    metricas = metricas_sync.get_metricas()
+    metricas["pdfs"] = sync_service.pipeline_pdf.get_status()
+    metricas["rate_limiter"] = energisa_rate_limiter.get_status()
+    metricas["circuitos"] = disjuntores_energisa.get_status()
+    return metricas
 
 
 @router.post(
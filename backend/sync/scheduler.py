@@ -1,6 +1,6 @@
 """
 Sync Scheduler - Agendador de sincronização automática
-Executa a sincronização a cada 10 minutos
+A cada ciclo sincroniza as UCs mais "devidas" (ver sync/prioridade.py)
 """
 
 import asyncio
@@ -8,19 +8,36 @@ import logging
 from datetime import datetime
 from typing import Optional
 
+from backend.config import settings
+from backend.core.lease import Lease, criar_lease
+from backend.energisa.circuit_breaker import disjuntores_energisa
+
 logger = logging.getLogger(__name__)
 
 
 class SyncScheduler:
     """Agendador de sincronização com a Energisa"""
 
-    def __init__(self, interval_minutes: int = 120):
+    def __init__(
+        self,
+        interval_minutes: int = 120,
+        ucs_por_ciclo: Optional[int] = None,
+        orcamento_segundos: Optional[int] = None,
+        lease: Optional[Lease] = None
+    ):
         """
         Args:
-            interval_minutes: Intervalo entre sincronizações em minutos
+            interval_minutes: Intervalo entre ciclos em minutos
+            ucs_por_ciclo: Máximo de UCs sincronizadas por ciclo
+            orcamento_segundos: Tempo máximo para iniciar UCs em um ciclo
+            lease: Lease entre processos (default: criar_lease("sync_scheduler"))
         """
         self.interval_seconds = interval_minutes * 60
+        self.ucs_por_ciclo = ucs_por_ciclo
+        self.orcamento_segundos = orcamento_segundos
+        self._lease = lease
         self._task: Optional[asyncio.Task] = None
+        self._lease_task: Optional[asyncio.Task] = None
         self._running = False
         self._last_sync: Optional[datetime] = None
         self._last_stats: Optional[dict] = None
@@ -29,18 +46,27 @@ class SyncScheduler:
         """Loop principal de sincronização"""
         from backend.sync.service import sync_service
 
-        logger.info(f"🚀 Scheduler iniciado - Sincronização a cada {self.interval_seconds // 60} minutos")
+        logger.info(f"🚀 Scheduler iniciado - Ciclo de prioridade a cada {self.interval_seconds // 60} minutos")
 
         while self._running:
+            # Só o processo detentor do lease sincroniza
+            if not self._lease.ativo:
+                await asyncio.sleep(max(1, self._lease.ttl_segundos // 3))
+                continue
+
             try:
-                logger.info(f"⏰ Executando sincronização programada...")
+                logger.debug("⏰ Executando ciclo de sincronização por prioridade...")
                 self._last_sync = datetime.now()
 
-                # Executa sincronização
-                stats = await sync_service.sincronizar_todas_ucs()
+                # Sincroniza apenas as UCs mais devidas neste ciclo
+                stats = await sync_service.sincronizar_ucs_prioritarias(
+                    limite=self.ucs_por_ciclo,
+                    orcamento_segundos=self.orcamento_segundos
+                )
                 self._last_stats = stats
 
-                logger.info(f"✅ Sincronização concluída. Próxima em {self.interval_seconds // 60} minutos.")
+                if stats.get("ucs_selecionadas"):
+                    logger.info(f"✅ Ciclo concluído. Próximo em {self.interval_seconds // 60} minutos.")
 
             except Exception as e:
                 logger.error(f"❌ Erro na sincronização programada: {e}")
@@ -48,33 +74,59 @@ class SyncScheduler:
             # Aguarda o intervalo
             await asyncio.sleep(self.interval_seconds)
 
+    async def _lease_loop(self):
+        """Adquire/renova o lease a cada TTL/3 enquanto o scheduler roda"""
+        intervalo = max(1, self._lease.ttl_segundos // 3)
+
+        while self._running:
+            await asyncio.to_thread(self._lease.adquirir)
+            await asyncio.sleep(intervalo)
+
     def start(self):
         """Inicia o scheduler"""
         if self._running:
             logger.warning("⚠️ Scheduler já está rodando")
             return
 
+        if self._lease is None:
+            self._lease = criar_lease("sync_scheduler")
+
         self._running = True
+        self._lease_task = asyncio.create_task(self._lease_loop())
         self._task = asyncio.create_task(self._sync_loop())
         logger.info("✅ Sync Scheduler iniciado")
 
     def stop(self):
-        """Para o scheduler"""
+        """Para o scheduler e libera o lease"""
         self._running = False
         if self._task:
             self._task.cancel()
             self._task = None
+        if self._lease_task:
+            self._lease_task.cancel()
+            self._lease_task = None
+        if self._lease:
+            self._lease.liberar()
         logger.info("🛑 Sync Scheduler parado")
 
     def get_status(self) -> dict:
         """Retorna status do scheduler"""
+        from backend.sync.service import sync_service
+
         return {
             "running": self._running,
             "interval_minutes": self.interval_seconds // 60,
+            "modo": "prioridade",
+            "lider": bool(self._lease and self._lease.ativo),
+            "lease_dono": self._lease.dono if self._lease else None,
+            "ucs_por_ciclo": self.ucs_por_ciclo or settings.SYNC_PRIORIDADE_UCS_POR_CICLO,
+            "orcamento_segundos": self.orcamento_segundos or settings.SYNC_PRIORIDADE_ORCAMENTO_SEGUNDOS,
             "last_sync": self._last_sync.isoformat() if self._last_sync else None,
-            "last_stats": self._last_stats
+            "last_stats": self._last_stats,
+            "pdfs": sync_service.pipeline_pdf.get_status(),
+            "circuitos": disjuntores_energisa.get_status()
         }
 
 
 # Instância global do scheduler
-sync_scheduler = SyncScheduler(interval_minutes=10)
+sync_scheduler = SyncScheduler(interval_minutes=settings.SYNC_PRIORIDADE_INTERVALO_MINUTOS)
@@ -5,15 +5,26 @@ Executa a cada 10 minutos para manter os dados atualizados
 
 import asyncio
 import logging
-import base64
-from datetime import datetime, timezone
+import weakref
+import hashlib
+import json
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from decimal import Decimal
 import re
 
 from backend.core.database import SupabaseClient
 from backend.energisa.service import EnergisaService
+from backend.energisa.async_service import AsyncEnergisaService, chamar_energisa
 from backend.energisa.session_manager import SessionManager
+from backend.energisa.rate_limiter import PRIORIDADE_BACKGROUND
+from backend.energisa.circuit_breaker import disjuntores_energisa, FAMILIAS_SYNC
+from backend.sync.bulk import upsert_em_lote
+from backend.sync.pdf_pipeline import PipelinePdf, ItemPdf
+from backend.sync.metrics import metricas_sync
+from backend.sync.journal import DiarioExecucao
+from backend.sync.prioridade import montar_contextos, selecionar_ucs_devidas
 from backend.config import settings
 
 logger = logging.getLogger(__name__)
@@ -59,31 +70,90 @@ def parse_date(date_str: str) -> Optional[str]:
         return None
 
 
+def parse_data_hora(valor) -> Optional[datetime]:
+    """
+    Converte data/hora da Energisa ou do banco (ISO ou DD/MM/YYYY HH:MM:SS) em
+    datetime com fuso (UTC quando não informado), para comparação.
+
+    Args:
+        valor: Data/hora em texto
+
+    Returns:
+        datetime ou None
+    """
+    if not valor or not isinstance(valor, str):
+        return None
+
+    dt = None
+    try:
+        dt = datetime.fromisoformat(valor.strip().replace("Z", "+00:00"))
+    except ValueError:
+        for fmt in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y"):
+            try:
+                dt = datetime.strptime(valor.strip(), fmt)
+                break
+            except ValueError:
+                continue
+
+    if dt is None:
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def calcular_hash_conteudo(dados) -> str:
+    """
+    Calcula um hash estável do conteúdo retornado pela Energisa.
+
+    Usa o JSON canônico (chaves ordenadas, sem espaços), de forma que o mesmo
+    payload sempre gere o mesmo hash independente da ordem das chaves.
+
+    Args:
+        dados: Item da API (dict/list)
+
+    Returns:
+        SHA-256 em hexadecimal
+    """
+    canonico = json.dumps(
+        dados, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(canonico.encode("utf-8")).hexdigest()
+
+
+def _contar(stats: Optional[dict], chave: str, quantidade: int = 1):
+    """Incrementa um contador das estatísticas, se houver."""
+    if stats is not None and quantidade:
+        stats[chave] = stats.get(chave, 0) + quantidade
+
+
 class SyncService:
     """Serviço de sincronização de dados com a Energisa"""
 
     def __init__(self):
         self.db = SupabaseClient(admin=True)  # Usa admin para bypass RLS
         self._running = False
+        # Lock de contexto de UC por instância de EnergisaService (uma sessão HTTP cada)
+        self._locks_contexto = weakref.WeakKeyDictionary()
+        # Downloads de PDF em estágio separado da sincronização de metadados
+        self.pipeline_pdf = PipelinePdf(self.db)
 
     async def sincronizar_todas_ucs(self) -> dict:
         """
         Sincroniza todas as UCs que possuem sessão ativa na Energisa.
 
+        Os CPFs são processados em paralelo (até SYNC_MAX_CPFS_CONCORRENTES),
+        cada um com sua própria instância de EnergisaService, e as UCs de um
+        mesmo CPF são processadas em paralelo até SYNC_MAX_UCS_POR_CPF.
+
+        O progresso é gravado em sync_execucoes (ver sync/journal.py): após um
+        restart a varredura retoma de onde parou; senão, o CPF inicial é rotacionado.
+
         Returns:
             dict com estatísticas da sincronização
         """
         logger.info("🔄 Iniciando sincronização de todas as UCs...")
 
-        stats = {
-            "ucs_processadas": 0,
-            "ucs_atualizadas": 0,
-            "faturas_sincronizadas": 0,
-            "gd_sincronizados": 0,
-            "erros": 0,
-            "inicio": datetime.now(timezone.utc).isoformat(),
-            "fim": None
-        }
+        stats = self._novas_stats()
+        execucao = metricas_sync.iniciar_execucao("completa")
 
         try:
             # Busca todas as UCs com seus usuários
@@ -95,109 +165,469 @@ class SyncService:
             logger.info(f"   📋 {len(ucs)} UCs encontradas para sincronizar")
 
             # Agrupa UCs por CPF para otimizar uso de sessão
-            ucs_por_cpf = {}
-            for uc in ucs:
-                cpf = uc.get("usuarios", {}).get("cpf")
-                if cpf:
-                    cpf_limpo = cpf.replace(".", "").replace("-", "")
-                    if cpf_limpo not in ucs_por_cpf:
-                        ucs_por_cpf[cpf_limpo] = []
-                    ucs_por_cpf[cpf_limpo].append(uc)
-
-            # Processa cada CPF
-            for cpf, ucs_do_cpf in ucs_por_cpf.items():
-                try:
-                    # Verifica se existe sessão para este CPF (ignora expiração para tentar refresh)
-                    cookies = SessionManager.load_session(cpf, ignore_expiry=True)
-                    if not cookies:
-                        logger.debug(f"   ⏭️ CPF {cpf[:3]}***{cpf[-2:]}: sem sessão salva")
-                        continue
+            ucs_por_cpf = self._agrupar_ucs_por_cpf(ucs)
 
-                    # Carrega cookies no serviço mesmo se expirados
-                    svc = EnergisaService(cpf)
-                    svc.cookies = cookies
-                    svc._apply_cookies(cookies)
+            # Ordem de processamento (retomada ou rotação) e checkpoint
+            diario = DiarioExecucao(self.db, modo="completa")
+            ucs_por_cpf = diario.preparar(ucs_por_cpf)
+            stats["execucao_id"] = diario.id
+            stats["retomada_de"] = diario.retomada_de
 
-                    # Faz refresh token ANTES de começar a sincronizar
-                    logger.info(f"   🔄 Renovando token para CPF {cpf[:3]}***{cpf[-2:]}...")
-                    if not svc._refresh_token():
-                        logger.warning(f"   ⏭️ CPF {cpf[:3]}***{cpf[-2:]}: falha no refresh, pulando")
-                        continue
+            await self._executar_varredura(ucs_por_cpf, stats, diario=diario)
+            diario.finalizar(stats)
 
-                    # Verifica se está autenticado após refresh
-                    if not svc.is_authenticated():
-                        logger.debug(f"   ⏭️ CPF {cpf[:3]}***{cpf[-2:]}: não autenticado após refresh")
-                        continue
+        except Exception as e:
+            logger.error(f"❌ Erro geral na sincronização: {e}")
+            stats["erros"] += 1
+
+        stats["fim"] = datetime.now(timezone.utc).isoformat()
+        metricas_sync.finalizar_execucao(execucao, stats)
+        self._log_resumo(stats)
 
-                    logger.info(f"   👤 Processando CPF {cpf[:3]}***{cpf[-2:]} ({len(ucs_do_cpf)} UCs)")
-
-                    for uc in ucs_do_cpf:
-                        try:
-                            stats["ucs_processadas"] += 1
-
-                            # Sincroniza dados da UC
-                            uc_atualizada = await self._sincronizar_uc(svc, uc)
-                            if uc_atualizada:
-                                stats["ucs_atualizadas"] += 1
-
-                            # Sincroniza faturas da UC
-                            faturas_sync = await self._sincronizar_faturas(svc, uc)
-                            stats["faturas_sincronizadas"] += faturas_sync
-
-                            # Sincroniza dados de GD da UC
-                            gd_sync = await self._sincronizar_gd(svc, uc)
-                            stats["gd_sincronizados"] += gd_sync
-
-                        except Exception as e:
-                            error_msg = str(e).lower()
-                            # Se for erro de autenticação, tenta refresh e retry uma vez
-                            if "401" in error_msg or "unauthorized" in error_msg or "token" in error_msg:
-                                logger.warning(f"   🔄 Token expirado durante sync da UC {uc.get('cdc')}, tentando refresh...")
-                                if svc._refresh_token():
-                                    try:
-                                        # Retry após refresh
-                                        uc_atualizada = await self._sincronizar_uc(svc, uc)
-                                        if uc_atualizada:
-                                            stats["ucs_atualizadas"] += 1
-                                        faturas_sync = await self._sincronizar_faturas(svc, uc)
-                                        stats["faturas_sincronizadas"] += faturas_sync
-                                        gd_sync = await self._sincronizar_gd(svc, uc)
-                                        stats["gd_sincronizados"] += gd_sync
-                                        continue  # Sucesso no retry
-                                    except Exception as retry_err:
-                                        logger.warning(f"   ⚠️ Retry falhou para UC {uc.get('cdc')}: {retry_err}")
-
-                            logger.warning(f"   ⚠️ Erro ao sincronizar UC {uc.get('cdc')}: {e}")
-                            stats["erros"] += 1
+        return stats
 
-                except Exception as e:
-                    logger.error(f"   ❌ Erro ao processar CPF {cpf[:3]}***: {e}")
-                    stats["erros"] += 1
+    async def sincronizar_ucs_prioritarias(
+        self,
+        limite: Optional[int] = None,
+        orcamento_segundos: Optional[float] = None
+    ) -> dict:
+        """
+        Sincroniza apenas as UCs mais "devidas" no momento.
+
+        Cada UC recebe uma pontuação (ver sync/prioridade.py) baseada no tempo
+        desde ultima_sincronizacao, vencimento/leitura próximos, faturas sem PDF
+        e extrações pendentes. São processadas as N de maior pontuação; UCs que
+        não começarem dentro do orçamento de tempo ficam para o próximo ciclo.
+
+        Args:
+            limite: Máximo de UCs no ciclo (default: SYNC_PRIORIDADE_UCS_POR_CICLO)
+            orcamento_segundos: Tempo máximo para iniciar UCs (default: SYNC_PRIORIDADE_ORCAMENTO_SEGUNDOS)
+
+        Returns:
+            dict com estatísticas da sincronização
+        """
+        limite = limite if limite is not None else settings.SYNC_PRIORIDADE_UCS_POR_CICLO
+        orcamento = orcamento_segundos if orcamento_segundos is not None else settings.SYNC_PRIORIDADE_ORCAMENTO_SEGUNDOS
+        prazo = time.monotonic() + orcamento
+
+        stats = self._novas_stats()
+        stats["modo"] = "prioridade"
+        stats["ucs_selecionadas"] = 0
+        execucao = metricas_sync.iniciar_execucao("prioridade")
+
+        try:
+            ucs = self._buscar_todos(
+                lambda: self.db.table("unidades_consumidoras").select("*, usuarios!inner(cpf)")
+            )
+
+            # Contexto de faturas recentes (sem trafegar PDFs)
+            desde = (datetime.now(timezone.utc) - timedelta(days=60)).date().isoformat()
+            faturas_recentes = self._buscar_todos(
+                lambda: self.db.table("faturas").select(
+                    "uc_id, data_vencimento, data_leitura, extracao_status"
+                ).gte("data_vencimento", desde)
+            )
+            faturas_sem_pdf = self._buscar_todos(
+                lambda: self.db.table("faturas").select("uc_id").gte(
+                    "data_vencimento", desde
+                ).is_("pdf_base64", "null")
+            )
+            contextos = montar_contextos(faturas_recentes, faturas_sem_pdf)
+
+            # Só entram no ranking UCs cujo CPF tem sessão salva: sem ela a UC
+            # nunca sincroniza e ocuparia o lote de todo ciclo. Sessões expiradas
+            # entram (o refresh é tentado, como na varredura completa)
+            sessoes = await asyncio.to_thread(
+                SessionManager.load_sessions_bulk, list(self._agrupar_ucs_por_cpf(ucs)), True
+            )
+            ucs_com_sessao = [
+                uc for cpf, ucs_do_cpf in self._agrupar_ucs_por_cpf(ucs).items() if cpf in sessoes
+                for uc in ucs_do_cpf
+            ]
+
+            selecionadas = selecionar_ucs_devidas(
+                ucs_com_sessao, contextos, limite, settings.SYNC_PRIORIDADE_INTERVALO_MINIMO_MINUTOS
+            )
+            stats["ucs_selecionadas"] = len(selecionadas)
+
+            if not selecionadas:
+                logger.debug("   ℹ️ Nenhuma UC devida para sincronização neste ciclo")
+            else:
+                logger.info(
+                    f"🔄 Sincronizando {len(selecionadas)} UCs prioritárias de {len(ucs)} "
+                    f"(maior pontuação: {selecionadas[0][0]})"
+                )
+
+            # Agrupa mantendo a ordem de prioridade (CPF da UC mais prioritária primeiro)
+            ucs_por_cpf = self._agrupar_ucs_por_cpf([uc for _, uc in selecionadas])
+
+            await self._executar_varredura(ucs_por_cpf, stats, prazo=prazo, sessoes=sessoes)
 
         except Exception as e:
-            logger.error(f"❌ Erro geral na sincronização: {e}")
+            logger.error(f"❌ Erro geral na sincronização prioritária: {e}")
             stats["erros"] += 1
 
         stats["fim"] = datetime.now(timezone.utc).isoformat()
+        metricas_sync.finalizar_execucao(execucao, stats)
+        if stats["ucs_selecionadas"]:
+            self._log_resumo(stats)
 
+        return stats
+
+    @staticmethod
+    def _novas_stats() -> dict:
+        """Estatísticas zeradas de uma execução de sincronização."""
+        return {
+            "ucs_processadas": 0,
+            "ucs_atualizadas": 0,
+            "faturas_sincronizadas": 0,
+            "gd_sincronizados": 0,
+            "ucs_inalteradas": 0,
+            "faturas_inalteradas": 0,
+            "gd_inalterados": 0,
+            "ucs_adiadas": 0,
+            "pdfs_enfileirados": 0,
+            "erros": 0,
+            "inicio": datetime.now(timezone.utc).isoformat(),
+            "fim": None
+        }
+
+    @staticmethod
+    def _log_resumo(stats: dict):
+        """Loga o resumo de uma execução de sincronização."""
         logger.info(
             f"✅ Sincronização concluída: "
             f"{stats['ucs_processadas']} UCs processadas, "
             f"{stats['ucs_atualizadas']} atualizadas, "
             f"{stats['faturas_sincronizadas']} faturas, "
             f"{stats['gd_sincronizados']} registros GD, "
+            f"{stats['faturas_inalteradas'] + stats['gd_inalterados']} registros inalterados, "
+            f"{stats['ucs_adiadas']} UCs adiadas, "
             f"{stats['erros']} erros"
         )
 
-        return stats
+    def _buscar_todos(self, montar_query, tamanho_pagina: int = 1000) -> list:
+        """
+        Executa um select paginado, contornando o limite de linhas do PostgREST.
+
+        Args:
+            montar_query: Função que retorna a query (sem range) a cada página
+            tamanho_pagina: Linhas por requisição
+
+        Returns:
+            Todas as linhas retornadas
+        """
+        dados = []
+        inicio = 0
+        while True:
+            result = montar_query().range(inicio, inicio + tamanho_pagina - 1).execute()
+            pagina = result.data or []
+            dados.extend(pagina)
+            if len(pagina) < tamanho_pagina:
+                return dados
+            inicio += tamanho_pagina
+
+    @staticmethod
+    def _agrupar_ucs_por_cpf(ucs: list) -> dict:
+        """
+        Agrupa as UCs pelo CPF (limpo) do usuário dono.
+
+        Args:
+            ucs: UCs do banco com o join usuarios(cpf)
+
+        Returns:
+            dict {cpf: [ucs]} preservando a ordem de chegada
+        """
+        ucs_por_cpf = {}
+        for uc in ucs:
+            cpf = (uc.get("usuarios") or {}).get("cpf")
+            if cpf:
+                cpf_limpo = cpf.replace(".", "").replace("-", "")
+                ucs_por_cpf.setdefault(cpf_limpo, []).append(uc)
+        return ucs_por_cpf
+
+    @staticmethod
+    def _circuitos_abertos(stats: dict) -> list:
+        """
+        Retorna as famílias de endpoint usadas pela sincronização com disjuntor
+        aberto (ver energisa/circuit_breaker.py), registrando-as nas stats.
+        """
+        abertos = disjuntores_energisa.abertos(FAMILIAS_SYNC)
+        if abertos:
+            if not stats.get("circuitos_abertos"):
+                logger.warning(f"   ⛔ Circuito aberto na Energisa ({', '.join(abertos)}): adiando UCs restantes")
+            stats["circuitos_abertos"] = sorted(set(stats.get("circuitos_abertos", [])) | set(abertos))
+        return abertos
+
+    def _lock_contexto(self, svc: EnergisaService) -> asyncio.Lock:
+        """
+        Retorna o lock de contexto de UC da sessão Energisa.
 
-    async def _sincronizar_uc(self, svc: EnergisaService, uc: dict) -> bool:
+        listar_faturas e download_pdf trocam a UC ativa via cookies da sessão
+        (NumeroUc, Digito, CodigoEmpresaWeb), então essas chamadas precisam ser
+        serializadas por sessão mesmo quando as UCs são processadas em paralelo.
+        """
+        lock = self._locks_contexto.get(svc)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks_contexto[svc] = lock
+        return lock
+
+    async def _executar_varredura(
+        self,
+        ucs_por_cpf: dict,
+        stats: dict,
+        prazo: Optional[float] = None,
+        diario: Optional[DiarioExecucao] = None,
+        sessoes: Optional[dict] = None
+    ):
+        """
+        Processa os CPFs em paralelo, limitado por SYNC_MAX_CPFS_CONCORRENTES.
+
+        Args:
+            ucs_por_cpf: dict {cpf: [ucs]}
+            stats: Estatísticas da execução (atualizadas in-place)
+            prazo: Instante (time.monotonic) após o qual nenhuma UC nova é iniciada
+            diario: Checkpoint da execução (CPFs/UCs concluídos)
+            sessoes: Sessões já carregadas (ver SessionManager.load_sessions_bulk)
+        """
+        semaforo = asyncio.Semaphore(max(1, settings.SYNC_MAX_CPFS_CONCORRENTES))
+
+        # Uma consulta (por lote) para as sessões de todos os CPFs: aquece o cache do
+        # SessionManager usado pelos serviços e já identifica quem não tem sessão
+        if sessoes is None:
+            sessoes = await asyncio.to_thread(SessionManager.load_sessions_bulk, list(ucs_por_cpf), True)
+
+        async def _processar(cpf: str, ucs_do_cpf: list):
+            async with semaforo:
+                if (prazo is not None and time.monotonic() >= prazo) or self._circuitos_abertos(stats):
+                    stats["ucs_adiadas"] += len(ucs_do_cpf)
+                    return
+                await self._sincronizar_cpf(cpf, ucs_do_cpf, stats, prazo, diario, tem_sessao=cpf in sessoes)
+
+        await asyncio.gather(
+            *(_processar(cpf, ucs_do_cpf) for cpf, ucs_do_cpf in ucs_por_cpf.items()),
+            return_exceptions=True
+        )
+
+    async def _sincronizar_cpf(
+        self,
+        cpf: str,
+        ucs_do_cpf: list,
+        stats: dict,
+        prazo: Optional[float] = None,
+        diario: Optional[DiarioExecucao] = None,
+        tem_sessao: bool = True
+    ):
+        """
+        Sincroniza todas as UCs de um CPF usando uma sessão Energisa exclusiva.
+
+        Args:
+            cpf: CPF limpo do titular
+            ucs_do_cpf: UCs do banco pertencentes ao CPF
+            stats: Estatísticas da execução (atualizadas in-place)
+            prazo: Instante (time.monotonic) após o qual nenhuma UC nova é iniciada
+            diario: Checkpoint da execução (CPFs/UCs concluídos)
+            tem_sessao: False se a pré-carga em lote não achou sessão (pula sem consultar o banco)
+        """
+        cpf_mascarado = f"{cpf[:3]}***{cpf[-2:]}"
+        inicio = time.monotonic()
+        resultados = []
+        # Só marca o CPF como concluído no diário ao terminar (ou pular de propósito);
+        # exceção no meio deixa o CPF pendente para a retomada
+        concluido = False
+        if diario:
+            diario.cpf_iniciado(cpf)
+
+        try:
+            if not tem_sessao:
+                logger.debug(f"   ⏭️ CPF {cpf_mascarado}: sem sessão salva")
+                concluido = True
+                return
+
+            # Cada CPF tem sua própria instância (e requests.Session), então os
+            # cookies de contas diferentes nunca se misturam.
+            # O construtor carrega a sessão ignorando expiração para tentar refresh.
+            if settings.SYNC_CLIENTE_ASYNC:
+                svc = await AsyncEnergisaService.criar(cpf, PRIORIDADE_BACKGROUND)
+            else:
+                svc = await asyncio.to_thread(EnergisaService, cpf, PRIORIDADE_BACKGROUND)
+            if not svc.cookies:
+                logger.debug(f"   ⏭️ CPF {cpf_mascarado}: sem sessão salva")
+                concluido = True
+                return
+
+            # Faz refresh token ANTES de começar a sincronizar
+            logger.info(f"   🔄 Renovando token para CPF {cpf_mascarado}...")
+            with metricas_sync.medir("refresh_token"):
+                renovado = await chamar_energisa(svc, "_refresh_token")
+            if not renovado:
+                logger.warning(f"   ⏭️ CPF {cpf_mascarado}: falha no refresh, pulando")
+                self._registrar_tentativas([(uc, False) for uc in ucs_do_cpf])
+                concluido = True
+                return
+
+            # Verifica se está autenticado após refresh
+            if not svc.is_authenticated():
+                logger.debug(f"   ⏭️ CPF {cpf_mascarado}: não autenticado após refresh")
+                self._registrar_tentativas([(uc, False) for uc in ucs_do_cpf])
+                concluido = True
+                return
+
+            logger.info(f"   👤 Processando CPF {cpf_mascarado} ({len(ucs_do_cpf)} UCs)")
+
+            semaforo_ucs = asyncio.Semaphore(max(1, settings.SYNC_MAX_UCS_POR_CPF))
+
+            async def _processar(uc: dict):
+                async with semaforo_ucs:
+                    if prazo is not None and time.monotonic() >= prazo:
+                        stats["ucs_adiadas"] += 1
+                        return None
+                    # Energisa degradada: adia a UC em vez de esperar timeouts/5xx
+                    if self._circuitos_abertos(stats):
+                        stats["ucs_adiadas"] += 1
+                        return None
+                    sucesso = await self._sincronizar_uc_completa(svc, uc, stats)
+                    if diario:
+                        diario.uc_concluida(uc.get("id"))
+                    return sucesso
+
+            sincronizadas_antes = [uc.get("ultima_sincronizacao") for uc in ucs_do_cpf]
+            resultados = await asyncio.gather(
+                *(_processar(uc) for uc in ucs_do_cpf),
+                return_exceptions=True
+            )
+
+            # UC só conta como sucesso se ultima_sincronizacao avançou (info da UC obtida)
+            self._registrar_tentativas([
+                (uc, r is True and uc.get("ultima_sincronizacao") != antes)
+                for uc, r, antes in zip(ucs_do_cpf, resultados, sincronizadas_antes)
+                if r is not None
+            ])
+            # UCs adiadas (prazo/circuito aberto) ficam para a retomada
+            concluido = all(r is not None for r in resultados)
+
+        except Exception as e:
+            logger.error(f"   ❌ Erro ao processar CPF {cpf[:3]}***: {e}")
+            metricas_sync.registrar_erro("cpf", e)
+            stats["erros"] += 1
+
+        finally:
+            # CPFs sem sessão/refresh também contam como concluídos nesta execução
+            if diario and concluido:
+                diario.cpf_concluido(cpf)
+
+        metricas_sync.registrar_cpf(
+            cpf,
+            ucs=sum(1 for r in resultados if r is not None),
+            duracao_ms=(time.monotonic() - inicio) * 1000,
+            erros=sum(1 for r in resultados if r is False or isinstance(r, Exception))
+        )
+
+    def _registrar_tentativas(self, tentativas: list):
+        """
+        Grava sync_ultima_tentativa/sync_falhas_consecutivas das UCs tentadas
+        (usados na pontuação e no backoff do scheduler, ver sync/prioridade.py).
+
+        Sucessos só são gravados quando zeram falhas anteriores; falhas são
+        agrupadas pelo novo contador (um update por valor).
+
+        Args:
+            tentativas: Lista de (uc, sucesso)
+        """
+        agora = datetime.now(timezone.utc).isoformat()
+        ids_por_falhas = {}
+        for uc, sucesso in tentativas:
+            anteriores = uc.get("sync_falhas_consecutivas") or 0
+            if sucesso and not anteriores:
+                continue
+            falhas = 0 if sucesso else anteriores + 1
+            ids_por_falhas.setdefault(falhas, []).append(uc.get("id"))
+            uc["sync_falhas_consecutivas"] = falhas
+            uc["sync_ultima_tentativa"] = agora
+
+        for falhas, ids in ids_por_falhas.items():
+            try:
+                with metricas_sync.medir("db_escrita"):
+                    self.db.table("unidades_consumidoras").update({
+                        "sync_ultima_tentativa": agora,
+                        "sync_falhas_consecutivas": falhas
+                    }).in_("id", ids).execute()
+            except Exception as e:
+                logger.warning(f"   ⚠️ Erro ao registrar tentativas de sincronização: {e}")
+
+    async def _sincronizar_uc_completa(self, svc: EnergisaService, uc: dict, stats: dict) -> bool:
+        """
+        Sincroniza dados cadastrais, faturas e GD de uma UC.
+
+        Em caso de erro de autenticação, renova o token e tenta novamente uma vez.
+
+        Args:
+            svc: Serviço Energisa autenticado do CPF
+            uc: Dados da UC do banco
+            stats: Estatísticas da execução (atualizadas in-place)
+
+        Returns:
+            True se a UC foi sincronizada sem erro
+        """
+        try:
+            stats["ucs_processadas"] += 1
+            await self._sincronizar_etapas_uc(svc, uc, stats)
+            return True
+
+        except Exception as e:
+            error_msg = str(e).lower()
+            # Se for erro de autenticação, tenta refresh e retry uma vez
+            if "401" in error_msg or "unauthorized" in error_msg or "token" in error_msg:
+                logger.warning(f"   🔄 Token expirado durante sync da UC {uc.get('cdc')}, tentando refresh...")
+                with metricas_sync.medir("refresh_token"):
+                    renovado = await chamar_energisa(svc, "_refresh_token")
+                if renovado:
+                    try:
+                        # Retry após refresh
+                        await self._sincronizar_etapas_uc(svc, uc, stats)
+                        return True  # Sucesso no retry
+                    except Exception as retry_err:
+                        logger.warning(f"   ⚠️ Retry falhou para UC {uc.get('cdc')}: {retry_err}")
+
+            logger.warning(f"   ⚠️ Erro ao sincronizar UC {uc.get('cdc')}: {e}")
+            metricas_sync.registrar_erro("uc", e)
+            stats["erros"] += 1
+            return False
+
+    async def _sincronizar_etapas_uc(self, svc: EnergisaService, uc: dict, stats: dict):
+        """Executa as etapas de sincronização de uma UC (info, faturas e GD)."""
+        # Sincroniza dados da UC
+        uc_atualizada = await self._sincronizar_uc(svc, uc, stats)
+        if uc_atualizada:
+            stats["ucs_atualizadas"] += 1
+
+        # Sincroniza faturas da UC
+        faturas_sync = await self._sincronizar_faturas(svc, uc, stats)
+        stats["faturas_sincronizadas"] += faturas_sync
+
+        # Sincroniza dados de GD da UC
+        gd_sync = await self._sincronizar_gd(svc, uc, stats)
+        stats["gd_sincronizados"] += gd_sync
+
+    async def _sincronizar_uc(
+        self,
+        svc: EnergisaService,
+        uc: dict,
+        stats: Optional[dict] = None
+    ) -> bool:
         """
         Sincroniza informações de uma UC com a Energisa.
 
+        Se o hash das informações for igual ao da última sincronização, apenas
+        ultima_sincronizacao é atualizada. Caso contrário, os campos mapeados são
+        comparados com a linha já carregada (select * da varredura) e só as
+        colunas alteradas são enviadas.
+
         Args:
             svc: Serviço Energisa autenticado
             uc: Dados da UC do banco
+            stats: Estatísticas da execução (conta UCs inalteradas)
 
         Returns:
             True se houve atualização
@@ -217,7 +647,9 @@ class SyncService:
                 "codigoEmpresaWeb": empresa
             }
 
-            info = await asyncio.to_thread(svc.get_uc_info, uc_data)
+            # max_age=0: a sincronização sempre consulta o portal (e alimenta o cache das telas)
+            with metricas_sync.medir("get_uc_info"):
+                info = await chamar_energisa(svc, "get_uc_info", uc_data, max_age=0)
 
             if not info or info.get("errored"):
                 logger.warning(f"      ⚠️ Não foi possível obter info da UC {cdc}")
@@ -228,10 +660,22 @@ class SyncService:
             if not infos:
                 return False
 
-            # Prepara dados para atualização
-            update_data = {
-                "ultima_sincronizacao": datetime.now(timezone.utc).isoformat()
-            }
+            agora = datetime.now(timezone.utc).isoformat()
+            hash_info = calcular_hash_conteudo(infos)
+
+            # Nada mudou desde a última sincronização: só registra o horário
+            if hash_info == uc.get("hash_info_api"):
+                with metricas_sync.medir("db_escrita"):
+                    self.db.table("unidades_consumidoras").update({
+                        "ultima_sincronizacao": agora
+                    }).eq("id", uc_id).execute()
+                uc["ultima_sincronizacao"] = agora
+                _contar(stats, "ucs_inalteradas")
+                logger.debug(f"      ⏭️ UC {cdc} sem alterações")
+                return False
+
+            # Campos da API mapeados para colunas do banco
+            update_data = {}
 
             # Mapeia campos da API para o banco
             field_mapping = {
@@ -273,25 +717,75 @@ class SyncService:
             if "geracaoDistribuida" in infos:
                 update_data["is_geradora"] = infos["geracaoDistribuida"] is not None
 
-            # Atualiza no banco
-            self.db.table("unidades_consumidoras").update(
-                update_data
-            ).eq("id", uc_id).execute()
+            # Envia só as colunas que mudaram em relação à linha carregada
+            alteracoes = self._colunas_alteradas(uc, update_data)
+            update_data = {
+                **alteracoes,
+                "ultima_sincronizacao": agora,
+                "hash_info_api": hash_info
+            }
 
-            logger.debug(f"      ✅ UC {cdc} atualizada")
+            with metricas_sync.medir("db_escrita"):
+                self.db.table("unidades_consumidoras").update(
+                    update_data
+                ).eq("id", uc_id).execute()
+            uc.update(update_data)
+
+            if not alteracoes:
+                # Payload mudou em campos que não gravamos: só hash e horário
+                _contar(stats, "ucs_inalteradas")
+                logger.debug(f"      ⏭️ UC {cdc} sem alterações nas colunas")
+                return False
+
+            logger.debug(f"      ✅ UC {cdc} atualizada ({', '.join(sorted(alteracoes))})")
             return True
 
         except Exception as e:
             logger.error(f"      ❌ Erro ao sincronizar UC {cdc}: {e}")
             return False
 
-    async def _sincronizar_faturas(self, svc: EnergisaService, uc: dict) -> int:
+    @staticmethod
+    def _colunas_alteradas(uc: dict, dados: dict) -> dict:
+        """
+        Filtra de `dados` as colunas cujo valor difere do já salvo na UC.
+
+        Valores são comparados também como texto, pois o banco pode devolver
+        como string o que a API envia como número (ex: cep, numero_imovel).
+
+        Args:
+            uc: Linha da UC carregada do banco
+            dados: Colunas candidatas à atualização
+
+        Returns:
+            dict apenas com as colunas alteradas
+        """
+        alteradas = {}
+        for coluna, valor in dados.items():
+            atual = uc.get(coluna)
+            if atual == valor:
+                continue
+            if atual is not None and valor is not None and not isinstance(valor, bool) \
+                    and str(atual) == str(valor):
+                continue
+            alteradas[coluna] = valor
+        return alteradas
+
+    async def _sincronizar_faturas(
+        self,
+        svc: EnergisaService,
+        uc: dict,
+        stats: Optional[dict] = None
+    ) -> int:
         """
         Sincroniza faturas de uma UC com a Energisa.
 
+        Faturas cujo hash do conteúdo não mudou desde a última sincronização
+        não são regravadas.
+
         Args:
             svc: Serviço Energisa autenticado
             uc: Dados da UC do banco
+            stats: Estatísticas da execução (conta faturas inalteradas)
 
         Returns:
             Número de faturas sincronizadas
@@ -311,7 +805,9 @@ class SyncService:
             }
 
             # Executa em thread para não bloquear o event loop
-            faturas = await asyncio.to_thread(svc.listar_faturas, uc_data)
+            async with self._lock_contexto(svc):
+                with metricas_sync.medir("listar_faturas"):
+                    faturas = await chamar_energisa(svc, "listar_faturas", uc_data)
 
             if not faturas:
                 logger.debug(f"      ℹ️ Nenhuma fatura encontrada para UC {cdc}")
@@ -327,7 +823,21 @@ class SyncService:
                     f"faturas disponíveis (limite: {settings.SYNC_MAX_FATURAS_POR_UC})"
                 )
 
-            faturas_salvas = 0
+            # Uma única consulta leve com as referências que já têm PDF
+            try:
+                with metricas_sync.medir("db_leitura"):
+                    faturas_com_pdf = self._carregar_faturas_com_pdf(uc_id)
+            except Exception as e:
+                # Sem o mapa não dá para saber o que falta; evita rebaixar PDFs nesta rodada
+                logger.warning(f"      ⚠️ Erro ao verificar PDFs existentes da UC {cdc}: {e}")
+                faturas_com_pdf = None
+
+            with metricas_sync.medir("db_leitura"):
+                hashes_existentes = self._carregar_hashes("faturas", uc_id)
+
+            registros = []
+            inalteradas = set()
+            pendentes_pdf = []  # (fatura_api, mes, ano) das faturas ainda sem PDF
 
             for fatura_api in faturas:
                 try:
@@ -338,6 +848,17 @@ class SyncService:
                     if not mes or not ano:
                         continue
 
+                    # Verifica (em memória) se já tem PDF baixado
+                    has_pdf = faturas_com_pdf is None or (int(mes), int(ano)) in faturas_com_pdf
+                    if not has_pdf and fatura_api.get("numeroFatura"):
+                        pendentes_pdf.append((fatura_api, mes, ano))
+
+                    # Conteúdo igual ao já salvo: não regrava
+                    hash_fatura = calcular_hash_conteudo(fatura_api)
+                    if hashes_existentes.get((int(mes), int(ano))) == hash_fatura:
+                        inalteradas.add((uc_id, mes, ano))
+                        continue
+
                     fatura_data = {
                         "uc_id": uc_id,
                         "numero_fatura": fatura_api.get("numeroFatura"),
@@ -363,72 +884,125 @@ class SyncService:
                         "qr_code_pix_image": fatura_api.get("qrCodePixImage64"),
                         "codigo_barras": fatura_api.get("codigoBarras"),
                         "dados_api": fatura_api,
+                        "hash_dados_api": hash_fatura,
                         "sincronizado_em": datetime.now(timezone.utc).isoformat()
                     }
 
                     # Remove valores None
                     fatura_data = {k: v for k, v in fatura_data.items() if v is not None}
 
-                    # Verifica se já tem PDF baixado
-                    existing_fatura = self.db.table("faturas").select(
-                        "id, pdf_base64"
-                    ).eq("uc_id", uc_id).eq(
-                        "mes_referencia", mes
-                    ).eq("ano_referencia", ano).execute()
-
-                    has_pdf = existing_fatura.data and existing_fatura.data[0].get("pdf_base64")
-
-                    # Upsert (insert ou update)
-                    self.db.table("faturas").upsert(
-                        fatura_data,
-                        on_conflict="uc_id,mes_referencia,ano_referencia"
-                    ).execute()
-
-                    faturas_salvas += 1
-
-                    # Baixa PDF se ainda não tem
-                    if not has_pdf and fatura_api.get("numeroFatura"):
-                        try:
-                            pdf_request_data = {
-                                "ano": ano,
-                                "mes": mes,
-                                "numeroFatura": fatura_api.get("numeroFatura")
-                            }
-                            pdf_bytes = await asyncio.to_thread(
-                                svc.download_pdf, uc_data, pdf_request_data
-                            )
-
-                            if pdf_bytes:
-                                pdf_base64_str = base64.b64encode(pdf_bytes).decode('utf-8')
-
-                                self.db.table("faturas").update({
-                                    "pdf_base64": pdf_base64_str,
-                                    "pdf_baixado_em": datetime.now(timezone.utc).isoformat()
-                                }).eq("uc_id", uc_id).eq(
-                                    "mes_referencia", mes
-                                ).eq("ano_referencia", ano).execute()
-
-                                logger.debug(f"      📄 PDF baixado para fatura {mes:02d}/{ano}")
-                        except Exception as pdf_err:
-                            logger.warning(f"      ⚠️ Erro ao baixar PDF {mes:02d}/{ano}: {pdf_err}")
+                    registros.append(fatura_data)
 
                 except Exception as e:
-                    logger.warning(f"      ⚠️ Erro ao salvar fatura: {e}")
+                    logger.warning(f"      ⚠️ Erro ao preparar fatura: {e}")
 
-            logger.debug(f"      ✅ {faturas_salvas} faturas sincronizadas para UC {cdc}")
+            # Upsert (insert ou update) de todas as faturas da UC de uma vez
+            with metricas_sync.medir("db_escrita"):
+                resultado = upsert_em_lote(
+                    self.db, "faturas", registros,
+                    on_conflict="uc_id,mes_referencia,ano_referencia"
+                )
+            faturas_salvas = resultado["salvos"]
+            chaves_no_banco = set(resultado["chaves_salvas"]) | inalteradas
+            _contar(stats, "faturas_inalteradas", len(inalteradas))
+
+            # PDFs das faturas no banco que ainda não têm vão para o pipeline de download
+            for fatura_api, mes, ano in pendentes_pdf:
+                if (uc_id, mes, ano) not in chaves_no_banco:
+                    continue
+
+                enfileirado = self.pipeline_pdf.enfileirar(ItemPdf(
+                    uc_id=uc_id,
+                    cdc=cdc,
+                    uc_data=uc_data,
+                    mes=mes,
+                    ano=ano,
+                    numero_fatura=fatura_api.get("numeroFatura"),
+                    svc=svc,
+                    lock=self._lock_contexto(svc)
+                ))
+                if enfileirado:
+                    _contar(stats, "pdfs_enfileirados")
+
+            logger.debug(
+                f"      ✅ {faturas_salvas} faturas sincronizadas para UC {cdc} "
+                f"({len(inalteradas)} inalteradas)"
+            )
             return faturas_salvas
 
         except Exception as e:
             logger.error(f"      ❌ Erro ao sincronizar faturas da UC {cdc}: {e}")
             return 0
 
-    async def _sincronizar_gd(self, svc: EnergisaService, uc: dict) -> int:
+    def _carregar_faturas_com_pdf(self, uc_id: int) -> set:
+        """
+        Retorna as referências das faturas da UC que já possuem PDF salvo.
+
+        Filtra por pdf_base64 no banco e projeta apenas mês/ano, sem trafegar
+        o conteúdo do PDF.
+
+        Args:
+            uc_id: ID da UC
+
+        Returns:
+            set de tuplas (mes_referencia, ano_referencia)
+        """
+        result = self.db.table("faturas").select(
+            "mes_referencia, ano_referencia"
+        ).eq("uc_id", uc_id).not_.is_("pdf_base64", "null").execute()
+
+        return {
+            (int(f["mes_referencia"]), int(f["ano_referencia"]))
+            for f in (result.data or [])
+        }
+
+    def _carregar_hashes(self, tabela: str, uc_id: int) -> dict:
+        """
+        Retorna os hashes de conteúdo já salvos para as referências da UC.
+
+        Args:
+            tabela: "faturas" ou "historico_gd"
+            uc_id: ID da UC
+
+        Returns:
+            dict {(mes_referencia, ano_referencia): hash_dados_api}
+        """
+        try:
+            result = self.db.table(tabela).select(
+                "mes_referencia, ano_referencia, hash_dados_api"
+            ).eq("uc_id", uc_id).not_.is_("hash_dados_api", "null").execute()
+        except Exception as e:
+            # Sem hashes, tudo é regravado (comportamento anterior)
+            logger.warning(f"      ⚠️ Erro ao carregar hashes de {tabela} da UC {uc_id}: {e}")
+            return {}
+
+        return {
+            (int(r["mes_referencia"]), int(r["ano_referencia"])): r["hash_dados_api"]
+            for r in (result.data or [])
+        }
+
+    async def _sincronizar_gd(
+        self,
+        svc: EnergisaService,
+        uc: dict,
+        stats: Optional[dict] = None,
+        forcar_completo: bool = False
+    ) -> int:
         """
         Sincroniza histórico de Geração Distribuída de uma UC.
 
+        Incremental por watermark (gd_watermark_referencia / gd_watermark_modificacao):
+        nos ciclos normais pede só os últimos SYNC_GD_PERIODO_INCREMENTAL meses e
+        grava apenas meses novos ou com dataModificacaoRegistro posterior ao
+        watermark. O histórico completo (13 meses) é puxado na primeira vez e a
+        cada SYNC_GD_INTERVALO_COMPLETO_HORAS. Meses cujo hash do conteúdo não
+        mudou desde a última sincronização não são regravados.
+
         Args:
             svc: Serviço Energisa autenticado
             uc: Dados da UC do banco
+            stats: Estatísticas da execução (conta registros inalterados)
+            forcar_completo: Ignora o watermark e puxa os 13 meses
 
         Returns:
             Número de registros de GD sincronizados
@@ -447,8 +1021,12 @@ class SyncService:
                 "codigoEmpresaWeb": empresa
             }
 
-            # Busca detalhes de GD (histórico de 13 meses) - em thread para não bloquear
-            gd_data = await asyncio.to_thread(svc.get_gd_details, uc_data)
+            completo = forcar_completo or self._gd_precisa_historico_completo(uc)
+            periodo = 13 if completo else settings.SYNC_GD_PERIODO_INCREMENTAL
+
+            # Busca detalhes de GD (13 meses ou só os recentes) - em thread para não bloquear
+            with metricas_sync.medir("get_gd_details"):
+                gd_data = await chamar_energisa(svc, "get_gd_details", uc_data, periodo, max_age=0)
 
             if not gd_data:
                 logger.debug(f"      ℹ️ Nenhum dado de GD para UC {cdc}")
@@ -471,9 +1049,25 @@ class SyncService:
                 logger.debug(f"      ℹ️ Histórico GD vazio para UC {cdc}")
                 return 0
 
-            registros_salvos = 0
-
-            for item in historico:
+            # Ciclo incremental: só meses novos ou modificados desde o watermark
+            referencia_wm, modificacao_wm = self._gd_watermark(uc)
+            if completo:
+                candidatos = historico
+            else:
+                candidatos = [
+                    item for item in historico
+                    if self._gd_item_novo_ou_modificado(item, referencia_wm, modificacao_wm)
+                ]
+
+            hashes_existentes = {}
+            if candidatos:
+                with metricas_sync.medir("db_leitura"):
+                    hashes_existentes = self._carregar_hashes("historico_gd", uc_id)
+
+            registros = []
+            inalterados = len(historico) - len(candidatos)
+
+            for item in candidatos:
                 try:
                     mes = item.get("mesReferencia") or item.get("mes")
                     ano = item.get("anoReferencia") or item.get("ano")
@@ -481,6 +1075,12 @@ class SyncService:
                     if not mes or not ano:
                         continue
 
+                    # Conteúdo igual ao já salvo: não regrava
+                    hash_item = calcular_hash_conteudo(item)
+                    if hashes_existentes.get((int(mes), int(ano))) == hash_item:
+                        inalterados += 1
+                        continue
+
                     gd_record = {
                         "uc_id": uc_id,
                         "mes_referencia": int(mes),
@@ -497,6 +1097,7 @@ class SyncService:
                         "discriminacao_energia": item.get("discriminacaoEnergiaInjetadas"),
                         "chave_primaria": item.get("chavePrimaria"),
                         "dados_api": item,
+                        "hash_dados_api": hash_item,
                         "sincronizado_em": datetime.now(timezone.utc).isoformat()
                     }
 
@@ -508,16 +1109,23 @@ class SyncService:
                     # Remove valores None
                     gd_record = {k: v for k, v in gd_record.items() if v is not None}
 
-                    # Upsert (insert ou update)
-                    self.db.table("historico_gd").upsert(
-                        gd_record,
-                        on_conflict="uc_id,mes_referencia,ano_referencia"
-                    ).execute()
-
-                    registros_salvos += 1
+                    registros.append(gd_record)
 
                 except Exception as e:
-                    logger.warning(f"      ⚠️ Erro ao salvar registro GD: {e}")
+                    logger.warning(f"      ⚠️ Erro ao preparar registro GD: {e}")
+
+            # Upsert (insert ou update) de todo o histórico da UC de uma vez
+            with metricas_sync.medir("db_escrita"):
+                resultado = upsert_em_lote(
+                    self.db, "historico_gd", registros,
+                    on_conflict="uc_id,mes_referencia,ano_referencia"
+                )
+            registros_salvos = resultado["salvos"]
+            _contar(stats, "gd_inalterados", inalterados)
+
+            # Só avança o watermark se tudo foi gravado (senão o mês é repetido no próximo ciclo)
+            if not resultado["falhas"]:
+                self._avancar_gd_watermark(uc, historico, completo)
 
             # Atualiza saldo acumulado na UC se disponível
             if registros_salvos > 0 and historico:
@@ -556,13 +1164,112 @@ class SyncService:
                 except Exception as e:
                     logger.warning(f"      ⚠️ Erro ao atualizar saldo/avulso UC: {e}")
 
-            logger.debug(f"      ✅ {registros_salvos} registros GD sincronizados para UC {cdc}")
+            logger.debug(
+                f"      ✅ {registros_salvos} registros GD sincronizados para UC {cdc} "
+                f"({inalterados} inalterados)"
+            )
             return registros_salvos
 
         except Exception as e:
             logger.error(f"      ❌ Erro ao sincronizar GD da UC {cdc}: {e}")
             return 0
 
+    @staticmethod
+    def _gd_referencia(item: dict) -> Optional[tuple]:
+        """(ano, mes) de referência de um item do histórico GD."""
+        mes = item.get("mesReferencia") or item.get("mes")
+        ano = item.get("anoReferencia") or item.get("ano")
+        try:
+            return (int(ano), int(mes)) if mes and ano else None
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _gd_watermark(uc: dict) -> tuple:
+        """
+        Watermark de GD salvo na UC.
+
+        Returns:
+            ((ano, mes) ou None, datetime da última modificação ou None)
+        """
+        referencia = None
+        valor = uc.get("gd_watermark_referencia")
+        if valor:
+            try:
+                ano, mes = str(valor)[:7].split("-")
+                referencia = (int(ano), int(mes))
+            except ValueError:
+                pass
+        return referencia, parse_data_hora(uc.get("gd_watermark_modificacao"))
+
+    @staticmethod
+    def _gd_precisa_historico_completo(uc: dict) -> bool:
+        """Sem watermark ou com o último pull completo mais antigo que o intervalo."""
+        if not uc.get("gd_watermark_referencia"):
+            return True
+        ultimo = parse_data_hora(uc.get("gd_historico_completo_em"))
+        if ultimo is None:
+            return True
+        intervalo = timedelta(hours=settings.SYNC_GD_INTERVALO_COMPLETO_HORAS)
+        return datetime.now(timezone.utc) - ultimo >= intervalo
+
+    def _gd_item_novo_ou_modificado(
+        self,
+        item: dict,
+        referencia_wm: Optional[tuple],
+        modificacao_wm: Optional[datetime]
+    ) -> bool:
+        """
+        Indica se o mês precisa ser gravado: referência posterior ao watermark,
+        modificação posterior à do watermark ou sem data de modificação (mês
+        ainda aberto; o hash decide se regrava).
+        """
+        referencia = self._gd_referencia(item)
+        if referencia is None:
+            return False
+        if referencia_wm is None or referencia > referencia_wm:
+            return True
+
+        modificacao = parse_data_hora(item.get("dataModificacaoRegistro"))
+        if modificacao is None:
+            return referencia == referencia_wm
+        return modificacao_wm is None or modificacao > modificacao_wm
+
+    def _avancar_gd_watermark(self, uc: dict, historico: list, completo: bool):
+        """
+        Grava na UC o watermark de GD (maior referência e maior modificação vistas)
+        e, em pull completo, o horário dele. Só escreve se algo mudou.
+        """
+        referencia_wm, modificacao_wm = self._gd_watermark(uc)
+
+        referencias = [r for r in map(self._gd_referencia, historico) if r]
+        modificacoes = [
+            m for m in (parse_data_hora(i.get("dataModificacaoRegistro")) for i in historico) if m
+        ]
+        if not referencias:
+            return
+
+        referencia = max(referencias + ([referencia_wm] if referencia_wm else []))
+        modificacao = max(modificacoes + ([modificacao_wm] if modificacao_wm else []), default=None)
+
+        dados = {}
+        if referencia != referencia_wm:
+            dados["gd_watermark_referencia"] = f"{referencia[0]:04d}-{referencia[1]:02d}-01"
+        if modificacao is not None and modificacao != modificacao_wm:
+            dados["gd_watermark_modificacao"] = modificacao.isoformat()
+        if completo:
+            dados["gd_historico_completo_em"] = datetime.now(timezone.utc).isoformat()
+
+        if not dados:
+            return
+
+        try:
+            with metricas_sync.medir("db_escrita"):
+                self.db.table("unidades_consumidoras").update(dados).eq("id", uc.get("id")).execute()
+            uc.update(dados)
+        except Exception as e:
+            logger.warning(f"      ⚠️ Erro ao gravar watermark de GD da UC {uc.get('cdc')}: {e}")
+
     async def _criar_beneficiario_avulso_automatico(
         self,
         uc_id: int,
@@ -705,7 +1412,7 @@ class SyncService:
             for uc in ucs:
                 stats["ucs_processadas"] += 1
                 try:
-                    gd_sync = await self._sincronizar_gd(svc, uc)
+                    gd_sync = await self._sincronizar_gd(svc, uc, forcar_completo=True)
                     stats["gd_sincronizados"] += gd_sync
                 except Exception as e:
                     logger.warning(f"   ⚠️ Erro ao sincronizar GD da UC {uc.get('cdc')}: {e}")
@@ -768,7 +1475,7 @@ class SyncService:
             # Sincroniza
             uc_atualizada = await self._sincronizar_uc(svc, uc)
             faturas_sync = await self._sincronizar_faturas(svc, uc)
-            gd_sync = await self._sincronizar_gd(svc, uc)
+            gd_sync = await self._sincronizar_gd(svc, uc, forcar_completo=True)
 
             return {
                 "success": True,
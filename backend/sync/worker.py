@@ -0,0 +1,75 @@
+"""
+Sync Worker - Processo dedicado à sincronização com a Energisa
+Roda SyncScheduler/SyncService fora da API, para que a latência das rotas
+não dependa da carga da sincronização
+
+Uso:
+    python -m backend.sync.worker
+
+Na API, defina SYNC_SCHEDULER_NA_API=false para não iniciar o scheduler lá.
+"""
+
+import asyncio
+import logging
+import signal
+
+from backend.config import settings
+from backend.sync.heartbeat import publicar_heartbeat
+
+logger = logging.getLogger(__name__)
+
+
+async def executar_worker():
+    """Inicia o scheduler e publica heartbeat até receber SIGTERM/SIGINT."""
+    from backend.sync.scheduler import sync_scheduler
+    from backend.sync.service import sync_service
+    from backend.sync.metrics import metricas_sync
+    from backend.energisa.rate_limiter import energisa_rate_limiter
+    from backend.energisa.sessao_http import fechar_transporte_compartilhado
+
+    def _metricas() -> dict:
+        return {**metricas_sync.get_metricas(), "rate_limiter": energisa_rate_limiter.get_status()}
+
+    parar = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sinal, parar.set)
+        except NotImplementedError:
+            # Windows: sem add_signal_handler, Ctrl+C interrompe via KeyboardInterrupt
+            pass
+
+    logger.info(f"Iniciando worker de sincronização ({settings.APP_NAME} v{settings.APP_VERSION})")
+    sync_scheduler.start()
+
+    dono = sync_scheduler.get_status().get("lease_dono")
+    intervalo = settings.SYNC_WORKER_HEARTBEAT_SEGUNDOS
+
+    try:
+        while not parar.is_set():
+            await asyncio.to_thread(
+                publicar_heartbeat,
+                sync_service.db, dono, sync_scheduler.get_status(), _metricas()
+            )
+            try:
+                await asyncio.wait_for(parar.wait(), timeout=intervalo)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        logger.info("Finalizando worker de sincronização...")
+        sync_scheduler.stop()
+        await sync_service.pipeline_pdf.parar()
+        await fechar_transporte_compartilhado()
+        publicar_heartbeat(
+            sync_service.db, dono, sync_scheduler.get_status(), _metricas(),
+            parado=True
+        )
+        logger.info("🛑 Worker de sincronização parado")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.DEBUG if settings.DEBUG else logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    )
+    asyncio.run(executar_worker())
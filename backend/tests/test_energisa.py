@@ -0,0 +1,446 @@
+"""
+Testes do módulo Energisa (gateway do portal)
+"""
+
+import asyncio
+import time
+
+
+class TestCircuitoEnergisa:
+    """Testes do circuit breaker nas sessões HTTP da Energisa"""
+
+    def test_cancelamento_devolve_teste_meio_aberto(self, monkeypatch):
+        """Task cancelada no meio-aberto não pode deixar o teste reservado"""
+        from backend.energisa import sessao_http
+        from backend.energisa.circuit_breaker import disjuntores_energisa, ABERTO
+
+        disjuntor = disjuntores_energisa.obter("gd")
+        disjuntor.estado = ABERTO
+        disjuntor._aberto_em = time.monotonic() - disjuntor.tempo_aberto - 1
+
+        async def _espera_longa(prioridade):
+            await asyncio.sleep(30)
+
+        monkeypatch.setattr(sessao_http.energisa_rate_limiter, "adquirir_async", _espera_longa)
+
+        async def _cenario():
+            sessao = sessao_http.SessaoAsyncEnergisa()
+            tarefa = asyncio.create_task(
+                sessao.get("https://servicos.energisa.com.br/api/clientes/gd/info")
+            )
+            await asyncio.sleep(0.05)
+            tarefa.cancel()
+            try:
+                await tarefa
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(_cenario())
+
+        try:
+            # O próximo teste do meio-aberto precisa ser liberado
+            assert disjuntor.permitir() is True
+        finally:
+            disjuntor.registrar(True)
+
+    def test_abre_com_taxa_de_erro_na_janela(self):
+        """Abre só com o mínimo de requisições e a taxa de erro atingida"""
+        from backend.energisa.circuit_breaker import CircuitBreaker, FECHADO, ABERTO
+
+        disjuntor = CircuitBreaker("teste", limite_taxa_erro=0.5, minimo_requisicoes=4,
+                                   janela_segundos=60, tempo_aberto=60)
+        for sucesso in (False, False, True):
+            disjuntor.registrar(sucesso)
+        assert disjuntor.estado == FECHADO
+
+        disjuntor.registrar(True)
+        assert disjuntor.estado == ABERTO
+        assert disjuntor.permitir() is False
+        assert disjuntor.esta_aberto() is True
+
+    def test_meio_aberto_libera_um_teste_por_vez(self):
+        """Após tempo_aberto, uma requisição de teste: sucesso fecha, falha reabre"""
+        from backend.energisa.circuit_breaker import CircuitBreaker, FECHADO, ABERTO, MEIO_ABERTO
+
+        disjuntor = CircuitBreaker("teste", limite_taxa_erro=0.5, minimo_requisicoes=1,
+                                   janela_segundos=60, tempo_aberto=0.05)
+        disjuntor.registrar(False)
+        assert disjuntor.estado == ABERTO
+
+        time.sleep(0.06)
+        assert disjuntor.permitir() is True
+        assert disjuntor.estado == MEIO_ABERTO
+        assert disjuntor.permitir() is False
+
+        disjuntor.registrar(False)
+        assert disjuntor.estado == ABERTO
+        assert disjuntor.permitir() is False
+
+        time.sleep(0.06)
+        assert disjuntor.permitir() is True
+        disjuntor.registrar(True)
+        assert disjuntor.estado == FECHADO
+        assert disjuntor.permitir() is True
+
+    def test_familia_do_endpoint(self):
+        """URLs (inclusive rotas _next) são classificadas pela família do endpoint"""
+        from backend.energisa.circuit_breaker import identificar_familia
+
+        base = "https://servicos.energisa.com.br"
+        assert identificar_familia(f"{base}/api/autenticacao/RefreshToken") == "autenticacao"
+        assert identificar_familia(f"{base}/api/clientes/Gd/GetHistoricoDemonstrativoGd") == "gd"
+        assert identificar_familia(f"{base}/_next/data/abc123/faturas.json?cdc=1") == "faturas"
+        assert identificar_familia(f"{base}/home") == "outros"
+
+
+class TestRateLimiter:
+    """Testes do token bucket com classes de prioridade"""
+
+    def test_interativa_passa_na_frente_do_background(self):
+        """Com o bucket vazio, a interativa que chegou depois é atendida primeiro"""
+        import threading
+        from backend.energisa.rate_limiter import TokenBucket, PRIORIDADE_INTERATIVA, PRIORIDADE_BACKGROUND
+
+        bucket = TokenBucket(taxa_por_segundo=5, rajada=1)
+        assert bucket.adquirir(PRIORIDADE_BACKGROUND) is True
+
+        ordem = []
+
+        def _pedido(prioridade, nome):
+            bucket.adquirir(prioridade)
+            ordem.append(nome)
+
+        background = threading.Thread(target=_pedido, args=(PRIORIDADE_BACKGROUND, "background"))
+        background.start()
+        time.sleep(0.05)
+        interativa = threading.Thread(target=_pedido, args=(PRIORIDADE_INTERATIVA, "interativa"))
+        interativa.start()
+        background.join(5)
+        interativa.join(5)
+
+        assert ordem == ["interativa", "background"]
+        status = bucket.get_status()
+        assert status["atendidas"] == {"interativa": 1, "background": 2}
+        assert status["aguardando"] == {"interativa": 0, "background": 0}
+
+    def test_timeout_sem_token(self):
+        """adquirir com timeout retorna False se o token não chega a tempo"""
+        from backend.energisa.rate_limiter import TokenBucket
+
+        bucket = TokenBucket(taxa_por_segundo=0.01, rajada=2)
+        assert bucket.adquirir() is True
+        assert bucket.adquirir() is True
+        assert bucket.adquirir(timeout=0.05) is False
+
+    def test_async_respeita_prioridade(self):
+        """No event loop a fila por prioridade vale igual"""
+        from backend.energisa.rate_limiter import TokenBucket, PRIORIDADE_INTERATIVA, PRIORIDADE_BACKGROUND
+
+        bucket = TokenBucket(taxa_por_segundo=10, rajada=1)
+        ordem = []
+
+        async def _pedido(prioridade, nome):
+            await bucket.adquirir_async(prioridade)
+            ordem.append(nome)
+
+        async def _cenario():
+            await bucket.adquirir_async(PRIORIDADE_BACKGROUND)
+            background = asyncio.create_task(_pedido(PRIORIDADE_BACKGROUND, "background"))
+            await asyncio.sleep(0.02)
+            await asyncio.gather(background, _pedido(PRIORIDADE_INTERATIVA, "interativa"))
+
+        asyncio.run(_cenario())
+        assert ordem == ["interativa", "background"]
+
+
+class TestLoginsPendentes:
+    """Testes do descarte de logins abandonados no SMS"""
+
+    def test_ttl_expirado_fecha_navegador_na_thread_dona(self, monkeypatch):
+        """Login expirado fecha navegador e Playwright na thread que os criou"""
+        import threading
+        from unittest.mock import MagicMock
+        from backend.energisa import service
+
+        eventos = {}
+        fechado = threading.Event()
+
+        class PlaywrightFalso:
+            def start(self):
+                eventos["dona"] = threading.get_ident()
+                return self
+
+            def stop(self):
+                # Como o Playwright síncrono: só funciona na thread dona
+                if threading.get_ident() != eventos["dona"]:
+                    raise RuntimeError("cannot switch to a different thread")
+                eventos["playwright_parado"] = True
+                fechado.set()
+
+        class EmprestimoFalso:
+            browser = MagicMock()
+
+            def liberar(self, reciclar=False):
+                if threading.get_ident() != eventos["dona"]:
+                    raise RuntimeError("cannot switch to a different thread")
+                eventos["navegador_liberado"] = True
+
+        monkeypatch.setattr(service, "sync_playwright", PlaywrightFalso)
+        monkeypatch.setattr(service.navegador_pool, "obter_navegador", lambda pw, headless: EmprestimoFalso())
+        monkeypatch.setattr(service.SessionManager, "load_session", staticmethod(lambda *a, **k: None))
+        monkeypatch.setattr(service.PENDING_LOGINS, "ttl_segundos", 0.2)
+        monkeypatch.setattr(service.PENDING_LOGINS, "intervalo_limpeza", 0.1)
+
+        resposta = service.EnergisaService("52998224725").start_login("9999")
+        assert resposta["transaction_id"]
+
+        assert fechado.wait(timeout=5), "navegador do login expirado não foi fechado"
+        assert eventos.get("navegador_liberado") is True
+        assert service.PENDING_LOGINS.obter(resposta["transaction_id"]) is None
+
+
+class TestCacheRespostas:
+    """Testes do cache de respostas por UC"""
+
+    def test_erro_http_uc_info_nao_vai_para_cache(self, monkeypatch):
+        """Corpo JSON de erro (não-2xx) chega a quem chamou, mas não fica em cache"""
+        from unittest.mock import MagicMock
+        from backend.energisa import service
+        from backend.energisa.cache_respostas import cache_respostas
+
+        monkeypatch.setattr(service.SessionManager, "load_session", lambda *a, **k: {"utk": "t", "rtk": "r"})
+        svc = service.EnergisaService("00000000191")
+        resposta = MagicMock(status_code=500, text='{"mensagem": "Serviço indisponível"}')
+        resposta.json.return_value = {"mensagem": "Serviço indisponível"}
+        svc.session = MagicMock()
+        svc.session.post.return_value = resposta
+
+        uc = {"codigoEmpresaWeb": 6, "cdc": 4242, "digitoVerificadorCdc": 1}
+        cache_respostas.invalidar(svc.cpf)
+        try:
+            info = svc.get_uc_info(uc)
+            assert info["errored"] is True
+            assert info["status"] == 500
+            assert info["mensagem"] == "Serviço indisponível"
+
+            svc.get_uc_info(uc)
+            assert svc.session.post.call_count == 2
+        finally:
+            cache_respostas.invalidar(svc.cpf)
+
+    def test_ttl_e_max_age(self, monkeypatch):
+        """Resposta fica em cache pelo TTL do endpoint; max_age=0 sempre consulta o portal"""
+        from backend.config import settings
+        from backend.energisa.cache_respostas import CacheRespostasEnergisa, chave_uc
+
+        monkeypatch.setattr(settings, "ENERGISA_CACHE_TTL_UC_INFO", 0.1)
+        cache = CacheRespostasEnergisa(10)
+        chave = chave_uc("00000000191", {"codigoEmpresaWeb": 6, "cdc": 4242}, "uc_info")
+        consultas = []
+
+        def _buscar():
+            consultas.append(1)
+            return {"infos": {"consulta": len(consultas)}}
+
+        assert cache.consultar(chave, _buscar)["infos"]["consulta"] == 1
+        assert cache.consultar(chave, _buscar)["infos"]["consulta"] == 1
+        assert cache.consultar(chave, _buscar, max_age=0)["infos"]["consulta"] == 2
+
+        time.sleep(0.12)
+        assert cache.consultar(chave, _buscar)["infos"]["consulta"] == 3
+        assert cache.get_status()["acertos"] == 1
+
+    def test_copia_lru_e_respostas_nao_cacheaveis(self):
+        """Quem altera a resposta não altera o cache; LRU limita os itens; erro não é gravado"""
+        from backend.energisa.cache_respostas import CacheRespostasEnergisa, AUSENTE
+
+        cache = CacheRespostasEnergisa(2)
+        chaves = [("00000000191", 6, cdc, "gd_info") for cdc in (1, 2, 3)]
+
+        cache.gravar(chaves[0], {"infos": {"saldo": 10}})
+        cache.obter(chaves[0])["infos"]["saldo"] = 0
+        assert cache.obter(chaves[0])["infos"]["saldo"] == 10
+
+        cache.gravar(chaves[1], {"infos": {}})
+        cache.obter(chaves[0])  # chaves[0] passa a ser a mais recente
+        cache.gravar(chaves[2], {"infos": {}})
+        assert cache.obter(chaves[1]) is AUSENTE
+        assert cache.obter(chaves[0]) is not AUSENTE
+        assert cache.get_status()["descartes"] == 1
+
+        cache.limpar()
+        cache.gravar(chaves[0], {"errored": True, "message": "Erro"})
+        cache.gravar(chaves[1], None)
+        assert cache.get_status()["itens"] == 0
+
+    def test_invalidar_por_uc_e_endpoint(self):
+        """invalidar remove só as entradas do CPF/UC/prefixo pedidos"""
+        from backend.energisa.cache_respostas import CacheRespostasEnergisa, AUSENTE
+
+        cache = CacheRespostasEnergisa(10)
+        chaves = [
+            ("00000000191", 6, 1, "gd_info"),
+            ("00000000191", 6, 1, "uc_info"),
+            ("00000000191", 6, 2, "gd_details:13"),
+            ("00000000272", 6, 1, "gd_info"),
+        ]
+        for chave in chaves:
+            cache.gravar(chave, {"infos": {}})
+
+        cache.invalidar("00000000191", prefixo_endpoint="gd_")
+        assert [cache.obter(c) is AUSENTE for c in chaves] == [True, False, True, False]
+
+        cache.invalidar("00000000191", cdc=1)
+        assert cache.obter(chaves[1]) is AUSENTE
+        assert cache.obter(chaves[3]) is not AUSENTE
+
+
+class TestRefreshToken:
+    """Testes do single-flight do refresh token"""
+
+    def test_refresh_sincrono_e_assincrono_renovam_uma_vez(self, monkeypatch):
+        """Cliente síncrono e assíncrono do mesmo CPF dividem uma única renovação no portal"""
+        import threading
+        from backend.energisa import service
+        from backend.energisa.async_service import AsyncEnergisaService
+
+        cpf = "00000000272"
+        antigos = {"utk": "utk-antigo", "rtk": "rtk-antigo"}
+        monkeypatch.setattr(service.SessionManager, "load_session", lambda *a, **k: dict(antigos))
+        monkeypatch.setattr(service, "_ULTIMOS_REFRESH", {})
+
+        renovacoes = []
+        em_andamento = threading.Event()
+
+        def _refresh_portal(svc):
+            renovacoes.append(type(svc).__name__)
+            em_andamento.set()
+            time.sleep(0.3)
+            svc.cookies.update({"utk": "utk-novo", "rtk": "rtk-novo"})
+            return True
+
+        async def _refresh_portal_async(svc):
+            return _refresh_portal(svc)
+
+        monkeypatch.setattr(service.EnergisaService, "_executar_refresh_token", _refresh_portal)
+        monkeypatch.setattr(AsyncEnergisaService, "_executar_refresh_token", _refresh_portal_async)
+
+        sincrono = service.EnergisaService(cpf)
+        resultados = {}
+        thread = threading.Thread(target=lambda: resultados.update(sincrono=sincrono._refresh_token()))
+        thread.start()
+        assert em_andamento.wait(5)
+
+        async def _cenario():
+            assincrono = AsyncEnergisaService(cpf, cookies=dict(antigos))
+            resultados["assincrono"] = await assincrono._refresh_token()
+            return assincrono.cookies
+
+        cookies_assincrono = asyncio.run(_cenario())
+        thread.join(5)
+
+        assert renovacoes == ["EnergisaService"]
+        assert resultados == {"sincrono": True, "assincrono": True}
+        assert cookies_assincrono["rtk"] == "rtk-novo"
+
+
+class TestConsultasGdParalelas:
+    """Testes das consultas de GD em paralelo"""
+
+    def test_workers_nao_compartilham_sessao(self, monkeypatch):
+        """Cada thread do pool usa sua própria requests.Session, com os cookies da original"""
+        import threading
+        from backend.config import settings
+        from backend.energisa import service
+
+        monkeypatch.setattr(service.SessionManager, "load_session", lambda *a, **k: {"utk": "t", "rtk": "r"})
+        monkeypatch.setattr(settings, "ENERGISA_GD_PARALELO", 2)
+        svc = service.EnergisaService("00000000353")
+        svc.session.headers["X-Teste"] = "1"
+
+        sessoes = {}
+        lock = threading.Lock()
+
+        def _consulta(copia, uc_data):
+            time.sleep(0.05)
+            with lock:
+                sessoes.setdefault(threading.get_ident(), set()).add(id(copia.session))
+            assert copia.session is not svc.session
+            assert copia.session.cookies.get("rtk") == "r"
+            assert copia.session.headers["X-Teste"] == "1"
+            return uc_data["cdc"]
+
+        consultas = [(("details", cdc), _consulta, {"cdc": cdc}) for cdc in range(6)]
+        respostas = svc._consultar_gd_em_paralelo(consultas)
+
+        assert respostas == {("details", cdc): cdc for cdc in range(6)}
+        # Uma sessão por thread, nunca a mesma em duas threads
+        assert all(len(ids) == 1 for ids in sessoes.values())
+        todas = [i for ids in sessoes.values() for i in ids]
+        assert len(todas) == len(set(todas))
+
+
+class TestArmazemSessoesLogin:
+    """Testes do armazém limitado de sessões de login"""
+
+    def test_cheio_recusa_sem_descartar_sessao_ativa(self):
+        """Com o armazém cheio, o login novo é recusado e as sessões ativas continuam"""
+        import pytest
+        from backend.energisa.sessoes_login import ArmazemSessoesLoginMemoria, ArmazemSessoesCheioError
+
+        descartadas = []
+        armazem = ArmazemSessoesLoginMemoria(
+            "teste", max_sessoes=2, ttl_segundos=60, ao_descartar=lambda c, d: descartadas.append(c)
+        )
+        for chave in ("a", "b"):
+            assert armazem.reservar() is True
+            armazem.adicionar(chave, {}, reservada=True)
+
+        assert armazem.reservar() is False
+        with pytest.raises(ArmazemSessoesCheioError):
+            armazem.adicionar("c", {})
+
+        # Atualizar uma sessão existente não precisa de vaga
+        armazem.adicionar("a", {"authenticated": True})
+        assert armazem.obter("a") == {"authenticated": True}
+        assert armazem.obter("b") == {}
+        assert descartadas == []
+        assert armazem.get_status()["recusadas"] == 2
+
+    def test_reserva_reaproveita_vaga_expirada(self):
+        """Só sessões expiradas liberam vaga (e são descartadas)"""
+        from backend.energisa.sessoes_login import ArmazemSessoesLoginMemoria
+
+        descartadas = []
+        armazem = ArmazemSessoesLoginMemoria(
+            "teste", max_sessoes=1, ttl_segundos=0.05, ao_descartar=lambda c, d: descartadas.append(c),
+            intervalo_limpeza=60
+        )
+        armazem.adicionar("antiga", {})
+        time.sleep(0.1)
+
+        assert armazem.reservar() is True
+        assert descartadas == ["antiga"]
+
+    def test_reservas_concorrentes_respeitam_limite(self):
+        """Pedidos simultâneos não passam juntos da checagem de capacidade"""
+        import threading
+        from backend.energisa.sessoes_login import ArmazemSessoesLoginMemoria
+
+        armazem = ArmazemSessoesLoginMemoria("teste", max_sessoes=3, ttl_segundos=60)
+        largada = threading.Barrier(10)
+        resultados = []
+
+        def _pedido():
+            largada.wait()
+            resultados.append(armazem.reservar())
+
+        threads = [threading.Thread(target=_pedido) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert resultados.count(True) == 3
+        armazem.liberar_reserva()
+        assert armazem.reservar() is True
@@ -0,0 +1,391 @@
+"""
+Testes do módulo Sync
+"""
+
+import pytest
+
+
+class TestSyncStatus:
+    """Testes de status do scheduler"""
+
+    def test_status_sem_token(self, client):
+        """Acesso sem token deve retornar 401"""
+        response = client.get("/api/sync/status")
+        assert response.status_code == 401
+
+    def test_status_autenticado(self, client, auth_headers):
+        """Deve retornar status do scheduler"""
+        if not auth_headers:
+            pytest.skip("Sem autenticação")
+
+        response = client.get("/api/sync/status", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert "running" in data
+        assert "interval_minutes" in data
+
+
+class TestSyncMetricas:
+    """Testes de métricas da sincronização"""
+
+    def test_metricas_sem_token(self, client):
+        """Acesso sem token deve retornar 401"""
+        response = client.get("/api/sync/metricas")
+        assert response.status_code == 401
+
+    def test_metricas_autenticado(self, client, auth_headers):
+        """Deve retornar métricas (ou 403 sem perfil gestor/superadmin)"""
+        if not auth_headers:
+            pytest.skip("Sem autenticação")
+
+        response = client.get("/api/sync/metricas", headers=auth_headers)
+        assert response.status_code in [200, 403]
+        if response.status_code == 200:
+            data = response.json()
+            assert "fases" in data
+            assert "historico" in data
+
+
+class TestPrioridadeSync:
+    """Testes da seleção de UCs do scheduler por prioridade"""
+
+    def test_ucs_falhando_nao_monopolizam_lote(self):
+        """UCs que nunca sincronizam (falhas recentes) não tomam o lote das saudáveis"""
+        from datetime import datetime, timedelta, timezone
+        from backend.sync.prioridade import selecionar_ucs_devidas
+
+        agora = datetime.now(timezone.utc)
+        falhando = [
+            {
+                "id": i,
+                "ultima_sincronizacao": None,
+                "sync_ultima_tentativa": (agora - timedelta(minutes=5)).isoformat(),
+                "sync_falhas_consecutivas": 1 + i % 4
+            }
+            for i in range(30)
+        ]
+        saudaveis = [
+            {"id": 100 + i, "ultima_sincronizacao": (agora - timedelta(hours=3)).isoformat()}
+            for i in range(5)
+        ]
+
+        selecionadas = selecionar_ucs_devidas(falhando + saudaveis, {}, 20, 60, agora=agora)
+        ids = {uc["id"] for _, uc in selecionadas}
+        assert ids == {100, 101, 102, 103, 104}
+
+    def test_uc_falhando_volta_apos_backoff_sem_bonus(self):
+        """Após o backoff a UC volta ao ranking, mas pela idade da tentativa"""
+        from datetime import datetime, timedelta, timezone
+        from backend.sync.prioridade import selecionar_ucs_devidas, PONTOS_NUNCA_SINCRONIZADA
+
+        agora = datetime.now(timezone.utc)
+        ucs = [
+            {
+                "id": 1,
+                "ultima_sincronizacao": None,
+                "sync_ultima_tentativa": (agora - timedelta(hours=2)).isoformat(),
+                "sync_falhas_consecutivas": 1
+            },
+            {"id": 2, "ultima_sincronizacao": (agora - timedelta(hours=3)).isoformat()},
+            {"id": 3, "ultima_sincronizacao": None}
+        ]
+
+        selecionadas = selecionar_ucs_devidas(ucs, {}, 10, 60, agora=agora)
+        assert [uc["id"] for _, uc in selecionadas] == [3, 2, 1]
+        assert selecionadas[2][0] < PONTOS_NUNCA_SINCRONIZADA
+
+    def test_sessao_expirada_entra_no_ranking(self, monkeypatch):
+        """CPF com sessão expirada continua sendo agendado (o refresh é tentado)"""
+        import asyncio
+        from datetime import datetime, timedelta, timezone
+        from backend.debug.banco_memoria import BancoMemoria
+        from backend.energisa import session_manager
+        from backend.sync import service
+
+        banco = BancoMemoria()
+        banco.tabelas["usuarios"] = [{"id": 1, "cpf": "11111111111"}]
+        banco.tabelas["sessoes_energisa"] = [{
+            "cpf": "11111111111",
+            "cookies": {"utk": "t", "rtk": "r"},
+            "atualizado_em": (datetime.now(timezone.utc) - timedelta(days=10)).isoformat()
+        }]
+        banco.tabelas["unidades_consumidoras"] = [
+            {"id": 1, "usuario_id": 1, "cdc": 101, "ultima_sincronizacao": None}
+        ]
+        banco.tabelas["faturas"] = []
+        monkeypatch.setattr(session_manager, "db_admin", banco)
+        monkeypatch.setattr(session_manager, "_cache_sessoes", {})
+
+        agendados = {}
+
+        async def _varredura(ucs_por_cpf, stats, prazo=None, diario=None, sessoes=None):
+            agendados.update(ucs_por_cpf)
+            agendados["sessoes"] = sessoes
+
+        sync = service.SyncService.__new__(service.SyncService)
+        sync.db = banco
+        monkeypatch.setattr(sync, "_executar_varredura", _varredura)
+
+        stats = asyncio.run(sync.sincronizar_ucs_prioritarias(limite=10))
+
+        assert stats["ucs_selecionadas"] == 1
+        assert [uc["id"] for uc in agendados["11111111111"]] == [1]
+        assert "11111111111" in agendados["sessoes"]
+
+
+class TestDiarioSync:
+    """Testes da retomada da varredura (sync_execucoes)"""
+
+    def test_cpf_com_erro_e_retomado(self, monkeypatch):
+        """CPF que falhou com exceção não é marcado como concluído e volta na retomada"""
+        import asyncio
+        from backend.config import settings
+        from backend.debug.banco_memoria import BancoMemoria
+        from backend.sync import service
+        from backend.sync.journal import DiarioExecucao
+
+        banco = BancoMemoria()
+        ucs_por_cpf = {
+            "11111111111": [{"id": 1, "cdc": 101}],
+            "22222222222": [{"id": 2, "cdc": 202}]
+        }
+
+        def _erro(*args, **kwargs):
+            raise RuntimeError("Energisa fora do ar")
+
+        # Checkpoint a cada evento (simula o restart após o flush periódico)
+        monkeypatch.setattr(settings, "SYNC_DIARIO_INTERVALO_SEGUNDOS", 0)
+        monkeypatch.setattr(settings, "SYNC_CLIENTE_ASYNC", False)
+        monkeypatch.setattr(service, "EnergisaService", _erro)
+        sync = service.SyncService.__new__(service.SyncService)
+        sync.db = banco
+
+        diario = DiarioExecucao(banco)
+        ordem = diario.preparar(ucs_por_cpf)
+        stats = sync._novas_stats()
+        asyncio.run(sync._sincronizar_cpf("11111111111", ordem["11111111111"], stats, diario=diario))
+        asyncio.run(sync._sincronizar_cpf("22222222222", ordem["22222222222"], stats, diario=diario, tem_sessao=False))
+
+        assert stats["erros"] == 1
+        assert diario.cpfs_concluidos == ["22222222222"]
+
+        # Restart no meio da execução: a próxima varredura retoma pelo CPF que falhou
+        retomada = DiarioExecucao(banco)
+        ordem = retomada.preparar(ucs_por_cpf)
+        assert retomada.retomada_de == diario.id
+        assert list(ordem) == ["11111111111"]
+
+    def test_eventos_de_cpf_gravados_em_lote(self, monkeypatch):
+        """Início/fim de CPF não forçam um update por evento no sync_execucoes"""
+        from backend.config import settings
+        from backend.debug.banco_memoria import BancoMemoria
+        from backend.sync.journal import DiarioExecucao
+
+        monkeypatch.setattr(settings, "SYNC_DIARIO_INTERVALO_SEGUNDOS", 3600)
+        banco = BancoMemoria()
+        cpfs = [f"{i:011d}" for i in range(1, 11)]
+
+        diario = DiarioExecucao(banco)
+        diario.preparar({cpf: [{"id": i}] for i, cpf in enumerate(cpfs)})
+        for i, cpf in enumerate(cpfs):
+            diario.cpf_iniciado(cpf)
+            diario.uc_concluida(i)
+            diario.cpf_concluido(cpf)
+
+        assert banco.chamadas[("sync_execucoes", "update")] == 0
+
+        diario.finalizar()
+        assert banco.chamadas[("sync_execucoes", "update")] == 1
+        assert banco.tabelas["sync_execucoes"][0]["cpfs_concluidos"] == cpfs
+
+    def test_rotacao_do_cpf_inicial(self, monkeypatch):
+        """Execução concluída: a próxima começa SYNC_MAX_CPFS_CONCORRENTES CPFs adiante"""
+        from backend.config import settings
+        from backend.debug.banco_memoria import BancoMemoria
+        from backend.sync.journal import DiarioExecucao, STATUS_CONCLUIDA
+
+        monkeypatch.setattr(settings, "SYNC_MAX_CPFS_CONCORRENTES", 2)
+        banco = BancoMemoria()
+        ucs_por_cpf = {f"{i:011d}": [{"id": i}] for i in range(1, 6)}
+
+        primeira = DiarioExecucao(banco)
+        assert list(primeira.preparar(ucs_por_cpf)) == sorted(ucs_por_cpf)
+        primeira.finalizar()
+        assert banco.tabelas["sync_execucoes"][0]["status"] == STATUS_CONCLUIDA
+
+        segunda = DiarioExecucao(banco)
+        ordem = list(segunda.preparar(ucs_por_cpf))
+        assert segunda.retomada_de is None
+        assert ordem == sorted(ucs_por_cpf)[2:] + sorted(ucs_por_cpf)[:2]
+
+
+class TestUpsertEmLote:
+    """Testes da escrita em lote (sync/bulk.py)"""
+
+    def test_agrupa_por_colunas_deduplica_e_divide_em_lotes(self):
+        """Um upsert por lote de mesmas colunas; chave repetida vale o último registro"""
+        from backend.debug.banco_memoria import BancoMemoria
+        from backend.sync.bulk import upsert_em_lote
+
+        banco = BancoMemoria()
+        registros = [{"uc_id": 1, "mes": m, "valor": m * 10} for m in range(1, 6)]
+        registros.append({"uc_id": 1, "mes": 5, "valor": 999})
+        registros.append({"uc_id": 1, "mes": 6, "valor": 60, "pdf": None})
+
+        resultado = upsert_em_lote(banco, "faturas", registros, "uc_id,mes", tamanho_lote=2)
+
+        assert resultado["salvos"] == 6
+        assert resultado["falhas"] == []
+        # 5 registros com as mesmas colunas em lotes de 2 (3) + 1 com colunas diferentes
+        assert resultado["requisicoes"] == 4
+        assert sorted(resultado["chaves_salvas"]) == [(1, m) for m in range(1, 7)]
+        salvos = {r["mes"]: r["valor"] for r in banco.tabelas["faturas"]}
+        assert salvos[5] == 999
+
+    def test_lote_com_falha_regrava_um_a_um(self):
+        """Se o lote falha, só o registro com problema é reportado"""
+        from backend.debug.banco_memoria import BancoMemoria
+        from backend.sync.bulk import upsert_em_lote
+
+        banco = BancoMemoria()
+
+        class _BancoComRestricao:
+            def table(self, nome):
+                consulta = banco.table(nome)
+                upsert = consulta.upsert
+
+                def _upsert(lote, on_conflict=None):
+                    if any(r["valor"] is None for r in lote):
+                        raise ValueError("valor não pode ser nulo")
+                    return upsert(lote, on_conflict=on_conflict)
+
+                consulta.upsert = _upsert
+                return consulta
+
+        registros = [{"uc_id": 1, "mes": m, "valor": None if m == 2 else m} for m in range(1, 4)]
+        resultado = upsert_em_lote(_BancoComRestricao(), "faturas", registros, "uc_id,mes", tamanho_lote=10)
+
+        assert resultado["salvos"] == 2
+        assert resultado["falhas"] == [{"chave": {"uc_id": 1, "mes": 2}, "erro": "valor não pode ser nulo"}]
+        assert resultado["requisicoes"] == 4
+        assert sorted(r["mes"] for r in banco.tabelas["faturas"]) == [1, 3]
+
+
+class TestSincronizacaoIncremental:
+    """Testes do diff de colunas da UC e do watermark de GD"""
+
+    def test_colunas_alteradas(self):
+        """Só colunas com valor diferente; número e texto iguais não contam como alteração"""
+        from backend.sync.service import SyncService
+
+        uc = {"cep": "78000000", "numero_imovel": "12", "ativa": True, "bairro": "Centro", "complemento": None}
+        dados = {"cep": 78000000, "numero_imovel": "12", "ativa": "True", "bairro": "Centro Sul", "complemento": ""}
+
+        assert SyncService._colunas_alteradas(uc, dados) == {"bairro": "Centro Sul", "complemento": ""}
+        assert SyncService._colunas_alteradas(uc, {"ativa": False}) == {"ativa": False}
+
+    def test_item_gd_novo_ou_modificado(self):
+        """Mês posterior ao watermark, modificado depois dele ou o mês corrente sem data"""
+        from backend.sync.service import SyncService, parse_data_hora
+
+        sync = SyncService.__new__(SyncService)
+        referencia_wm = (2024, 5)
+        modificacao_wm = parse_data_hora("2024-06-10T12:00:00Z")
+
+        def _item(ano, mes, modificado=None):
+            return {"anoReferencia": ano, "mesReferencia": mes, "dataModificacaoRegistro": modificado}
+
+        casos = [
+            (_item(2024, 6), True),
+            (_item(2024, 4, "2024-06-11T00:00:00Z"), True),
+            (_item(2024, 4, "2024-06-01T00:00:00Z"), False),
+            (_item(2024, 5), True),
+            (_item(2024, 4), False),
+            ({"mesReferencia": None}, False),
+        ]
+        for item, esperado in casos:
+            assert sync._gd_item_novo_ou_modificado(item, referencia_wm, modificacao_wm) is esperado, item
+        assert sync._gd_item_novo_ou_modificado(_item(2020, 1), None, None) is True
+
+    def test_avanca_watermark_so_quando_muda(self):
+        """Watermark vai para a maior referência/modificação e não regrava sem mudança"""
+        from backend.debug.banco_memoria import BancoMemoria
+        from backend.sync.service import SyncService
+
+        banco = BancoMemoria()
+        uc = {"id": 1, "cdc": 101, "gd_watermark_referencia": "2024-03-01", "gd_watermark_modificacao": None}
+        banco.tabelas["unidades_consumidoras"] = [dict(uc)]
+        sync = SyncService.__new__(SyncService)
+        sync.db = banco
+
+        historico = [
+            {"anoReferencia": 2024, "mesReferencia": 4, "dataModificacaoRegistro": "2024-05-02T10:00:00Z"},
+            {"anoReferencia": 2024, "mesReferencia": 2, "dataModificacaoRegistro": "2024-05-03T10:00:00Z"},
+        ]
+        sync._avancar_gd_watermark(uc, historico, completo=False)
+
+        salvo = banco.tabelas["unidades_consumidoras"][0]
+        assert salvo["gd_watermark_referencia"] == "2024-04-01"
+        assert salvo["gd_watermark_modificacao"].startswith("2024-05-03T10:00:00")
+        assert "gd_historico_completo_em" not in salvo
+        assert uc["gd_watermark_referencia"] == "2024-04-01"
+
+        sync._avancar_gd_watermark(uc, historico, completo=False)
+        assert banco.chamadas[("unidades_consumidoras", "update")] == 1
+
+        assert SyncService._gd_precisa_historico_completo(uc) is True
+        sync._avancar_gd_watermark(uc, historico, completo=True)
+        assert SyncService._gd_precisa_historico_completo(uc) is False
+
+
+class TestLeaseSync:
+    """Testes da eleição do worker que roda o scheduler"""
+
+    def test_lease_arquivo_exclusivo(self, tmp_path):
+        """Só um detentor por vez; liberar permite que outro assuma"""
+        from backend.core.lease import LeaseArquivo
+
+        primeiro = LeaseArquivo("teste", 60, diretorio=str(tmp_path))
+        segundo = LeaseArquivo("teste", 60, diretorio=str(tmp_path))
+
+        assert primeiro.adquirir() is True
+        assert primeiro.adquirir() is True
+        assert segundo.adquirir() is False
+
+        primeiro.liberar()
+        assert segundo.adquirir() is True
+        segundo.liberar()
+
+    def test_lease_banco(self):
+        """LeaseBanco usa as RPCs adquirir_lease/liberar_lease; erro no banco = não detentor"""
+        from backend.core.lease import LeaseBanco
+        from backend.debug.banco_memoria import BancoMemoria
+
+        banco = BancoMemoria()
+        donos = {}
+
+        def _adquirir(params):
+            dono = donos.setdefault(params["p_nome"], params["p_dono"])
+            return dono == params["p_dono"]
+
+        def _liberar(params):
+            if donos.get(params["p_nome"]) == params["p_dono"]:
+                del donos[params["p_nome"]]
+
+        banco.rpcs.update(adquirir_lease=_adquirir, liberar_lease=_liberar)
+
+        primeiro = LeaseBanco("scheduler", 60)
+        segundo = LeaseBanco("scheduler", 60)
+        primeiro.db = segundo.db = banco
+
+        assert primeiro.adquirir() is True
+        assert segundo.adquirir() is False
+        primeiro.liberar()
+        assert segundo.adquirir() is True
+
+        def _erro(params):
+            raise RuntimeError("banco fora do ar")
+
+        banco.rpcs["adquirir_lease"] = _erro
+        assert segundo.adquirir() is False
+        assert segundo.ativo is False
@@ -0,0 +1,20 @@
+-- Migration: Hash de conteúdo para detecção de mudanças na sincronização
+-- Guarda o SHA-256 do JSON canônico retornado pela Energisa ao lado de cada registro
+-- para que a sincronização pule escritas quando o conteúdo não mudou
+
+-- 1. Faturas
+ALTER TABLE faturas
+  ADD COLUMN IF NOT EXISTS hash_dados_api VARCHAR(64);
+
+-- 2. Histórico de GD
+ALTER TABLE historico_gd
+  ADD COLUMN IF NOT EXISTS hash_dados_api VARCHAR(64);
+
+-- 3. Snapshot de informações cadastrais da UC
+ALTER TABLE unidades_consumidoras
+  ADD COLUMN IF NOT EXISTS hash_info_api VARCHAR(64);
+
+-- 4. Comentários
+COMMENT ON COLUMN faturas.hash_dados_api IS 'SHA-256 do JSON canônico de dados_api (detecção de mudanças na sincronização)';
+COMMENT ON COLUMN historico_gd.hash_dados_api IS 'SHA-256 do JSON canônico de dados_api (detecção de mudanças na sincronização)';
+COMMENT ON COLUMN unidades_consumidoras.hash_info_api IS 'SHA-256 do JSON canônico de UnidadeConsumidora/Informacao (detecção de mudanças na sincronização)';
@@ -0,0 +1,58 @@
+-- Migration: Leases entre processos (eleição de líder)
+-- Garante que jobs periódicos (ex: sync scheduler) rodem em um único worker/container
+
+CREATE TABLE IF NOT EXISTS leases_processos (
+    nome VARCHAR(100) PRIMARY KEY,
+    dono VARCHAR(200) NOT NULL,
+    expira_em TIMESTAMPTZ NOT NULL,
+    adquirido_em TIMESTAMPTZ DEFAULT NOW(),
+    atualizado_em TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Apenas o backend (service_role) acessa a tabela
+ALTER TABLE leases_processos ENABLE ROW LEVEL SECURITY;
+
+-- Comentários
+COMMENT ON TABLE leases_processos IS 'Leases com expiração para eleição de líder entre processos do backend';
+COMMENT ON COLUMN leases_processos.nome IS 'Nome do lease (um por job periódico, ex: sync_scheduler)';
+COMMENT ON COLUMN leases_processos.dono IS 'Identificador do processo detentor (host:pid:sufixo)';
+COMMENT ON COLUMN leases_processos.expira_em IS 'Após este instante outro processo pode assumir o lease';
+
+-- Adquire ou renova um lease. Retorna TRUE se p_dono é o detentor.
+CREATE OR REPLACE FUNCTION adquirir_lease(
+    p_nome VARCHAR,
+    p_dono VARCHAR,
+    p_ttl_segundos INTEGER
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    INSERT INTO leases_processos (nome, dono, expira_em, adquirido_em, atualizado_em)
+    VALUES (p_nome, p_dono, NOW() + make_interval(secs => p_ttl_segundos), NOW(), NOW())
+    ON CONFLICT (nome) DO UPDATE
+        SET dono = EXCLUDED.dono,
+            expira_em = EXCLUDED.expira_em,
+            adquirido_em = CASE
+                WHEN leases_processos.dono = EXCLUDED.dono THEN leases_processos.adquirido_em
+                ELSE NOW()
+            END,
+            atualizado_em = NOW()
+        WHERE leases_processos.dono = EXCLUDED.dono
+           OR leases_processos.expira_em < NOW();
+
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Libera um lease se p_dono for o detentor.
+CREATE OR REPLACE FUNCTION liberar_lease(
+    p_nome VARCHAR,
+    p_dono VARCHAR
+)
+RETURNS BOOLEAN AS $$
+BEGIN
+    DELETE FROM leases_processos
+    WHERE nome = p_nome AND dono = p_dono;
+
+    RETURN FOUND;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
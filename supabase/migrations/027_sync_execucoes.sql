@@ -0,0 +1,36 @@
+-- Migration: Diário de execuções da sincronização
+-- Checkpoint da varredura completa para retomar após restart e rotacionar o CPF inicial
+
+CREATE TABLE IF NOT EXISTS sync_execucoes (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    modo VARCHAR(20) NOT NULL DEFAULT 'completa',
+    status VARCHAR(20) NOT NULL DEFAULT 'EM_ANDAMENTO',
+    ordem_cpfs JSONB NOT NULL DEFAULT '[]'::jsonb,
+    deslocamento INTEGER NOT NULL DEFAULT 0,
+    cpfs_concluidos JSONB NOT NULL DEFAULT '[]'::jsonb,
+    cpfs_em_andamento JSONB NOT NULL DEFAULT '[]'::jsonb,
+    ucs_concluidas JSONB NOT NULL DEFAULT '[]'::jsonb,
+    retomada_de UUID REFERENCES sync_execucoes(id) ON DELETE SET NULL,
+    stats JSONB,
+    iniciado_em TIMESTAMPTZ DEFAULT NOW(),
+    atualizado_em TIMESTAMPTZ DEFAULT NOW(),
+    finalizado_em TIMESTAMPTZ,
+
+    CONSTRAINT check_sync_execucoes_status
+        CHECK (status IN ('EM_ANDAMENTO', 'CONCLUIDA', 'INTERROMPIDA'))
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_execucoes_modo_iniciado
+ON sync_execucoes(modo, iniciado_em DESC);
+
+-- Apenas o backend (service_role) acessa a tabela
+ALTER TABLE sync_execucoes ENABLE ROW LEVEL SECURITY;
+
+-- Comentários
+COMMENT ON TABLE sync_execucoes IS 'Diário (checkpoint) das execuções da varredura de sincronização';
+COMMENT ON COLUMN sync_execucoes.ordem_cpfs IS 'Ordem em que os CPFs (apenas números) são processados nesta execução';
+COMMENT ON COLUMN sync_execucoes.deslocamento IS 'Rotação aplicada à lista ordenada de CPFs (avança a cada execução)';
+COMMENT ON COLUMN sync_execucoes.cpfs_concluidos IS 'CPFs com todas as UCs processadas';
+COMMENT ON COLUMN sync_execucoes.cpfs_em_andamento IS 'CPFs em processamento no último checkpoint';
+COMMENT ON COLUMN sync_execucoes.ucs_concluidas IS 'IDs das UCs já processadas nesta execução';
+COMMENT ON COLUMN sync_execucoes.retomada_de IS 'Execução interrompida que esta execução retomou';
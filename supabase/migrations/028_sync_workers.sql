@@ -0,0 +1,28 @@
+-- Migration: Heartbeat dos workers de sincronização
+-- O worker (python -m backend.sync.worker) publica aqui saúde, status e métricas
+-- para que a API exponha /api/sync/status sem rodar o scheduler no mesmo processo
+
+CREATE TABLE IF NOT EXISTS sync_workers (
+    dono VARCHAR(200) PRIMARY KEY,
+    host VARCHAR(255),
+    pid INTEGER,
+    lider BOOLEAN NOT NULL DEFAULT FALSE,
+    status JSONB,
+    metricas JSONB,
+    iniciado_em TIMESTAMPTZ DEFAULT NOW(),
+    heartbeat_em TIMESTAMPTZ DEFAULT NOW(),
+    parado_em TIMESTAMPTZ
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_workers_heartbeat
+ON sync_workers(heartbeat_em DESC);
+
+-- Apenas o backend (service_role) acessa a tabela
+ALTER TABLE sync_workers ENABLE ROW LEVEL SECURITY;
+
+-- Comentários
+COMMENT ON TABLE sync_workers IS 'Heartbeat, status do scheduler e métricas de cada processo worker de sincronização';
+COMMENT ON COLUMN sync_workers.dono IS 'Identificador do processo (mesmo usado no lease do scheduler)';
+COMMENT ON COLUMN sync_workers.lider IS 'Se o processo detinha o lease do scheduler no último heartbeat';
+COMMENT ON COLUMN sync_workers.status IS 'SyncScheduler.get_status() no último heartbeat';
+COMMENT ON COLUMN sync_workers.metricas IS 'Métricas da sincronização (ver backend/sync/metrics.py) no último heartbeat';
@@ -0,0 +1,14 @@
+-- Migration: Watermark da sincronização incremental do histórico de GD
+-- Nos ciclos normais a sincronização pede só os meses recentes e grava apenas
+-- os novos ou modificados desde o watermark; o histórico completo (13 meses)
+-- é puxado em uma cadência mais lenta (SYNC_GD_INTERVALO_COMPLETO_HORAS)
+
+ALTER TABLE unidades_consumidoras
+  ADD COLUMN IF NOT EXISTS gd_watermark_referencia DATE,
+  ADD COLUMN IF NOT EXISTS gd_watermark_modificacao TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS gd_historico_completo_em TIMESTAMPTZ;
+
+-- Comentários
+COMMENT ON COLUMN unidades_consumidoras.gd_watermark_referencia IS 'Mês de referência (dia 1) mais recente do histórico GD já sincronizado';
+COMMENT ON COLUMN unidades_consumidoras.gd_watermark_modificacao IS 'Maior dataModificacaoRegistro do histórico GD já sincronizado';
+COMMENT ON COLUMN unidades_consumidoras.gd_historico_completo_em IS 'Último pull completo (13 meses) do histórico GD';
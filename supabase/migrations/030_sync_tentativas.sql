@@ -0,0 +1,12 @@
+-- Migration: Tentativas de sincronização por UC
+-- O scheduler por prioridade usa a última tentativa (com ou sem sucesso) na
+-- pontuação e aplica backoff exponencial após falhas consecutivas, para que
+-- UCs que nunca sincronizam não ocupem o lote de todo ciclo
+
+ALTER TABLE unidades_consumidoras
+  ADD COLUMN IF NOT EXISTS sync_ultima_tentativa TIMESTAMPTZ,
+  ADD COLUMN IF NOT EXISTS sync_falhas_consecutivas INTEGER NOT NULL DEFAULT 0;
+
+-- Comentários
+COMMENT ON COLUMN unidades_consumidoras.sync_ultima_tentativa IS 'Última tentativa de sincronização da UC (com ou sem sucesso)';
+COMMENT ON COLUMN unidades_consumidoras.sync_falhas_consecutivas IS 'Tentativas de sincronização que falharam desde o último sucesso';